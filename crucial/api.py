@@ -9,44 +9,210 @@
 
 import os
 import json
-import inspect
-from types import FunctionType
-from crucial.registry import get_registry
+import atexit
+import marshal
+import hashlib
+import threading
+from importlib.util import MAGIC_NUMBER
 
-__all__ = []
+# Tool functions are not built at import time. Each one is compiled on first
+# attribute access (see __getattr__ below) from a marshalled bytecode bundle
+# cached on disk and keyed by a hash of the tool registry.
 
 # Global configuration
 CONFIG = {
     "url": "http://localhost:8000",
     "api_key": os.environ.get("CRUCIAL_API_KEY", "demo-key"),
-    "last_canvas_id_file": os.path.join(os.path.dirname(__file__), ".last_canvas_id")
+    "last_canvas_id_file": os.path.join(os.path.dirname(__file__), ".last_canvas_id"),
+    "buffered": os.environ.get("CRUCIAL_API_BUFFERED", "false").lower() == "true",
+    "buffer_size": int(os.environ.get("CRUCIAL_API_BUFFER_SIZE", 200)),
+    "registry_source": os.environ.get("CRUCIAL_API_REGISTRY", "local"),
+    "cache_dir": os.environ.get(
+        "CRUCIAL_API_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "crucial")
+    )
 }
 
+# Bump when the generated function source changes shape
+_GENERATOR_VERSION = 2
+
+SCHEMA_DIR = os.path.join(os.path.dirname(__file__), "schema")
+
+_local = threading.local()
+_bundle = None
+
 def _post(endpoint: str, payload: dict) -> dict:
+    import requests  # deferred: importing requests dominates module import time
+
     headers = {"x-api-key": CONFIG["api_key"]}
     url = f"{CONFIG['url']}{endpoint}"
     response = requests.post(url, json=payload, headers=headers)
     response.raise_for_status()
     return response.json()
 
+def _get_last_canvas_id():
+    try:
+        with open(CONFIG["last_canvas_id_file"], "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _set_last_canvas_id(canvas_id: str):
+    if canvas_id:
+        with open(CONFIG["last_canvas_id_file"], "w") as f:
+            f.write(canvas_id)
+
 def _inject_canvas(payload: dict) -> dict:
-    canvas_id = _get_last_canvas_id()
+    if payload.get("canvas_id"):
+        return payload
+    active = _active_batch()
+    canvas_id = (active.canvas_id if active else None) or _get_last_canvas_id()
     if not canvas_id:
         raise ValueError("No canvas is active. Call create() first.")
     payload["canvas_id"] = canvas_id
     return payload
 
-def _build_tool_function(name: str, params: dict, description: str = "") -> FunctionType:
+# ---------------------------------------------------------------------
+# Client-side buffering
+# ---------------------------------------------------------------------
+class PendingAction:
+    """
+    Placeholder returned by a buffered call. `result` is filled in with the
+    server's per-action result once the owning batch has been flushed.
+    """
+    def __init__(self, action: str, params: dict):
+        self.action = action
+        self.params = params
+        self.result = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    @property
+    def ok(self) -> bool:
+        return self.done and self.result.get("status") == "ok"
+
+    def __repr__(self):
+        state = self.result.get("status") if self.done else "pending"
+        return f"<PendingAction {self.action} {state}>"
+
+
+class Batch:
+    """
+    Accumulates tool calls locally and sends them as one POST /canvas/batch,
+    either when `max_size` calls are queued or when the batch is flushed.
+
+        with crucial.api.batch(canvas_id) as b:
+            for i in range(500):
+                draw_point(x=i, y=i, color="#fff", radius=1)
+        print(b.results[-1])
+    """
+    def __init__(self, canvas_id: str = None, max_size: int = None):
+        self.canvas_id = canvas_id
+        self.max_size = max_size or CONFIG["buffer_size"]
+        self.pending = []
+        self.results = []
+
+    def add(self, action: str, params: dict) -> PendingAction:
+        entry = PendingAction(action, params)
+        self.pending.append(entry)
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        return entry
+
+    def flush(self) -> list:
+        """
+        Send all queued calls in one request and return their results.
+        If the request fails the calls stay queued and the error is raised.
+        """
+        pending = list(self.pending)
+        if not pending:
+            return []
+        response = _post("/canvas/batch", {
+            "actions": [{"action": p.action, "params": p.params} for p in pending]
+        })
+        del self.pending[:len(pending)]
+        results = response.get("results", [])
+        for entry, result in zip(pending, results):
+            entry.result = result
+        self.results.extend(results)
+        return results
+
+    def __enter__(self):
+        _batch_stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _batch_stack().remove(self)
+        if exc_type is None:
+            self.flush()
+        else:
+            self.pending.clear()
+        return False
+
+
+def _batch_stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _active_batch():
+    stack = _batch_stack()
+    if stack:
+        return stack[-1]
+    if CONFIG["buffered"]:
+        if not hasattr(_local, "buffer"):
+            _local.buffer = Batch()
+            _buffers.append(_local.buffer)
+        return _local.buffer
+    return None
+
+_buffers = []
+
+def batch(canvas_id: str = None, max_size: int = None) -> Batch:
+    """
+    Return a context manager that buffers every tool call made inside it
+    and flushes them as bulk requests. Calls without an explicit canvas_id
+    are sent to `canvas_id`.
+    """
+    return Batch(canvas_id=canvas_id, max_size=max_size)
+
+def flush() -> list:
     """
-    Dynamically create a top-level Python function for a Crucial schema tool.
-    This function will automatically call the Crucial API and include param labels.
+    Flush the calling thread's buffer when running with CONFIG["buffered"] = True.
     """
-    args = []
-    for key, meta in params.items():
-        default = "None" if key not in params.get("required", []) else inspect._empty
-        args.append((key, meta.get("type", "Any")))
+    buffer = getattr(_local, "buffer", None)
+    return buffer.flush() if buffer else []
 
-    arg_str = ", ".join([f"{k}" for k, _ in args])
+@atexit.register
+def _flush_buffers():
+    for buffer in _buffers:
+        try:
+            buffer.flush()
+        except Exception as e:
+            print(f"[!] Failed to flush {len(buffer.pending)} buffered Crucial calls: {e}")
+
+def _send(action: str, params: dict):
+    params = {k: v for k, v in params.items() if v is not None}
+    active = _active_batch()
+    if active is not None:
+        return active.add(action, params)
+    return _post("/canvas", {"action": action, "params": params})
+
+# ---------------------------------------------------------------------
+# Lazy tool generation
+# ---------------------------------------------------------------------
+def _tool_source(name: str, params: dict, description: str = "", required: list = None) -> str:
+    """
+    Return Python source for a top-level function wrapping a Crucial schema tool.
+    The function calls the Crucial API and includes param labels in its docstring.
+    """
+    required = [k for k in required or [] if k in params and k != "canvas_id"]
+    optional = [k for k in params if k not in required]
+
+    arg_str = ", ".join(required + [f"{k}=None" for k in optional])
+    kwarg_str = ", ".join(f"{k}={k}" for k in params)
     doc = f'"""{description or name}\n\nParams:\n'
     for k, v in params.items():
         doc += f"  - {k} ({v.get('type', 'any')}): {v.get('description', '')}\n"
@@ -55,26 +221,127 @@ def _build_tool_function(name: str, params: dict, description: str = "") -> Func
     # Function body source code
     func_code = f"def {name}({arg_str}):\n"
     func_code += f"    {doc}\n"
-    func_code += f"    payload = dict({arg_str})\n"
+    func_code += f"    payload = dict({kwarg_str})\n"
     if name == "create":
-        func_code += f"    return _post('/canvas/create', payload)\n"
+        func_code += f"    result = _post('/canvas/create', payload)\n"
+        func_code += f"    _set_last_canvas_id(result.get('canvas_id'))\n"
+        func_code += f"    return result\n"
     else:
-        func_code += f"    return _post('/canvas', {{'action': '{name}', 'params': _inject_canvas(payload)}})\n"
+        func_code += f"    return _send('{name}', _inject_canvas(payload))\n"
+    return func_code
+
+def _local_registry_key() -> str:
+    """
+    Hash the schema directory listing (names, sizes, mtimes) so a cached
+    bundle can be validated without parsing any schema file.
+    """
+    digest = hashlib.sha256()
+    for filename in sorted(os.listdir(SCHEMA_DIR)):
+        if filename.endswith(".json"):
+            st = os.stat(os.path.join(SCHEMA_DIR, filename))
+            digest.update(f"{filename}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+def _load_registry():
+    """
+    Return (cache_key, registry_loader) for the configured registry source.
+    The loader is only called when no cached bundle matches the key.
+    """
+    if CONFIG["registry_source"] == "server":
+        import requests
+
+        response = requests.get(f"{CONFIG['url']}/mcp/registry", headers={"x-api-key": CONFIG["api_key"]})
+        response.raise_for_status()
+        registry = response.json()
+        key = hashlib.sha256(json.dumps(registry, sort_keys=True).encode()).hexdigest()
+        return f"server-{key}", lambda: registry
+
+    def load_local():
+        from crucial.registry import get_registry
+        return get_registry()
+
+    return f"local-{_local_registry_key()}", load_local
 
-    local_ns = {}
-    exec(func_code, globals(), local_ns)
-    return local_ns[name]
+def _compile_bundle(registry: dict) -> dict:
+    names = []
+    code = {}
+    for module in registry["modules"]:
+        name = module["name"]
+        description = module.get("description", "")
+        params = module.get("parameters", {}).get("properties", {})
+        required = module.get("parameters", {}).get("required", [])
 
-# Auto-generate all tool functions from schema
-for module in get_registry()["modules"]:
-    name = module["name"]
-    description = module.get("description", "")
-    params = module.get("parameters", {}).get("properties", {})
+        try:
+            source = _tool_source(name, params, description, required)
+            code[name] = compile(source, f"<crucial.api:{name}>", "exec")
+            names.append(name)
+        except Exception as e:
+            print(f"[!] Failed to build {name}: {e}")
+    return {"names": names, "code": code}
+
+def _get_bundle() -> dict:
+    """
+    Return the compiled tool bundle, loading it from the on-disk cache when
+    the registry hash matches and regenerating it otherwise.
+    """
+    global _bundle
+    if _bundle is not None:
+        return _bundle
+
+    key, load = _load_registry()
+    digest = hashlib.sha256(f"{key}:{_GENERATOR_VERSION}".encode() + MAGIC_NUMBER).hexdigest()
+    path = os.path.join(CONFIG["cache_dir"], f"api-{digest[:24]}.bin")
 
     try:
-        fn = _build_tool_function(name, params, description)
-        globals()[name] = fn
-        __all__.append(name)
-    except Exception as e:
-        print(f"[!] Failed to build {name}: {e}")
+        with open(path, "rb") as f:
+            _bundle = marshal.load(f)
+        return _bundle
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    _bundle = _compile_bundle(load())
+    try:
+        os.makedirs(CONFIG["cache_dir"], exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            marshal.dump(_bundle, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[!] Could not write Crucial API cache {path}: {e}")
+    return _bundle
+
+def use_server(url: str = None):
+    """
+    Load tool definitions from a running server's /mcp/registry instead of
+    the local schema directory. Already-built functions are discarded.
+    """
+    if url:
+        CONFIG["url"] = url.rstrip("/")
+    CONFIG["registry_source"] = "server"
+    reset()
+
+def reset():
+    """
+    Drop the loaded bundle and every built function so the next access
+    regenerates them from the configured registry source.
+    """
+    global _bundle
+    if _bundle is not None:
+        for name in _bundle["names"]:
+            globals().pop(name, None)
+    _bundle = None
+
+def __getattr__(name: str):
+    if name == "__all__":
+        return list(_get_bundle()["names"])
+    if name.startswith("_"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    code = _get_bundle()["code"].get(name)
+    if code is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    exec(code, globals())
+    return globals()[name]
 
+def __dir__():
+    return sorted(set(globals()) | set(_get_bundle()["names"]))
@@ -12,11 +12,11 @@ from crucial.config import CONFIG, get_logger
 logger = get_logger(__name__)
 
 
-def load_keys():
+def load_keys(setting: str = "keys_file"):
     """
     Load API keys from the file specified in config.
     """
-    keyfile = Path(CONFIG["AUTH"]["keys_file"])
+    keyfile = Path(CONFIG["AUTH"][setting])
     if not keyfile.exists():
         return set()
     with keyfile.open() as f:
@@ -38,3 +38,16 @@ def require_api_key_header(headers):
     key = headers.get("x-api-key")
     if not validate_api_key(key):
         raise HTTPException(status_code=403, detail="Invalid or missing API key")
+
+def require_admin_key_header(headers):
+    """
+    Validate x-api-key against the admin key file for operator-only routes.
+    Independent of require_api_key; only open_admin opens these routes.
+    """
+    if CONFIG["AUTH"]["open_admin"]:
+        logger.debug("Admin key check bypassed (open_admin=True)")
+        return
+    key = headers.get("x-api-key")
+    if key not in load_keys("admin_keys_file"):
+        logger.warning("Rejected admin request with key: %s", key)
+        raise HTTPException(status_code=403, detail="Admin API key required")
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: __init__.py
+# Description: Shared setup for the offline benchmark, load-test and replay tools
+# Author: Ms. White
+# Created: 2025-05-12
+
+import os
+import sys
+import logging
+
+
+def isolate(workdir: str, server_logs: bool = False):
+    """
+    Point Crucial's database and logs at `workdir` and disable API keys.
+    Must run before any crucial module is imported, since paths are read
+    at import time. Server INFO logging is muted unless `server_logs`.
+    """
+    if "crucial.config" in sys.modules:
+        raise RuntimeError("crucial is already imported; isolate() must run first")
+    os.environ.update({
+        "CRUCIAL_DB_PATH": os.path.join(workdir, "bench.db"),
+        "CRUCIAL_LOG_PATH": os.path.join(workdir, "logs", "crucial.log"),
+        "CRUCIAL_LOG_TO_FILE": "false",
+        "AUTH_REQUIRE_API_KEY": "false",
+    })
+    from crucial.config import get_log_handler
+    if not server_logs:
+        get_log_handler().setLevel(logging.WARNING)
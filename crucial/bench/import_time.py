@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: import_time.py
+# Description: Import-time and first-use benchmark for Crucial startup paths
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Run each scenario in a fresh interpreter and report wall time and the
+memory retained by Python objects (tracemalloc) after the snippet ran.
+
+    python -m crucial.bench.import_time --repeat 10 --json import_time.json
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PROBE = """
+import time, tracemalloc
+tracemalloc.start()
+t0 = time.perf_counter()
+{snippet}
+elapsed = time.perf_counter() - t0
+current, _ = tracemalloc.get_traced_memory()
+print(elapsed, current)
+"""
+
+SCENARIOS = {
+    # Old behaviour: both word lists split into str lists at import
+    "human_id_eager_lists": (
+        "from crucial.utils.human_id import ADJ_PATH, NOUN_PATH\n"
+        "ADJECTIVES = ADJ_PATH.read_text().splitlines()\n"
+        "NOUNS = NOUN_PATH.read_text().splitlines()"
+    ),
+    "human_id_import": "import crucial.utils.human_id",
+    "human_id_first_id": "from crucial.utils.human_id import generate_human_id\ngenerate_human_id()",
+    "api_import": "import crucial.api",
+    "api_first_function": "import crucial.api\ncrucial.api.draw_line",
+}
+
+
+def run_scenario(snippet: str, repeat: int) -> dict:
+    times, mems = [], []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(snippet=snippet)],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        times.append(float(out[0]))
+        mems.append(int(out[1]))
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "retained_kb": round(statistics.median(mems) / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crucial import-time benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", help="Write results to this file")
+    parser.add_argument("scenarios", nargs="*", help=f"Subset of: {', '.join(SCENARIOS)}")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenarios or SCENARIOS:
+        results[name] = run_scenario(SCENARIOS[name], args.repeat)
+        r = results[name]
+        print(f"{name:24s} {r['median_ms']:9.3f} ms (min {r['min_ms']:.3f})  {r['retained_kb']:9.1f} KiB")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: load.py
+# Description: End-to-end load test for the Crucial API with baseline comparison
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Boot the Crucial app in-process (uvicorn on a random port, temp database)
+or target an existing server, drive the selected workloads and report
+throughput and latency percentiles.
+
+    python -m crucial.bench.load --json run.json
+    python -m crucial.bench.load draw fanout --requests 2000 --viewers 50
+    python -m crucial.bench.load --baseline baseline.json --tolerance 0.15
+
+Workloads:
+    create          concurrent POST /canvas/create storm
+    draw            draw_line actions against one canvas
+    many_canvases   draw_line actions spread round-robin over --canvases canvases
+    history         GET /object/{id}/history on a canvas with --history-rows actions
+    fanout          draws on one canvas watched by --viewers WebSocket clients;
+                    latency is POST send → message received by each viewer,
+                    throughput counts delivered messages
+
+With --baseline the run exits non-zero when any workload's p95 latency
+rises, or its throughput falls, by more than --tolerance.
+"""
+
+import sys
+import json
+import math
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+
+import httpx
+
+from crucial.bench import isolate
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.started = None
+        self.stopped = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped = time.perf_counter()
+        return False
+
+    async def timed(self, request, start: float = None):
+        """
+        Await `request` and record its latency. `start` backdates the clock
+        to a scheduled send time so open-loop queueing delay is counted.
+        """
+        t0 = time.perf_counter() if start is None else start
+        try:
+            response = await request
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            self.latencies.append(time.perf_counter() - t0)
+        else:
+            self.errors += 1
+
+    def summary(self) -> dict:
+        values = sorted(self.latencies)
+        seconds = (self.stopped or time.perf_counter()) - self.started
+        ms = lambda v: round(v * 1000, 3)
+        return {
+            "requests": len(values) + self.errors,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "throughput_rps": round(len(values) / seconds, 1) if seconds else 0.0,
+            "p50_ms": ms(percentile(values, 0.50)),
+            "p95_ms": ms(percentile(values, 0.95)),
+            "p99_ms": ms(percentile(values, 0.99)),
+            "max_ms": ms(values[-1]) if values else 0.0
+        }
+
+
+async def run_pool(total: int, concurrency: int, make_call):
+    """
+    Closed-loop driver: `concurrency` workers issue `make_call(i)` for
+    i in range(total) back to back.
+    """
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            await make_call(i)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+
+def draw_params(canvas_id: str, i: int) -> dict:
+    return {
+        "canvas_id": canvas_id,
+        "start_x": i % 800, "start_y": (i * 7) % 600,
+        "end_x": (i * 13) % 800, "end_y": (i * 3) % 600,
+        "color": "#ff8800", "width": 2
+    }
+
+
+async def create_canvas(client: httpx.AsyncClient, name: str) -> str:
+    response = await client.post("/canvas/create", json={"name": name})
+    response.raise_for_status()
+    return response.json()["canvas_id"]
+
+
+async def seed_actions(client: httpx.AsyncClient, canvas_id: str, count: int, chunk: int = 500):
+    for start in range(0, count, chunk):
+        actions = [{"action": "draw_line", "params": draw_params(canvas_id, i)}
+                   for i in range(start, min(count, start + chunk))]
+        response = await client.post("/canvas/batch", json={"actions": actions})
+        response.raise_for_status()
+
+
+# ---------------------------------------------------------------------
+# Workloads
+# ---------------------------------------------------------------------
+async def wl_create(client, opts) -> dict:
+    with Recorder() as rec:
+        await run_pool(opts.requests, opts.concurrency, lambda i: rec.timed(
+            client.post("/canvas/create", json={"name": f"bench-{i}"})))
+    return rec.summary()
+
+
+async def wl_draw(client, opts) -> dict:
+    canvas_id = await create_canvas(client, "bench-draw")
+    with Recorder() as rec:
+        await run_pool(opts.requests, opts.concurrency, lambda i: rec.timed(
+            client.post("/canvas", json={"action": "draw_line", "params": draw_params(canvas_id, i)})))
+    return rec.summary()
+
+
+async def wl_many_canvases(client, opts) -> dict:
+    ids = [await create_canvas(client, f"bench-many-{n}") for n in range(opts.canvases)]
+    with Recorder() as rec:
+        await run_pool(opts.requests, opts.concurrency, lambda i: rec.timed(
+            client.post("/canvas", json={"action": "draw_line",
+                                         "params": draw_params(ids[i % len(ids)], i)})))
+    result = rec.summary()
+    result["canvases"] = len(ids)
+    return result
+
+
+async def wl_history(client, opts) -> dict:
+    canvas_id = await create_canvas(client, "bench-history")
+    await seed_actions(client, canvas_id, opts.history_rows)
+    with Recorder() as rec:
+        await run_pool(opts.requests, opts.concurrency, lambda i: rec.timed(
+            client.get(f"/object/{canvas_id}/history")))
+    result = rec.summary()
+    result["rows"] = opts.history_rows
+    return result
+
+
+async def wl_fanout(client, opts) -> dict:
+    import websockets
+
+    canvas_id = await create_canvas(client, "bench-fanout")
+    ws_url = str(client.base_url).replace("http", "ws", 1).rstrip("/") + f"/ws/canvas/{canvas_id}"
+    sent = {}
+    rec = Recorder()
+    received = [0] * opts.viewers
+    done = asyncio.Event()
+
+    async def viewer(n, ws):
+        async for message in ws:
+            seq = json.loads(message)["params"]["seq"]
+            rec.latencies.append(time.perf_counter() - sent[seq])
+            received[n] += 1
+            if received[n] == opts.requests and all(r == opts.requests for r in received):
+                done.set()
+
+    async def post(i):
+        params = draw_params(canvas_id, i)
+        params["seq"] = i
+        sent[i] = time.perf_counter()
+        response = await client.post("/canvas", json={"action": "draw_line", "params": params})
+        if response.status_code >= 400:
+            rec.errors += 1
+
+    sockets = [await websockets.connect(ws_url, max_queue=None) for _ in range(opts.viewers)]
+    readers = [asyncio.create_task(viewer(n, ws)) for n, ws in enumerate(sockets)]
+    try:
+        with rec:
+            await run_pool(opts.requests, opts.concurrency, post)
+            try:
+                await asyncio.wait_for(done.wait(), timeout=opts.timeout)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for task in readers:
+            task.cancel()
+        for ws in sockets:
+            await ws.close()
+
+    expected = opts.requests * opts.viewers
+    result = rec.summary()
+    result.update({
+        "viewers": opts.viewers,
+        "messages_expected": expected,
+        "messages_received": len(rec.latencies),
+        "requests": opts.requests
+    })
+    return result
+
+
+WORKLOADS = {
+    "create": wl_create,
+    "draw": wl_draw,
+    "many_canvases": wl_many_canvases,
+    "history": wl_history,
+    "fanout": wl_fanout,
+}
+
+
+# ---------------------------------------------------------------------
+# In-process server
+# ---------------------------------------------------------------------
+def boot_server(workdir: str, server_logs: bool = False):
+    """
+    Start the Crucial app under uvicorn in a daemon thread, bound to a free
+    port, with its database and logs under `workdir`.
+    """
+    isolate(workdir, server_logs)
+
+    import uvicorn
+    from crucial.server import app
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Benchmark server failed to start")
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}", server, thread
+
+
+# ---------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Return a list of regression messages for workloads present in both runs.
+    """
+    regressions = []
+    for name, current in results["workloads"].items():
+        base = baseline.get("workloads", {}).get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms → {current['p95_ms']}ms")
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} → {current['throughput_rps']} req/s")
+    return regressions
+
+
+async def run(opts, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=opts.concurrency, max_keepalive_connections=opts.concurrency)
+    headers = {"x-api-key": opts.api_key} if opts.api_key else {}
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, headers=headers, timeout=opts.timeout) as client:
+        for name in opts.workloads or WORKLOADS:
+            results[name] = await WORKLOADS[name](client, opts)
+            r = results[name]
+            print(f"{name:14s} {r['throughput_rps']:9.1f} req/s  p50 {r['p50_ms']:8.2f}  "
+                  f"p95 {r['p95_ms']:8.2f}  p99 {r['p99_ms']:8.2f} ms  errors {r['errors']}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crucial API load test")
+    parser.add_argument("workloads", nargs="*", help=f"Subset of: {', '.join(WORKLOADS)}")
+    parser.add_argument("--url", help="Target a running server instead of booting one in-process")
+    parser.add_argument("--api-key", help="x-api-key for --url targets")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per workload")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--canvases", type=int, default=50, help="Canvas count for many_canvases")
+    parser.add_argument("--history-rows", type=int, default=1000, help="Actions seeded for history")
+    parser.add_argument("--viewers", type=int, default=20, help="WebSocket viewers for fanout")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--server-logs", action="store_true", help="Keep the in-process server's INFO logs")
+    parser.add_argument("--json", dest="json_path", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous --json result")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    opts = parser.parse_args()
+    unknown = sorted(set(opts.workloads) - set(WORKLOADS))
+    if unknown:
+        parser.error(f"unknown workload(s): {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="crucial-bench-") as workdir:
+        server = None
+        if opts.url:
+            base_url = opts.url.rstrip("/")
+        else:
+            base_url, server, _ = boot_server(workdir, opts.server_logs)
+        try:
+            workloads = asyncio.run(run(opts, base_url))
+        finally:
+            if server is not None:
+                server.should_exit = True
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": opts.url or "in-process",
+            "options": {k: v for k, v in vars(opts).items()
+                        if k in ("requests", "concurrency", "canvases", "history_rows", "viewers")}
+        },
+        "workloads": workloads
+    }
+    if opts.json_path:
+        with open(opts.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            regressions = compare(results, json.load(f), opts.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {opts.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
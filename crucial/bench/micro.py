@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: micro.py
+# Description: Offline micro-benchmarks for Crucial hot paths
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Time individual hot functions in-process against a temporary database.
+No server or network is needed.
+
+    python -m crucial.bench.micro --json before.json
+    python -m crucial.bench.micro -k validate -k store_action
+    python -m crucial.bench.micro --compare before.json --tolerance 0.10
+
+Each benchmark is calibrated so one round lasts at least --min-time, then
+timed for --rounds rounds; results are per-call times in microseconds.
+--compare reports the median ratio against a saved run and exits
+non-zero when any benchmark slowed down by more than --tolerance.
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import tempfile
+
+from crucial.bench import isolate
+
+SUITES = []
+
+
+def suite(fn):
+    """
+    Register a suite: a generator yielding (name, setup) pairs, where
+    setup() prepares state and returns the zero-argument callable to time.
+    Setup runs only for benchmarks selected with -k.
+    """
+    SUITES.append(fn)
+    return fn
+
+
+def complete(coro):
+    """
+    Run a coroutine that never suspends (e.g. a route handler doing only
+    synchronous work) without an event loop round-trip.
+    """
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError("coroutine suspended; complete() only handles synchronous bodies")
+
+
+def _time(fn, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - start
+
+
+async def measure(fn, min_time: float, rounds: int) -> dict:
+    number = 1
+    while True:
+        elapsed = _time(fn, number)
+        await asyncio.sleep(0)  # let tasks scheduled by fn (broadcasts) run
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    samples = []
+    for _ in range(rounds):
+        samples.append(_time(fn, number) / number)
+        await asyncio.sleep(0)
+    us = lambda v: round(v * 1e6, 3)
+    median = statistics.median(samples)
+    return {
+        "rounds": rounds,
+        "iterations": number,
+        "min_us": us(min(samples)),
+        "median_us": us(median),
+        "mean_us": us(statistics.fmean(samples)),
+        "stddev_us": us(statistics.stdev(samples)) if rounds > 1 else 0.0,
+        "ops_per_s": round(1 / median, 1) if median else 0.0
+    }
+
+
+# ---------------------------------------------------------------------
+# Suites
+# ---------------------------------------------------------------------
+def _new_canvas(name: str = "bench"):
+    from crucial.canvas import Canvas
+    return Canvas(name, 800, 600, "#000000")
+
+
+def _seed_history(canvas_id: str, rows: int):
+    from datetime import datetime, timedelta
+    from crucial.db import get_db_connection
+    from crucial.bench.synth import synthesize
+    from crucial.registry import get_action_to_schema
+
+    schema = get_action_to_schema()["draw_line"]["parameters"]
+    rng = random.Random(rows)
+    base = datetime(2025, 1, 1)
+    conn = get_db_connection()
+    conn.executemany(
+        "INSERT INTO actions (canvas_id, timestamp, action, params) VALUES (?, ?, ?, ?)",
+        ((canvas_id, (base + timedelta(microseconds=i)).isoformat(), "draw_line",
+          json.dumps(synthesize(schema, rng, canvas_id))) for i in range(rows))
+    )
+    conn.commit()
+
+
+@suite
+def registry_suite(opts):
+    from crucial.registry import get_action_to_schema
+    yield "registry.get_action_to_schema", lambda: get_action_to_schema
+
+
+@suite
+def validate_suite(opts):
+    from crucial.dispatcher import Dispatcher
+    from crucial.bench.synth import synthesize
+
+    dispatcher = Dispatcher()
+    for action in sorted(dispatcher.schemas):
+        def setup(action=action):
+            params = synthesize(dispatcher.schemas[action].get("parameters", {}),
+                                random.Random(action), "bench-canvas")
+            return lambda: dispatcher.validate(action, params)
+        yield f"dispatcher.validate[{action}]", setup
+
+
+@suite
+def canvas_suite(opts):
+    from crucial.canvas import Canvas
+
+    state = {}
+
+    def canvas():
+        if "canvas" not in state:
+            state["canvas"] = _new_canvas()
+        return state["canvas"]
+
+    yield "canvas.resolve_id[human_id]", lambda: (lambda hid=canvas().human_id: Canvas.resolve_id(hid))
+    yield "canvas.resolve_id[uuid]", lambda: (lambda cid=canvas().id: Canvas.resolve_id(cid))
+    yield "canvas.from_id", lambda: (lambda cid=canvas().id: Canvas.from_id(cid))
+
+
+@suite
+def store_suite(opts):
+    from collections import defaultdict
+    from crucial.bench.synth import synthesize
+    from crucial.canvas import set_canvas_subscribers
+    from crucial.registry import get_action_to_schema
+
+    set_canvas_subscribers(defaultdict(set))  # no viewers: times storage, not fan-out
+    schemas = get_action_to_schema()
+    cases = {"small": ("draw_line", None), "large": ("graph_scatter", 5000)}
+    for label, (action, array_len) in cases.items():
+        def setup(action=action, array_len=array_len):
+            canvas = _new_canvas(f"bench-store-{label}")
+            params = synthesize(schemas[action]["parameters"], random.Random(0), canvas.id,
+                                optional=1.0, array_len=array_len)
+            return lambda: canvas._store_action(action, params)
+        yield f"canvas._store_action[{label}]", setup
+
+
+@suite
+def history_suite(opts):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from crucial.server import get_canvas_history
+
+    for rows in opts.history_rows:
+        def setup(rows=rows):
+            canvas = _new_canvas(f"bench-history-{rows}")
+            _seed_history(canvas.id, rows)
+            return lambda: JSONResponse(jsonable_encoder(complete(get_canvas_history(canvas.id, region=None))))
+        yield f"server.get_canvas_history[{rows}]", setup
+
+
+@suite
+def human_id_suite(opts):
+    from crucial.utils.human_id import generate_human_id
+    yield "human_id.generate_human_id[random]", lambda: generate_human_id
+    yield "human_id.generate_human_id[deterministic]", lambda: (
+        lambda: generate_human_id(seed="3f2b6c1e-bench", deterministic=True))
+
+
+@suite
+def loader_suite(opts):
+    from crucial.loader import crucial_python_loader
+    for mode in ("sync", "async"):
+        yield f"loader.crucial_python_loader[{mode}]", lambda mode=mode: (
+            lambda: crucial_python_loader("http://localhost:8000", mode=mode))
+
+
+# ---------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Print median ratios against `baseline` and return the regressions.
+    """
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or not base["median_us"]:
+            continue
+        ratio = current["median_us"] / base["median_us"]
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:48s} {base['median_us']:12.3f} → {current['median_us']:12.3f} us  x{ratio:.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+async def run(opts) -> dict:
+    results = {}
+    for make in SUITES:
+        for name, setup in make(opts):
+            if opts.keyword and not any(k in name for k in opts.keyword):
+                continue
+            results[name] = await measure(setup(), opts.min_time, opts.rounds)
+            r = results[name]
+            print(f"{name:48s} {r['median_us']:12.3f} us  (min {r['min_us']:.3f}, ±{r['stddev_us']:.3f})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crucial micro-benchmarks")
+    parser.add_argument("-k", dest="keyword", action="append", help="Only run benchmarks containing this text")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round")
+    parser.add_argument("--history-rows", type=lambda s: [int(n) for n in s.split(",")],
+                        default=[1000, 10000, 100000], help="Comma-separated history sizes")
+    parser.add_argument("--json", dest="json_path", help="Write results to this file")
+    parser.add_argument("--compare", help="Compare against a previous --json result")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown")
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="crucial-micro-") as workdir:
+        isolate(workdir)
+        benchmarks = asyncio.run(run(opts))
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rounds": opts.rounds,
+            "min_time": opts.min_time
+        },
+        "benchmarks": benchmarks
+    }
+    if opts.json_path:
+        with open(opts.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            regressions = compare(results, json.load(f), opts.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than {opts.tolerance:.0%} over baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: replay.py
+# Description: Record, synthesize and replay Crucial action logs
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Capacity-planning traffic tool working on JSON-lines action logs.
+
+    # Capture real traffic from a server
+    python -m crucial.bench.replay record --url http://host:8000 -c brisk-vortex-197 -o day.jsonl
+
+    # Or synthesize a mix from the schema registry (Poisson arrivals)
+    python -m crucial.bench.replay synth -n 5000 --canvases 50 --rate 200 \\
+        --mix draw_line:5,graph_bar:1 -o mix.jsonl
+
+    # Replay 10x faster with every canvas cloned 4 times, open loop
+    python -m crucial.bench.replay replay day.jsonl --url http://host:8000 --speed 10 --scale 4
+
+Log format, one JSON object per line:
+    {"type": "canvas", "id": ..., "name": ..., "width": ..., "height": ..., "background": ...}
+    {"type": "action", "canvas": ..., "offset": seconds, "action": ..., "params": {...}}
+
+Replay creates a fresh canvas on the target for every logged canvas (and
+clone) and rewrites canvas_id accordingly. In open-loop mode (default)
+actions are sent at their logged offset / --speed regardless of how fast
+the server answers, and latency is measured from the scheduled time, so
+queueing shows up in the percentiles; --concurrency caps requests in
+flight. --rate replaces logged offsets with Poisson arrivals. In closed
+loop, --concurrency workers send back to back and offsets are ignored.
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+
+import httpx
+
+from crucial.bench.load import Recorder, run_pool
+
+# Actions that do not draw, or write server-side files, are not synthesized
+SYNTH_EXCLUDE = {"clear", "create", "save", "render_threejs"}
+
+
+def _client(opts) -> httpx.AsyncClient:
+    headers = {"x-api-key": opts.api_key} if opts.api_key else {}
+    limits = httpx.Limits(max_connections=opts.concurrency, max_keepalive_connections=opts.concurrency)
+    return httpx.AsyncClient(base_url=opts.url.rstrip("/"), headers=headers, limits=limits, timeout=opts.timeout)
+
+
+def write_log(path: str, canvases: list, actions: list):
+    with open(path, "w") as f:
+        for canvas in canvases:
+            f.write(json.dumps({"type": "canvas", **canvas}) + "\n")
+        for entry in sorted(actions, key=lambda a: a["offset"]):
+            f.write(json.dumps({"type": "action", **entry}) + "\n")
+
+
+def read_log(path: str):
+    canvases, actions = {}, []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            kind = entry.pop("type")
+            if kind == "canvas":
+                canvases[entry["id"]] = entry
+            elif kind == "action":
+                actions.append(entry)
+    actions.sort(key=lambda a: a["offset"])
+    return canvases, actions
+
+
+def poisson_offsets(count: int, rate: float, rng: random.Random) -> list:
+    t, offsets = 0.0, []
+    for _ in range(count):
+        t += rng.expovariate(rate)
+        offsets.append(t)
+    return offsets
+
+
+# ---------------------------------------------------------------------
+# record
+# ---------------------------------------------------------------------
+async def record(opts):
+    canvases, rows = [], []
+    async with _client(opts) as client:
+        for identifier in opts.canvas:
+            meta = await client.get(f"/object/{identifier}")
+            meta.raise_for_status()
+            meta = meta.json()
+            history = await client.get(f"/object/{identifier}/history")
+            history.raise_for_status()
+            canvases.append({k: meta.get(k) for k in ("id", "name", "width", "height", "background")})
+            rows.extend((meta["id"], row) for row in history.json())
+
+    stamps = [datetime.fromisoformat(row["timestamp"]) for _, row in rows]
+    t0 = min(stamps) if stamps else None
+    actions = [
+        {"canvas": cid, "offset": (ts - t0).total_seconds(), "action": row["action"], "params": row["params"]}
+        for (cid, row), ts in zip(rows, stamps)
+    ]
+    write_log(opts.output, canvases, actions)
+    print(f"Recorded {len(actions)} actions from {len(canvases)} canvases → {opts.output}")
+
+
+# ---------------------------------------------------------------------
+# synth
+# ---------------------------------------------------------------------
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        action, _, weight = part.partition(":")
+        mix[action] = float(weight or 1)
+    return mix
+
+
+def synth(opts):
+    from crucial.bench.synth import synthesize
+    from crucial.registry import get_action_to_schema
+
+    schemas = get_action_to_schema()
+    mix = parse_mix(opts.mix) if opts.mix else {a: 1.0 for a in schemas if a not in SYNTH_EXCLUDE}
+    unknown = sorted(set(mix) - set(schemas))
+    if unknown:
+        sys.exit(f"Unknown action(s) in --mix: {', '.join(unknown)}")
+
+    rng = random.Random(opts.seed)
+    canvases = [{"id": f"synth-{n}", "name": f"synth-{n}", "width": 800, "height": 600,
+                 "background": "#000000"} for n in range(opts.canvases)]
+    names, weights = list(mix), list(mix.values())
+    actions = []
+    for offset in poisson_offsets(opts.count, opts.rate, rng):
+        action = rng.choices(names, weights)[0]
+        canvas = rng.choice(canvases)["id"]
+        params = synthesize(schemas[action]["parameters"], rng, canvas)
+        actions.append({"canvas": canvas, "offset": round(offset, 6), "action": action, "params": params})
+    write_log(opts.output, canvases, actions)
+    print(f"Synthesized {len(actions)} actions over {len(canvases)} canvases "
+          f"({actions[-1]['offset'] if actions else 0:.1f}s at {opts.rate}/s) → {opts.output}")
+
+
+# ---------------------------------------------------------------------
+# replay
+# ---------------------------------------------------------------------
+async def create_targets(client, canvases: dict, scale: int) -> dict:
+    """
+    Create one target canvas per (logged canvas, clone) pair.
+    """
+    async def create(key):
+        meta = canvases[key[0]]
+        response = await client.post("/canvas/create", json={
+            "name": f"replay-{meta.get('name') or key[0]}-{key[1]}",
+            "x": meta.get("width") or 800,
+            "y": meta.get("height") or 600,
+            "color": meta.get("background") or "#000000"
+        })
+        response.raise_for_status()
+        return key, response.json()["canvas_id"]
+
+    keys = [(cid, copy) for cid in canvases for copy in range(scale)]
+    return dict(await asyncio.gather(*(create(k) for k in keys)))
+
+
+async def replay(opts):
+    canvases, actions = read_log(opts.log)
+    for entry in actions:
+        canvases.setdefault(entry["canvas"], {"id": entry["canvas"]})
+    if opts.rate:
+        for entry, offset in zip(actions, poisson_offsets(len(actions), opts.rate, random.Random(opts.seed))):
+            entry["offset"] = offset
+
+    plan = [(entry["offset"] / opts.speed, copy, entry) for entry in actions for copy in range(opts.scale)]
+    plan.sort(key=lambda p: p[0])
+    overall = Recorder()
+    per_action = {}
+    lags = []
+    gate = asyncio.Semaphore(opts.concurrency)
+
+    async with _client(opts) as client:
+        targets = await create_targets(client, canvases, opts.scale)
+
+        async def send(item, scheduled=None):
+            _, copy, entry = item
+            params = dict(entry["params"], canvas_id=targets[(entry["canvas"], copy)])
+            body = {"action": entry["action"], "params": params}
+            async with gate:
+                rec = per_action.setdefault(entry["action"], Recorder())
+                await rec.timed(client.post("/canvas", json=body), start=scheduled)
+
+        with overall:
+            if opts.loop == "closed":
+                await run_pool(len(plan), opts.concurrency, lambda i: send(plan[i]))
+            else:
+                start = time.perf_counter()
+                tasks = []
+                for item in plan:
+                    scheduled = start + item[0]
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    lags.append(time.perf_counter() - scheduled)
+                    tasks.append(asyncio.create_task(send(item, scheduled)))
+                await asyncio.gather(*tasks)
+
+    for rec in per_action.values():
+        overall.latencies.extend(rec.latencies)
+        overall.errors += rec.errors
+        rec.started, rec.stopped = overall.started, overall.stopped
+    summary = overall.summary()
+    summary.update({
+        "loop": opts.loop,
+        "speed": opts.speed,
+        "scale": opts.scale,
+        "canvases": len(targets),
+        "offered_rps": round(len(plan) / plan[-1][0], 1) if plan and plan[-1][0] else None,
+        "max_dispatch_lag_ms": round(max(lags) * 1000, 3) if lags else None
+    })
+    results = {"summary": summary, "actions": {a: r.summary() for a, r in sorted(per_action.items())}}
+
+    print(f"{'TOTAL':18s} {summary['throughput_rps']:9.1f} req/s  p50 {summary['p50_ms']:8.2f}  "
+          f"p95 {summary['p95_ms']:8.2f}  p99 {summary['p99_ms']:8.2f} ms  errors {summary['errors']}")
+    for action, r in results["actions"].items():
+        print(f"{action:18s} {r['requests']:9d} req    p50 {r['p50_ms']:8.2f}  "
+              f"p95 {r['p95_ms']:8.2f}  p99 {r['p99_ms']:8.2f} ms  errors {r['errors']}")
+    if opts.json_path:
+        with open(opts.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crucial action-log recorder, synthesizer and replayer")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def server_args(p):
+        p.add_argument("--url", default="http://localhost:8000")
+        p.add_argument("--api-key")
+        p.add_argument("--concurrency", type=int, default=32, help="Max requests in flight")
+        p.add_argument("--timeout", type=float, default=30.0)
+
+    rec = sub.add_parser("record", help="Export canvases' action history to a log")
+    server_args(rec)
+    rec.add_argument("-c", "--canvas", action="append", required=True, help="Canvas UUID or human ID")
+    rec.add_argument("-o", "--output", required=True)
+
+    syn = sub.add_parser("synth", help="Generate a log of random schema-valid actions")
+    syn.add_argument("-n", "--count", type=int, default=1000)
+    syn.add_argument("--canvases", type=int, default=10)
+    syn.add_argument("--rate", type=float, default=100.0, help="Mean arrivals per second (Poisson)")
+    syn.add_argument("--mix", help="Weighted actions, e.g. draw_line:5,graph_bar:1 (default: all tools)")
+    syn.add_argument("--seed", type=int, default=0)
+    syn.add_argument("-o", "--output", required=True)
+
+    rep = sub.add_parser("replay", help="Send a log to a server and report latency")
+    server_args(rep)
+    rep.add_argument("log")
+    rep.add_argument("--loop", choices=("open", "closed"), default="open", help="Arrival process")
+    rep.add_argument("--speed", type=float, default=1.0, help="Time compression factor for offsets")
+    rep.add_argument("--scale", type=int, default=1, help="Replay each canvas this many times in parallel")
+    rep.add_argument("--rate", type=float, help="Override offsets with Poisson arrivals at this rate")
+    rep.add_argument("--seed", type=int, default=0)
+    rep.add_argument("--json", dest="json_path", help="Write results to this file")
+
+    opts = parser.parse_args()
+    if opts.command == "record":
+        asyncio.run(record(opts))
+    elif opts.command == "synth":
+        synth(opts)
+    else:
+        asyncio.run(replay(opts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: synth.py
+# Description: Synthesize random, schema-valid tool parameters
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Generate parameters that validate against a tool's JSON schema
+("parameters" block of crucial/schema/*.json). Supports the subset of
+JSON Schema the tool schemas use: object/array/string/number/integer/
+boolean, enum, minItems/maxItems, minimum/maximum and the hex-colour
+pattern.
+"""
+
+import random
+
+COORD_RANGE = (0, 800)
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel")
+TURTLE_COMMANDS = ("forward", "backward", "left", "right", "penup", "pendown")
+
+
+def hex_color(rng: random.Random) -> str:
+    return f"#{rng.randrange(0x1000000):06x}"
+
+
+def _turtle_command(rng: random.Random) -> str:
+    command = rng.choice(TURTLE_COMMANDS)
+    if command in ("forward", "backward"):
+        return f"{command} {rng.randint(5, 100)}"
+    if command in ("left", "right"):
+        return f"{command} {rng.choice((15, 30, 45, 60, 90, 120))}"
+    return command
+
+
+def _string(name: str, schema: dict, rng: random.Random) -> str:
+    if "pattern" in schema or name.endswith("color"):
+        return hex_color(rng)
+    if name == "commands":
+        return _turtle_command(rng)
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+
+def _number(schema: dict, rng: random.Random, integer: bool):
+    low = schema.get("minimum", COORD_RANGE[0])
+    high = schema.get("maximum", COORD_RANGE[1])
+    if integer:
+        return rng.randint(int(low), int(high))
+    return round(rng.uniform(low, high), 2)
+
+
+def synthesize_value(name: str, schema: dict, rng: random.Random, array_len: int = None):
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return synthesize(schema, rng, array_len=array_len)
+    if kind == "array":
+        low = schema.get("minItems", 1)
+        high = schema.get("maxItems", max(low, 8))
+        length = min(max(array_len, low), schema.get("maxItems", array_len)) if array_len else rng.randint(low, high)
+        item = schema.get("items", {"type": "number"})
+        # Nested arrays (e.g. heatmap rows) stay small so array_len scales linearly
+        inner = None if item.get("type") == "array" else array_len
+        return [synthesize_value(name, item, rng, inner) for _ in range(length)]
+    if kind == "string":
+        return _string(name, schema, rng)
+    if kind == "integer":
+        return _number(schema, rng, integer=True)
+    if kind == "number":
+        return _number(schema, rng, integer=False)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return None
+
+
+def synthesize(schema: dict, rng: random.Random = None, canvas_id: str = None,
+               optional: float = 0.5, array_len: int = None) -> dict:
+    """
+    Build a parameter dict for an object schema. Required properties are
+    always present; optional ones are included with probability `optional`.
+    `array_len` forces array lengths (within minItems/maxItems), which is
+    how benchmarks produce deliberately large payloads.
+    """
+    rng = rng or random.Random()
+    required = set(schema.get("required", ()))
+    params = {}
+    for name, prop in schema.get("properties", {}).items():
+        if name == "canvas_id" and canvas_id is not None:
+            params[name] = canvas_id
+        elif name in required or rng.random() < optional:
+            params[name] = synthesize_value(name, prop, rng, array_len)
+    return params
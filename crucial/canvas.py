@@ -10,70 +10,134 @@
 import os
 import json
 import uuid
+import sqlite3
 import asyncio
 from datetime import datetime
+from crucial import metrics
 from crucial.config import CONFIG, get_logger
-from crucial.db import get_db_connection
-from crucial.utils.human_id import generate_human_id
+from crucial.db import get_db_connection, record_action_stats, reset_action_stats
+from crucial.layout import compute as compute_layout
+from crucial.reduction import reduce as reduce_data, store_raw, delete_raw
+from crucial.spatial import record_action_bounds, delete_action_bounds
+from crucial.tracing import span
+from crucial.svg import write_svg
+from crucial.utils.human_id import HumanIdAllocator
 
 # External reference (injected at runtime in server.py)
 # canvas_subscribers = {}  # populated via FastAPI WebSocket route
 
 logger = get_logger(__name__)
 
+human_ids = HumanIdAllocator(
+    max_attempts=CONFIG["CANVAS"]["human_id_attempts"],
+    deterministic=CONFIG["CANVAS"]["human_id_mode"] == "deterministic"
+)
+
 class Canvas:
-    def __init__(self, name, width, height, bg_color):
-        self.id = str(uuid.uuid4())
+    def __init__(self, name, width, height, bg_color, human_id=None, owner=None, canvas_id=None):
+        self.id = canvas_id or str(uuid.uuid4())
         self.name = name
         self.width = width
         self.height = height
         self.bg_color = bg_color
         self.created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-        self._init_db()
+        self._init_db(human_id, owner)
         logger.info("Initialized canvas '%s' (%s) %dx%d bg=%s",
                     self.name, self.id, self.width, self.height, self.bg_color)
 
-    def _init_db(self):
+    def _init_db(self, reserved_human_id=None, owner=None):
         conn = get_db_connection()
         cur = conn.cursor()
-        self.human_id = generate_human_id()
-        cur.execute(
-            "INSERT INTO canvases (id, human_id, name, width, height, background, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (self.id, self.human_id, self.name, self.width, self.height, self.bg_color, self.created_at)
-        )
+
+        def try_claim(candidate):
+            try:
+                cur.execute(
+                    "INSERT INTO canvases (id, human_id, name, width, height, background, created_at, owner) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.id, candidate, self.name, self.width, self.height, self.bg_color, self.created_at, owner)
+                )
+                return True
+            except sqlite3.IntegrityError as e:
+                if "human_id" not in str(e):
+                    raise
+                logger.warning("Human ID collision on %s, retrying", candidate)
+                return False
+
+        try:
+            self.human_id = human_ids.allocate(try_claim, seed=self.id, preferred=reserved_human_id)
+        except Exception:
+            conn.rollback()
+            raise
         conn.commit()
         logger.debug("Canvas DB entry created: %s", self.id)
 
     def _store_action(self, action_type, parameters, overwrite=False):
+        """
+        Log an action (its graph data reduced first) and broadcast it.
+        Returns the reduction report, if the data was reduced.
+        """
         logger.info("Canvas[%s] action: %s(%s)", self.id, action_type, parameters)
-        conn = get_db_connection()
+        with span("db.connect"):
+            conn = get_db_connection()
         cur = conn.cursor()
         if overwrite:
+            delete_action_bounds(cur, [self.id])
+            delete_raw(cur, [self.id])
             cur.execute("DELETE FROM actions WHERE canvas_id = ?", (self.id,))
+            reset_action_stats(cur, self.id)
             logger.debug("Canvas[%s] previous actions cleared (overwrite=True)", self.id)
         timestamp = datetime.utcnow().isoformat()
-        cur.execute(
-            "INSERT INTO actions (canvas_id, timestamp, action, params) VALUES (?, ?, ?, ?)",
-            (self.id, timestamp, action_type, json.dumps(parameters))
-        )
-        conn.commit()
+        with span("reduce"):
+            reduction = reduce_data(action_type, parameters, self.width, self.height)
+        if reduction:
+            parameters = reduction.params
+        encoded = json.dumps(parameters)
+        with span("layout"):
+            resolved = compute_layout(action_type, parameters, self.width, self.height)
+        with span("db.insert"):
+            cur.execute(
+                "INSERT INTO actions (canvas_id, timestamp, action, params, layout) VALUES (?, ?, ?, ?, ?)",
+                (self.id, timestamp, action_type, encoded, resolved and json.dumps(resolved))
+            )
+            action_id = cur.lastrowid
+            size = len(encoded.encode())
+            if reduction and reduction.raw is not None:
+                size += store_raw(cur, self.id, action_id, reduction.raw)
+            record_action_stats(cur, self.id, action_type, size, action_id, timestamp)
+            record_action_bounds(cur, self.id, action_id, action_type, parameters, self.width, self.height)
+        with span("db.commit"):
+            conn.commit()
         logger.debug("Canvas[%s] action logged: %s", self.id, action_type)
 
         # WebSocket broadcast (if enabled and active)
-        asyncio.create_task(self._broadcast(action_type, parameters, timestamp))
+        task = asyncio.create_task(self._broadcast(action_type, parameters, timestamp, resolved))
+        _broadcast_tasks.add(task)
+        task.add_done_callback(_broadcast_tasks.discard)
+
+        if reduction:
+            metrics.REDUCED_POINTS.inc(reduction.report["points_in"] - reduction.report["points_out"],
+                                       action=action_type)
+            kept = {"raw_action_id": action_id} if reduction.raw is not None else {}
+            return {**reduction.report, **kept}
+        return None
 
-    async def _broadcast(self, action, params, timestamp):
+    async def _broadcast(self, action, params, timestamp, layout=None):
         message = json.dumps({
             "action": action,
             "params": params,
-            "timestamp": timestamp
+            "timestamp": timestamp,
+            "layout": layout
         })
         clients = list(canvas_subscribers.get(self.id, []))
-        for ws in clients:
-            try:
-                await ws.send_text(message)
-            except Exception as e:
-                logger.warning("WebSocket send failed: %s", e)
+        if not clients:
+            return
+        with metrics.BROADCAST_SECONDS.time(), span("broadcast", subscribers=len(clients)):
+            for ws in clients:
+                try:
+                    await ws.send_text(message)
+                    metrics.BROADCAST_MESSAGES.inc(result="sent")
+                except Exception as e:
+                    metrics.BROADCAST_MESSAGES.inc(result="failed")
+                    logger.warning("WebSocket send failed: %s", e)
 
     def _mark_type(self, type_name):
         conn = get_db_connection()
@@ -92,7 +156,10 @@ class Canvas:
         self._store_action("clear", {"canvas_id": canvas_id})  # Optional trace
         conn = get_db_connection()
         cur = conn.cursor()
+        delete_action_bounds(cur, [canvas_id])
+        delete_raw(cur, [canvas_id])
         cur.execute("DELETE FROM actions WHERE canvas_id = ?", (canvas_id,))
+        reset_action_stats(cur, canvas_id)
         conn.commit()
         logger.info("Canvas[%s] actions purged after clear marker", canvas_id)
 
@@ -119,18 +186,32 @@ class Canvas:
 
     # Graphs
     def graph_bar(self, **kwargs): self._store_action("graph_bar", kwargs)
-    def graph_line(self, **kwargs): self._store_action("graph_line", kwargs)
+    def graph_line(self, **kwargs): return self._store_action("graph_line", kwargs)
     def graph_pie(self, **kwargs): self._store_action("graph_pie", kwargs)
-    def graph_scatter(self, **kwargs): self._store_action("graph_scatter", kwargs)
-    def graph_histogram(self, **kwargs): self._store_action("graph_histogram", kwargs)
+    def graph_scatter(self, **kwargs): return self._store_action("graph_scatter", kwargs)
+    def graph_histogram(self, **kwargs): return self._store_action("graph_histogram", kwargs)
     def graph_heatmap(self, **kwargs): self._store_action("graph_heatmap", kwargs)
-    def graph_area(self, **kwargs): self._store_action("graph_area", kwargs)
+    def graph_area(self, **kwargs): return self._store_action("graph_area", kwargs)
     def graph_bubble(self, **kwargs): self._store_action("graph_bubble", kwargs)
     def graph_donut(self, **kwargs): self._store_action("graph_donut", kwargs)
     def graph_gauge(self, **kwargs): self._store_action("graph_gauge", kwargs)
     def graph_radar(self, **kwargs): self._store_action("graph_radar", kwargs)
     def graph_wordcloud(self, **kwargs): self._store_action("graph_wordcloud", kwargs)
 
+    def save(self, format="png", file_path=None):
+        """
+        Export the canvas into CONFIG["SAVE"]["output_dir"]. Only the file
+        name of `file_path` is used, so callers cannot write elsewhere.
+        """
+        if format != "svg":
+            raise ValueError(f"Export format not supported: {format}")
+        out_dir = CONFIG["SAVE"]["output_dir"]
+        os.makedirs(out_dir, exist_ok=True)
+        name = os.path.basename(file_path or "") or f"{self.human_id or self.id}.svg"
+        path = os.path.join(out_dir, name)
+        write_svg(self, path)
+        return path
+
     def load_actions(self):
         conn = get_db_connection()
         cur = conn.cursor()
@@ -163,6 +244,43 @@ class Canvas:
 
         return Canvas(name, width, height, bg_color)
 
+    @staticmethod
+    def create_many(specs: list, owner=None) -> list:
+        """
+        Create several canvases, reserving all their human IDs up front
+        with one uniqueness query per round instead of one per canvas.
+        The canvas UUIDs are drawn first so they can seed deterministic IDs.
+        """
+        def find_taken(candidates):
+            conn = get_db_connection()
+            try:
+                marks = ",".join("?" * len(candidates))
+                cur = conn.execute(f"SELECT human_id FROM canvases WHERE human_id IN ({marks})", candidates)
+                return {row["human_id"] for row in cur.fetchall()}
+            finally:
+                conn.close()
+
+        canvas_ids = [str(uuid.uuid4()) for _ in specs]
+        reserved = human_ids.reserve(len(specs), find_taken, seeds=canvas_ids)
+        results = []
+        for spec, canvas_id, human_id in zip(specs, canvas_ids, reserved):
+            canvas = Canvas(
+                spec.get("name", "Untitled"),
+                spec.get("x", 800),
+                spec.get("y", 600),
+                spec.get("color", "#000000"),
+                human_id=human_id,
+                owner=owner,
+                canvas_id=canvas_id
+            )
+            results.append({
+                "status": "created",
+                "canvas_id": canvas.id,
+                "human_id": canvas.human_id,
+                "metadata": canvas.__dict__
+            })
+        return results
+
     @staticmethod
     def load(canvas_id: str) -> "Canvas":
         resolved_id = Canvas.resolve_id(canvas_id)
@@ -196,10 +314,11 @@ class Canvas:
 
     @staticmethod
     def resolve_id(identifier: str) -> str:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id FROM canvases WHERE human_id = ?", (identifier,))
-        row = cur.fetchone()
+        with span("resolve_id"):
+            conn = get_db_connection()
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM canvases WHERE human_id = ?", (identifier,))
+            row = cur.fetchone()
         if row:
             logger.debug("Resolved human_id %s → %s", identifier, row["id"])
             return row["id"]
@@ -226,6 +345,13 @@ class Canvas:
         logger.debug("Canvas object loaded: %s (%s)", canvas.name, canvas.id)
         return canvas
 
+# Strong references keep fire-and-forget broadcasts alive until they finish,
+# and let shutdown wait for them.
+_broadcast_tasks = set()
+
+def pending_broadcasts() -> set:
+    return set(_broadcast_tasks)
+
 def set_canvas_subscribers(ref):
     global canvas_subscribers
     canvas_subscribers = ref
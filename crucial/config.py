@@ -5,7 +5,14 @@
 # Modified: 2025-05-09 20:48:53
 
 import os
+import json
+import queue
+import atexit
 import logging
+import reprlib
+from collections import defaultdict
+from collections.abc import Mapping
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,7 +24,8 @@ CONFIG = {
         "ssl_enabled": os.getenv("CRUCIAL_SSL", "false").lower() == "true",
         "ssl_cert": os.getenv("CRUCIAL_SSL_CERT", "cert.pem"),
         "ssl_key": os.getenv("CRUCIAL_SSL_KEY", "key.pem"),
-        "log_level": os.getenv("CRUCIAL_LOG_LEVEL", "info")
+        "log_level": os.getenv("CRUCIAL_LOG_LEVEL", "info"),
+        "drain_timeout": float(os.getenv("CRUCIAL_DRAIN_TIMEOUT", 10))
     },
     "CANVAS": {
         "default_width": int(os.getenv("CANVAS_WIDTH", 800)),
@@ -25,7 +33,20 @@ CONFIG = {
         "default_bg": os.getenv("CANVAS_BACKGROUND", "#000000"),
         "validate_schema": os.getenv("CANVAS_VALIDATE", "false").lower() == "true",
         "ttl_seconds": int(os.getenv("CANVAS_TTL_SECONDS", 10800)),
-        "cleanup_interval": int(os.getenv("CLEANUP_INTERVAL_SECONDS", 300))
+        "cleanup_interval": int(os.getenv("CLEANUP_INTERVAL_SECONDS", 300)),
+        "cleanup_lock_path": os.getenv("CLEANUP_LOCK_PATH", ""),
+        "human_id_mode": os.getenv("CANVAS_HUMAN_ID_MODE", "random"),
+        "human_id_attempts": int(os.getenv("CANVAS_HUMAN_ID_ATTEMPTS", 8)),
+        "bulk_create_max": int(os.getenv("CANVAS_BULK_CREATE_MAX", 100))
+    },
+    "EVICTION": {
+        "idle_seconds": int(os.getenv("EVICT_IDLE_SECONDS", 0)),
+        "byte_budget": int(os.getenv("EVICT_BYTE_BUDGET", 0)),
+        "budget_strategy": os.getenv("EVICT_BUDGET_STRATEGY", "lru"),
+        "low_water": float(os.getenv("EVICT_LOW_WATER", 0.9)),
+        "key_max_canvases": int(os.getenv("EVICT_KEY_MAX_CANVASES", 0)),
+        "key_max_bytes": int(os.getenv("EVICT_KEY_MAX_BYTES", 0)),
+        "batch_size": int(os.getenv("EVICT_BATCH_SIZE", 500))
     },
     "FRONTEND": {
         "enable_websocket": os.getenv("FRONTEND_ENABLE_WS", "true").lower() == "true",
@@ -37,7 +58,10 @@ CONFIG = {
     },
     "AUTH": {
         "require_api_key": os.getenv("AUTH_REQUIRE_API_KEY", "true").lower() == "true",
-        "keys_file": os.getenv("AUTH_KEYS_FILE", "keys.json")
+        "keys_file": os.getenv("AUTH_KEYS_FILE", "keys.json"),
+        "admin_keys_file": os.getenv("AUTH_ADMIN_KEYS_FILE", "admin_keys.json"),
+        # Serve /admin/* without an admin key (trusted networks only)
+        "open_admin": os.getenv("AUTH_OPEN_ADMIN", "false").lower() == "true"
     },
     "TOOLS": {
         "api_base_url": os.getenv("TOOLS_API_URL", "http://localhost:8000/canvas"),
@@ -47,36 +71,208 @@ CONFIG = {
     "LOGGING": {
         "log_to_file": os.getenv("CRUCIAL_LOG_TO_FILE", "true").lower() == "true",
         "log_path": os.getenv("CRUCIAL_LOG_PATH", "logs/crucial.log"),
-        "debug": os.getenv("CRUCIAL_LOG_DEBUG", "false").lower() == "true"
+        "debug": os.getenv("CRUCIAL_LOG_DEBUG", "false").lower() == "true",
+        "json": os.getenv("CRUCIAL_LOG_JSON", "false").lower() == "true",
+        "max_arg_chars": int(os.getenv("CRUCIAL_LOG_MAX_ARG_CHARS", 256)),
+        "debug_sample_every": int(os.getenv("CRUCIAL_LOG_DEBUG_SAMPLE", 1)),
+        "queue_size": int(os.getenv("CRUCIAL_LOG_QUEUE_SIZE", 10000))
+    },
+    "TRACING": {
+        "enabled": os.getenv("CRUCIAL_TRACING", "false").lower() == "true",
+        "slow_ms": float(os.getenv("CRUCIAL_SLOW_MS", 500)),
+        "slow_log_path": os.getenv("CRUCIAL_SLOW_LOG_PATH", "logs/slow.log"),
+        "otlp_path": os.getenv("CRUCIAL_TRACE_OTLP_PATH", "")
+    },
+    "PROFILING": {
+        "max_seconds": float(os.getenv("CRUCIAL_PROFILE_MAX_SECONDS", 60)),
+        "loop_lag_monitor": os.getenv("CRUCIAL_LOOP_LAG_MONITOR", "false").lower() == "true",
+        "loop_lag_threshold_ms": float(os.getenv("CRUCIAL_LOOP_LAG_THRESHOLD_MS", 100)),
+        "loop_lag_log_path": os.getenv("CRUCIAL_LOOP_LAG_LOG_PATH", "logs/loop_lag.log")
     },
     "SAVE": {
         "output_dir": os.getenv("CRUCIAL_SAVE_IMAGES_PATH", "images")
+    },
+    "TILES": {
+        "cache_dir": os.getenv("CRUCIAL_TILE_CACHE_DIR", "cache/tiles"),
+        "tile_size": int(os.getenv("CRUCIAL_TILE_SIZE", 256)),
+        "supersample": int(os.getenv("CRUCIAL_TILE_SUPERSAMPLE", 2))
+    },
+    "THUMBS": {
+        "enabled": os.getenv("CRUCIAL_THUMBNAILS", "true").lower() == "true",
+        "cache_dir": os.getenv("CRUCIAL_THUMB_CACHE_DIR", "cache/thumbs"),
+        "size": int(os.getenv("CRUCIAL_THUMB_SIZE", 256)),
+        "workers": int(os.getenv("CRUCIAL_THUMB_WORKERS", 2)),
+        "interval": int(os.getenv("CRUCIAL_THUMB_INTERVAL", 30)),
+        "queue_size": int(os.getenv("CRUCIAL_THUMB_QUEUE_SIZE", 10000))
+    },
+    "TIMELINE": {
+        "workers": int(os.getenv("CRUCIAL_TIMELINE_WORKERS", 1)),
+        "memory_mb": int(os.getenv("CRUCIAL_TIMELINE_MEMORY_MB", 1024))
+    },
+    "REDUCE": {
+        "enabled": os.getenv("CRUCIAL_REDUCE", "true").lower() == "true",
+        "min_points": int(os.getenv("CRUCIAL_REDUCE_MIN_POINTS", 2000)),
+        "line_method": os.getenv("CRUCIAL_REDUCE_LINE_METHOD", "minmax"),
+        "keep_raw": os.getenv("CRUCIAL_REDUCE_KEEP_RAW", "false").lower() == "true",
+        "raw_level": int(os.getenv("CRUCIAL_REDUCE_RAW_LEVEL", 6))
     }
 }
 
-def get_logger(name: str) -> logging.Logger:
-    os.makedirs(os.path.dirname(CONFIG["LOGGING"]["log_path"]), exist_ok=True)
+# ---------------------------------------------------------------------
+# Logging: every module logger feeds one bounded queue. A single listener
+# thread drains it into the shared stream and file handlers, so request
+# threads never block on log I/O.
+# ---------------------------------------------------------------------
+_arg_repr = reprlib.Repr()
+_arg_repr.maxlevel = 3
+_arg_repr.maxdict = 12
+_arg_repr.maxlist = 12
+_arg_repr.maxstring = 80
+_arg_repr.maxother = 80
+
+def summarize_arg(value, limit: int):
+    """
+    Return a bounded stand-in for a log argument. Containers are rendered
+    with reprlib, so a large matrix is never fully walked just to be cut.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        if len(value) <= limit:
+            return value
+        return f"{value[:limit]}...(+{len(value) - limit} chars)"
+    text = _arg_repr.repr(value)
+    return text if len(text) <= limit else f"{text[:limit]}..."
+
+
+class TruncatingQueueHandler(QueueHandler):
+    """
+    QueueHandler that shrinks oversized arguments before the record is
+    formatted, and drops records instead of blocking when the queue is full.
+    """
+    def __init__(self, log_queue, max_arg_chars: int):
+        super().__init__(log_queue)
+        self.max_arg_chars = max_arg_chars
+        self.dropped = 0
+
+    def prepare(self, record):
+        if record.args and not isinstance(record.args, Mapping):
+            record.args = tuple(summarize_arg(a, self.max_arg_chars) for a in record.args)
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DebugSampler(logging.Filter):
+    """
+    Pass only every Nth DEBUG record per (logger, message template).
+    """
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = defaultdict(int)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        count = self._counts[key]
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
 
+_queue_handler = None
+_listener = None
+
+def get_log_handler() -> TruncatingQueueHandler:
+    """
+    Return the process-wide queue handler, starting its listener on first use.
+    """
+    global _queue_handler, _listener
+    if _queue_handler is not None:
+        return _queue_handler
+
+    settings = CONFIG["LOGGING"]
+    if settings["json"]:
+        fmt = JsonFormatter(datefmt="%Y-%m-%d %H:%M:%S")
+    else:
+        fmt = logging.Formatter(
+            fmt="%(asctime)s [%(levelname)s] [%(name)s] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        )
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(fmt)
+    handlers = [stream]
+
+    if settings["log_to_file"]:
+        os.makedirs(os.path.dirname(settings["log_path"]) or ".", exist_ok=True)
+        file_handler = logging.FileHandler(settings["log_path"])
+        file_handler.setFormatter(fmt)
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=settings["queue_size"])
+    _queue_handler = TruncatingQueueHandler(log_queue, settings["max_arg_chars"])
+    _queue_handler.addFilter(DebugSampler(settings["debug_sample_every"]))
+    _listener = QueueListener(log_queue, *handlers)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _queue_handler
+
+def get_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
     if logger.handlers:
         return logger  # Prevent duplicate handlers
 
     level = logging.DEBUG if CONFIG["LOGGING"]["debug"] else logging.INFO
     logger.setLevel(level)
+    logger.addHandler(get_log_handler())
 
-    fmt = logging.Formatter(
-        fmt="%(asctime)s [%(levelname)s] [%(name)s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    return logger
 
-    stream = logging.StreamHandler()
-    stream.setFormatter(fmt)
-    logger.addHandler(stream)
+def get_file_logger(name: str, path: str, raw: bool = False) -> logging.Logger:
+    """
+    Return a logger writing only to its own file through a dedicated queue,
+    e.g. the slow-request log. `raw` writes bare messages (one per line).
+    """
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
 
-    if CONFIG["LOGGING"]["log_to_file"]:
-        file_handler = logging.FileHandler(CONFIG["LOGGING"]["log_path"])
-        file_handler.setFormatter(fmt)
-        logger.addHandler(file_handler)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_handler = logging.FileHandler(path)
+    if raw:
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+    else:
+        file_handler.setFormatter(logging.Formatter(
+            fmt="%(asctime)s [%(levelname)s] %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S"
+        ))
 
-    return logger
+    log_queue = queue.Queue(maxsize=CONFIG["LOGGING"]["queue_size"])
+    handler = TruncatingQueueHandler(log_queue, max_arg_chars=CONFIG["LOGGING"]["max_arg_chars"])
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
 
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
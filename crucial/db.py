@@ -7,9 +7,12 @@
 # Created: 2025-05-06
 # Modified: 2025-05-09 21:02:47
 
+import json
 import time
 import sqlite3
+import weakref
 from pathlib import Path
+from crucial import metrics
 from crucial.config import CONFIG, get_logger
 
 logger = get_logger(__name__)
@@ -25,14 +28,38 @@ TABLE_DEFINITIONS = {
         "width": "INTEGER",
         "height": "INTEGER",
         "background": "TEXT",
-        "created_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+        "created_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+        "owner": "TEXT"
     },
     "actions": {
         "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
         "canvas_id": "TEXT",
         "action": "TEXT",
         "params": "TEXT",
-        "timestamp": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+        "timestamp": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+        "layout": "TEXT"
+    },
+    "canvas_stats": {
+        "canvas_id": "TEXT PRIMARY KEY",
+        "action_count": "INTEGER NOT NULL DEFAULT 0",
+        "byte_size": "INTEGER NOT NULL DEFAULT 0",
+        "last_action_id": "INTEGER",
+        "last_action_at": "TIMESTAMP",
+        "action_counts": "TEXT NOT NULL DEFAULT '{}'",
+        "matrix": "TEXT"
+    },
+    "thumbnails": {
+        "canvas_id": "TEXT PRIMARY KEY",
+        "digest": "TEXT NOT NULL",
+        "action_count": "INTEGER NOT NULL DEFAULT 0",
+        "last_action_id": "INTEGER",
+        "rendered_at": "TIMESTAMP"
+    },
+    "action_raw": {
+        "action_id": "INTEGER PRIMARY KEY",
+        "canvas_id": "TEXT NOT NULL",
+        "encoding": "TEXT NOT NULL",
+        "data": "BLOB NOT NULL"
     },
     "api_keys": {
         "key": "TEXT PRIMARY KEY",
@@ -41,6 +68,23 @@ TABLE_DEFINITIONS = {
     }
 }
 
+# Created on existing databases too, unlike TABLE_SETUP
+INDEX_DEFINITIONS = {
+    "idx_actions_canvas_log": "CREATE INDEX IF NOT EXISTS idx_actions_canvas_log ON actions (canvas_id, timestamp, id)",
+    "idx_thumbnails_digest": "CREATE INDEX IF NOT EXISTS idx_thumbnails_digest ON thumbnails (digest)",
+    "idx_action_raw_canvas": "CREATE INDEX IF NOT EXISTS idx_action_raw_canvas ON action_raw (canvas_id)"
+}
+
+class TrackedConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection that keeps the open-connection gauge current.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        metrics.DB_CONNECTIONS_OPENED.inc()
+        metrics.DB_CONNECTIONS.inc()
+        weakref.finalize(self, metrics.DB_CONNECTIONS.dec)
+
 def init_db():
     """
     Create all Crucial database tables if not already present.
@@ -54,7 +98,7 @@ def get_db_connection():
     Return a SQLite connection, automatically ensuring DB schema is current.
     """
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, factory=TrackedConnection)
     conn.row_factory = sqlite3.Row
     logger.debug("Opened DB connection to %s", DB_PATH)
     _ensure_tables_exist(conn)
@@ -72,6 +116,8 @@ def _ensure_tables_exist(conn):
             # Create full table
             col_defs = ",\n    ".join([f"{name} {ctype}" for name, ctype in columns.items()])
             cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} (\n    {col_defs}\n)")
+            if table in TABLE_SETUP:
+                TABLE_SETUP[table](cursor)
         else:
             # Check for missing columns and patch them
             cursor.execute(f"PRAGMA table_info({table})")
@@ -80,32 +126,174 @@ def _ensure_tables_exist(conn):
                 if col_name not in existing_columns:
                     cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}")
 
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    existing_indexes = {row[0] for row in cursor.fetchall()}
+    for name, ddl in INDEX_DEFINITIONS.items():
+        if name not in existing_indexes:
+            cursor.execute(ddl)
+            logger.info("Created index %s", name)
+
+    if "action_bounds" not in existing_tables:
+        from crucial.spatial import create_index
+        create_index(cursor)
+
     conn.commit()
     logger.debug("Ensured DB tables are up to date")
 
+def _setup_canvas_stats(cursor):
+    """
+    Index the stats table for listing/eviction order and backfill it from
+    any actions written before it existed.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_canvas_stats_last_action ON canvas_stats (last_action_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_canvas_stats_bytes ON canvas_stats (byte_size)")
+    cursor.execute("""
+        INSERT OR REPLACE INTO canvas_stats
+            (canvas_id, action_count, byte_size, last_action_id, last_action_at, action_counts)
+        SELECT canvas_id, SUM(n), SUM(bytes), MAX(last_id), MAX(last_at), json_group_object(action, n)
+        FROM (
+            SELECT canvas_id, action, COUNT(*) AS n, SUM(length(CAST(params AS BLOB))) AS bytes,
+                   MAX(id) AS last_id, MAX(timestamp) AS last_at
+            FROM actions GROUP BY canvas_id, action
+        )
+        GROUP BY canvas_id
+    """)
+    logger.info("Created canvas_stats (backfilled %d canvases)", cursor.rowcount)
+
+TABLE_SETUP = {
+    "canvas_stats": _setup_canvas_stats
+}
+
 def _get_existing_tables(cursor):
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
     return {row[0] for row in cursor.fetchall()}
 
-def cleanup_expired_canvases():
-    ttl = CONFIG["CANVAS"]["ttl_seconds"]
+# ---------------------------------------------------------------------
+# Canvas statistics
+#
+# canvas_stats is maintained by the same transaction that writes actions,
+# so callers pass their cursor and commit themselves.
+# ---------------------------------------------------------------------
+STATS_SORT_COLUMNS = {
+    "created_at": "c.created_at",
+    "last_action_at": "COALESCE(s.last_action_at, c.created_at)",
+    "action_count": "COALESCE(s.action_count, 0)",
+    "byte_size": "COALESCE(s.byte_size, 0)",
+    "name": "c.name"
+}
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+def record_action_stats(cursor, canvas_id: str, action: str, byte_size: int, action_id: int, timestamp: str):
+    cursor.execute("""
+        INSERT INTO canvas_stats
+            (canvas_id, action_count, byte_size, last_action_id, last_action_at, action_counts)
+        VALUES (?, 1, ?, ?, ?, json_object(?, 1))
+        ON CONFLICT(canvas_id) DO UPDATE SET
+            action_count = action_count + 1,
+            byte_size = byte_size + excluded.byte_size,
+            last_action_id = excluded.last_action_id,
+            last_action_at = excluded.last_action_at,
+            action_counts = json_set(action_counts, '$."' || ? || '"',
+                COALESCE(json_extract(action_counts, '$."' || ? || '"'), 0) + 1)
+    """, (canvas_id, byte_size, action_id, timestamp, action, action, action))
 
-    cur.execute("""
-        SELECT id FROM canvases
-        WHERE datetime(created_at) < datetime('now', ? || ' seconds')
-    """, (-ttl,))
-    expired = [row["id"] for row in cur.fetchall()]
+def reset_action_stats(cursor, canvas_id: str):
+    """
+    Zero a canvas's counters and transform after its actions were deleted,
+    keeping the last-activity time.
+    """
+    cursor.execute(
+        "UPDATE canvas_stats SET action_count = 0, byte_size = 0, action_counts = '{}', matrix = NULL"
+        " WHERE canvas_id = ?",
+        (canvas_id,)
+    )
 
-    if not expired:
-        logger.info("No expired canvases to clean.")
-        return
+def _stats_dict(row) -> dict:
+    return {
+        "action_count": row["action_count"] or 0,
+        "byte_size": row["byte_size"] or 0,
+        "last_action_id": row["last_action_id"],
+        "last_action_at": row["last_action_at"],
+        "action_counts": json.loads(row["action_counts"] or "{}")
+    }
 
-    cur.executemany("DELETE FROM actions WHERE canvas_id = ?", [(cid,) for cid in expired])
-    cur.executemany("DELETE FROM canvases WHERE id = ?", [(cid,) for cid in expired])
-    conn.commit()
+def get_canvas_stats(canvas_id: str) -> dict:
+    cur = get_db_connection().cursor()
+    cur.execute("SELECT * FROM canvas_stats WHERE canvas_id = ?", (canvas_id,))
+    row = cur.fetchone()
+    if not row:
+        return {"action_count": 0, "byte_size": 0, "last_action_id": None,
+                "last_action_at": None, "action_counts": {}}
+    return _stats_dict(row)
 
-    logger.info("Expired canvas cleanup complete. Removed %d canvases", len(expired))
+def list_canvas_stats(sort: str = "last_action_at", order: str = "desc", limit: int = 50, offset: int = 0) -> dict:
+    """
+    Page through canvases with their stats. Canvases that never received
+    an action are included with zero counts.
+    """
+    if sort not in STATS_SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(STATS_SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
 
+    cur = get_db_connection().cursor()
+    cur.execute("SELECT COUNT(*) FROM canvases")
+    total = cur.fetchone()[0]
+    cur.execute(f"""
+        SELECT c.id, c.human_id, c.name, c.created_at,
+               s.action_count, s.byte_size, s.last_action_id, s.last_action_at, s.action_counts
+        FROM canvases c LEFT JOIN canvas_stats s ON s.canvas_id = c.id
+        ORDER BY {STATS_SORT_COLUMNS[sort]} {order.upper()}, c.id
+        LIMIT ? OFFSET ?
+    """, (limit, offset))
+    canvases = [
+        {"id": row["id"], "human_id": row["human_id"], "name": row["name"],
+         "created_at": row["created_at"], **_stats_dict(row)}
+        for row in cur.fetchall()
+    ]
+    return {"total": total, "sort": sort, "order": order, "limit": limit, "offset": offset, "canvases": canvases}
+
+def connect_readonly(path=None):
+    """
+    Read-only connection for worker processes that only replay logs.
+    """
+    uri = Path(path or DB_PATH).resolve().as_uri() + "?mode=ro"
+    return sqlite3.connect(uri, uri=True, factory=TrackedConnection, check_same_thread=False)
+
+def iter_actions(canvas_id: str, batch_size: int = 500, conn=None):
+    """
+    Yield (action, params_json, layout_json) for a canvas in log order;
+    layout_json is the stored crucial.layout geometry or None. Rows are read
+    in keyset-paginated batches, each a complete statement, so a slow
+    consumer never holds a read lock open against writers. Actions
+    written during iteration may or may not be included. Pass `conn` to
+    read through an existing connection instead of a dedicated one.
+    """
+    # Generators under StreamingResponse resume on different threads, one at a time
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(DB_PATH, factory=TrackedConnection, check_same_thread=False)
+    try:
+        last = ("", 0)
+        while True:
+            rows = conn.execute("""
+                SELECT id, timestamp, action, params, layout FROM actions
+                WHERE canvas_id = ? AND (timestamp, id) > (?, ?)
+                ORDER BY timestamp, id LIMIT ?
+            """, (canvas_id, *last, batch_size)).fetchall()
+            for row in rows:
+                yield row[2], row[3], row[4]
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1][1], rows[-1][0])
+    finally:
+        if own:
+            conn.close()
+
+def cleanup_expired_canvases():
+    """
+    Run one eviction sweep (TTL plus any configured idle, budget and quota
+    policies) and return its report.
+    """
+    from crucial.eviction import get_engine
+    with metrics.CLEANUP_SECONDS.time():
+        return get_engine().run()
@@ -7,12 +7,16 @@
 # Created: 2025-05-08 02:31:08
 # Modified: 2025-05-08 19:15:27
 
+import time
 import jsonschema
 from fastapi import HTTPException
 from importlib import import_module
+from crucial import metrics
 from crucial.canvas import Canvas
+from crucial.reduction import REDUCERS
 from crucial.registry import get_action_to_schema, get_action_to_method
 from crucial.config import get_logger
+from crucial.tracing import span
 
 logger = get_logger(__name__)
 
@@ -39,7 +43,8 @@ class Dispatcher:
         if not schema:
             raise HTTPException(status_code=404, detail=f"Unknown action: {action}")
         try:
-            jsonschema.validate(params, schema)
+            with span("validate"):
+                jsonschema.validate(params, schema)
         except jsonschema.ValidationError as e:
             logger.warning("Validation failed for action %s: %s", action, e.message)
             raise HTTPException(status_code=400, detail=f"Validation error: {e.message}")
@@ -47,12 +52,31 @@ class Dispatcher:
     def dispatch(self, action: str, params: dict) -> dict:
         """
         Dispatch an action to the appropriate Canvas method.
+        Records per-action counts and latency, plus per-stage timings.
         """
+        start = time.perf_counter()
+        status = "500"
+        try:
+            with span("dispatch", action=action):
+                result = self._dispatch(action, params, start)
+            status = "200"
+            return result
+        except HTTPException as e:
+            status = str(e.status_code)
+            raise
+        finally:
+            label = action if action in self.methods else "unknown"
+            metrics.ACTIONS.inc(action=label, status=status)
+            metrics.ACTION_SECONDS.observe(time.perf_counter() - start, action=label)
+
+    def _dispatch(self, action: str, params: dict, start: float) -> dict:
         if action not in self.methods:
             logger.warning("Unknown or disallowed action: %s", action)
             raise HTTPException(status_code=404, detail=f"Unknown action: {action}")
 
         self.validate(action, params)
+        mark = time.perf_counter()
+        metrics.STAGE_SECONDS.observe(mark - start, stage="validate")
         method_name = self.methods[action]
         method = getattr(Canvas, method_name, None)
 
@@ -63,7 +87,9 @@ class Dispatcher:
         # Special case: create() does not require canvas_id
         if action == "create":
             try:
-                result = method(**params)
+                with span("storage"):
+                    result = method(**params)
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - mark, stage="storage")
                 logger.info("Canvas created successfully")
                 return result
             except Exception as e:
@@ -75,7 +101,11 @@ class Dispatcher:
         if not canvas_id:
             raise HTTPException(status_code=400, detail="Missing canvas_id")
 
-        canvas = Canvas.from_id(canvas_id)
+        with span("lookup"):
+            canvas = Canvas.from_id(canvas_id)
+        now = time.perf_counter()
+        metrics.STAGE_SECONDS.observe(now - mark, stage="lookup")
+        mark = now
         if not canvas:
             logger.warning("[Canvas API] Canvas %s not found. (HTTP 404)", canvas_id)
             raise HTTPException(status_code=404, detail=f"Canvas not found: {canvas_id}")
@@ -84,11 +114,46 @@ class Dispatcher:
         logger.debug("Dispatching action: %s with params: %s", action, params)
 
         try:
-            method(canvas, **params)
+            with span("storage"):
+                reduction = method(canvas, **params)
         except Exception as e:
             logger.exception("Error while executing action: %s", action)
             raise HTTPException(status_code=500, detail=f"Dispatch failure: {str(e)}")
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - mark, stage="storage")
 
         logger.info("Action executed: %s on canvas %s", action, canvas_id)
-        return {"status": "ok", "action": action, "canvas_id": canvas_id}
+        result = {"status": "ok", "action": action, "canvas_id": canvas_id}
+        if action in REDUCERS and reduction:
+            result["reduction"] = reduction
+        return result
+
+
+    def dispatch_batch(self, actions: list) -> list:
+        """
+        Dispatch a list of {"action": ..., "params": ...} entries in order.
+        A failing entry is reported in its own result slot and does not
+        abort the rest of the batch.
+        """
+        results = []
+        for entry in actions:
+            if not isinstance(entry, dict) or not entry.get("action"):
+                results.append({"status": "error", "code": 400, "detail": "Missing 'action' field"})
+                continue
+
+            action = entry["action"]
+            params = entry.get("params") or {}
+            if not isinstance(params, dict):
+                results.append({"status": "error", "action": action, "code": 400,
+                                "detail": "'params' must be an object"})
+                continue
+            try:
+                result = self.dispatch(action, params)
+                results.append({"status": "ok", "result": result})
+            except HTTPException as e:
+                results.append({"status": "error", "action": action, "code": e.status_code, "detail": e.detail})
+            except Exception as e:
+                logger.exception("Batch entry failed: %s", action)
+                results.append({"status": "error", "action": action, "code": 500, "detail": f"Dispatch failure: {e}"})
 
+        logger.info("Batch executed: %d actions", len(actions))
+        return results
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: eviction.py
+# Description: Policy-driven canvas eviction run by the background cleanup sweep
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Each sweep asks the enabled policies, in order, for canvases to evict and
+deletes at most `batch_size` of them, so a large backlog is worked off
+over several sweeps instead of one long write lock. Policies read
+canvas_stats, so no sweep scans the actions table.
+
+    ttl     created longer ago than CANVAS_TTL_SECONDS
+    idle    no action (or, if never drawn on, no creation) for EVICT_IDLE_SECONDS
+    budget  total action bytes above EVICT_BYTE_BUDGET; evicts "lru" or
+            "largest" canvases until usage drops to the low-water mark
+    quota   per API key limits on canvas count and bytes; evicts that
+            key's least recently active canvases
+"""
+
+import time
+from hashlib import sha256
+from collections import Counter
+from crucial import metrics
+from crucial.config import CONFIG, get_logger
+from crucial.db import get_db_connection
+from crucial.reduction import delete_raw
+from crucial.spatial import delete_action_bounds
+from crucial.tiles import get_tile_cache
+from crucial.thumbs import delete_thumbnails, collect
+
+logger = get_logger(__name__)
+
+EVICTIONS = metrics.Counter(
+    "crucial_evictions_total", "Canvases evicted by policy", ("policy",))
+EVICTED_BYTES = metrics.Counter(
+    "crucial_evicted_bytes_total", "Action bytes freed by eviction", ("policy",))
+
+ACTIVITY = "COALESCE(s.last_action_at, c.created_at)"
+BYTES = "COALESCE(s.byte_size, 0)"
+FROM_CANVASES = "FROM canvases c LEFT JOIN canvas_stats s ON s.canvas_id = c.id"
+
+
+def owner_fingerprint(api_key: str):
+    """
+    Stable, non-reversible owner tag stored on canvases instead of the key.
+    """
+    return sha256(api_key.encode()).hexdigest()[:16] if api_key else None
+
+
+class EvictionPolicy:
+    name = "base"
+
+    def select(self, cur, limit: int, exclude: dict) -> list:
+        """
+        Return up to `limit` (canvas_id, bytes, reason) tuples. `exclude`
+        maps canvas IDs already chosen this sweep to their byte sizes.
+        """
+        raise NotImplementedError
+
+
+class TTLPolicy(EvictionPolicy):
+    name = "ttl"
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+
+    def select(self, cur, limit, exclude):
+        cur.execute(f"""
+            SELECT c.id, {BYTES} AS bytes, c.created_at {FROM_CANVASES}
+            WHERE datetime(c.created_at) < datetime('now', ? || ' seconds')
+            ORDER BY c.created_at LIMIT ?
+        """, (-self.ttl_seconds, limit + len(exclude)))
+        return [(row["id"], row["bytes"], f"created {row['created_at']}, ttl {self.ttl_seconds}s")
+                for row in cur.fetchall() if row["id"] not in exclude][:limit]
+
+
+class IdlePolicy(EvictionPolicy):
+    name = "idle"
+
+    def __init__(self, idle_seconds: int):
+        self.idle_seconds = idle_seconds
+
+    def select(self, cur, limit, exclude):
+        cur.execute(f"""
+            SELECT c.id, {BYTES} AS bytes, {ACTIVITY} AS active {FROM_CANVASES}
+            WHERE datetime({ACTIVITY}) < datetime('now', ? || ' seconds')
+            ORDER BY datetime({ACTIVITY}) LIMIT ?
+        """, (-self.idle_seconds, limit + len(exclude)))
+        return [(row["id"], row["bytes"], f"idle since {row['active']}")
+                for row in cur.fetchall() if row["id"] not in exclude][:limit]
+
+
+class ByteBudgetPolicy(EvictionPolicy):
+    name = "budget"
+    ORDER = {"lru": f"datetime({ACTIVITY}) ASC", "largest": f"{BYTES} DESC"}
+
+    def __init__(self, budget_bytes: int, strategy: str = "lru", low_water: float = 0.9):
+        if strategy not in self.ORDER:
+            raise ValueError(f"Unknown byte budget strategy: {strategy}")
+        self.budget_bytes = budget_bytes
+        self.strategy = strategy
+        self.low_water = low_water
+
+    def select(self, cur, limit, exclude):
+        cur.execute("SELECT COALESCE(SUM(byte_size), 0) FROM canvas_stats")
+        total = cur.fetchone()[0]
+        if total <= self.budget_bytes:
+            return []
+        # Canvases other policies already picked count towards the target
+        to_free = total - int(self.budget_bytes * self.low_water) - sum(exclude.values())
+        selected, freed = [], 0
+        cur.execute(f"SELECT c.id, {BYTES} AS bytes {FROM_CANVASES} ORDER BY {self.ORDER[self.strategy]}")
+        for row in cur:
+            if freed >= to_free or len(selected) >= limit:
+                break
+            if row["id"] in exclude:
+                continue
+            freed += row["bytes"]
+            selected.append((row["id"], row["bytes"],
+                             f"db {total} B over budget {self.budget_bytes} B ({self.strategy})"))
+        return selected
+
+
+class KeyQuotaPolicy(EvictionPolicy):
+    name = "quota"
+
+    def __init__(self, max_canvases: int = 0, max_bytes: int = 0):
+        self.max_canvases = max_canvases
+        self.max_bytes = max_bytes
+
+    def select(self, cur, limit, exclude):
+        limits, args = [], []
+        if self.max_canvases:
+            limits.append("rank > ?")
+            args.append(self.max_canvases)
+        if self.max_bytes:
+            limits.append("used > ?")
+            args.append(self.max_bytes)
+        # Rank each owner's canvases newest-first; everything past the limit goes
+        cur.execute(f"""
+            SELECT id, owner, bytes, rank, used FROM (
+                SELECT c.id, c.owner, {BYTES} AS bytes,
+                       ROW_NUMBER() OVER w AS rank,
+                       SUM({BYTES}) OVER (w ROWS UNBOUNDED PRECEDING) AS used
+                {FROM_CANVASES}
+                WHERE c.owner IS NOT NULL
+                WINDOW w AS (PARTITION BY c.owner ORDER BY datetime({ACTIVITY}) DESC, c.id)
+            )
+            WHERE {" OR ".join(limits)}
+            LIMIT ?
+        """, (*args, limit + len(exclude)))
+        return [(row["id"], row["bytes"],
+                 f"key {row['owner'][:8]} over quota (canvas #{row['rank']}, {row['used']} B)")
+                for row in cur.fetchall() if row["id"] not in exclude][:limit]
+
+
+class EvictionEngine:
+    def __init__(self, policies: list, batch_size: int = 500, chunk_size: int = 100):
+        self.policies = policies
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.last_report = None
+
+    def _delete(self, conn, ids: list):
+        for start in range(0, len(ids), self.chunk_size):
+            chunk = ids[start:start + self.chunk_size]
+            marks = ",".join("?" * len(chunk))
+            cur = conn.cursor()
+            delete_action_bounds(cur, chunk)
+            delete_raw(cur, chunk)
+            digests = delete_thumbnails(cur, chunk)
+            cur.execute(f"DELETE FROM actions WHERE canvas_id IN ({marks})", chunk)
+            cur.execute(f"DELETE FROM canvas_stats WHERE canvas_id IN ({marks})", chunk)
+            cur.execute(f"DELETE FROM canvases WHERE id IN ({marks})", chunk)
+            conn.commit()  # short transactions so request writes interleave
+            collect(conn, digests)
+
+    def run(self) -> dict:
+        """
+        Run one incremental sweep and return a report of what was evicted and why.
+        """
+        started = time.perf_counter()
+        conn = get_db_connection()
+        cur = conn.cursor()
+        evicted, chosen = [], {}
+
+        for policy in self.policies:
+            room = self.batch_size - len(chosen)
+            if room <= 0:
+                break
+            for canvas_id, size, reason in policy.select(cur, room, chosen):
+                chosen[canvas_id] = size
+                evicted.append({"canvas_id": canvas_id, "policy": policy.name, "bytes": size, "reason": reason})
+
+        self._delete(conn, [e["canvas_id"] for e in evicted])
+        get_tile_cache().purge(e["canvas_id"] for e in evicted)
+
+        by_policy = Counter()
+        for entry in evicted:
+            by_policy[entry["policy"]] += 1
+            EVICTIONS.inc(policy=entry["policy"])
+            EVICTED_BYTES.inc(entry["bytes"], policy=entry["policy"])
+            logger.debug("Evicted canvas %s [%s]: %s", entry["canvas_id"], entry["policy"], entry["reason"])
+
+        self.last_report = {
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "policies": [p.name for p in self.policies],
+            "evicted_count": len(evicted),
+            "evicted_bytes": sum(e["bytes"] for e in evicted),
+            "by_policy": dict(by_policy),
+            "backlog": len(evicted) >= self.batch_size,
+            "evicted": evicted
+        }
+        if evicted:
+            logger.info("Eviction sweep removed %d canvases (%s)%s", len(evicted),
+                        ", ".join(f"{k}={v}" for k, v in by_policy.items()),
+                        "; more pending" if self.last_report["backlog"] else "")
+        else:
+            logger.info("Eviction sweep: nothing to evict")
+        return self.last_report
+
+
+def build_engine() -> EvictionEngine:
+    """
+    Assemble the policies enabled in CONFIG. A limit of 0 disables a policy.
+    """
+    settings = CONFIG["EVICTION"]
+    policies = []
+    if CONFIG["CANVAS"]["ttl_seconds"] > 0:
+        policies.append(TTLPolicy(CONFIG["CANVAS"]["ttl_seconds"]))
+    if settings["idle_seconds"] > 0:
+        policies.append(IdlePolicy(settings["idle_seconds"]))
+    if settings["key_max_canvases"] > 0 or settings["key_max_bytes"] > 0:
+        policies.append(KeyQuotaPolicy(settings["key_max_canvases"], settings["key_max_bytes"]))
+    if settings["byte_budget"] > 0:
+        policies.append(ByteBudgetPolicy(settings["byte_budget"], settings["budget_strategy"], settings["low_water"]))
+    return EvictionEngine(policies, batch_size=settings["batch_size"])
+
+
+_engine = None
+
+def get_engine() -> EvictionEngine:
+    global _engine
+    if _engine is None:
+        _engine = build_engine()
+    return _engine
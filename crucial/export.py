@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: export.py
+# Description: Parallel batch export of every canvas to PNG/SVG with resumable checkpoints
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Export every canvas in the database with the Python renderers, one
+process per core, without a browser:
+
+    python -m crucial.export --out archive/2025-05-12
+    python -m crucial.export --out archive/2025-05-12 --format svg --workers 4
+    python -m crucial.export --out archive/2025-05-12 --restart
+
+Canvas IDs are streamed from the database in ID order and handed out in
+chunks of --chunk; each worker process opens one read-only connection
+and writes <out>/<format>/<canvas_id>.<format> through a temporary file
+and rename, so an interrupted run never leaves a truncated export.
+
+<out>/checkpoint.json records the highest ID below which every chunk has
+finished, and the canvases below it that failed. A rerun with the same
+--out retries those failures first, then resumes after the mark (chunks
+that had finished past it are simply exported again); --restart ignores
+it. The export exits non-zero while any failure remains.
+
+A chunk whose worker dies (say, killed for memory) is recorded as failed
+and retried one canvas per task on a fresh pool, so only the canvas that
+kills its worker stays failed.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from collections import deque
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from crucial.db import DB_PATH, connect_readonly, iter_actions
+from crucial.raster import render_log
+from crucial.svg import iter_svg, chunked
+
+FORMATS = ("png", "svg")
+
+_conn = None
+
+
+def _init_worker(db_path):
+    global _conn
+    _conn = connect_readonly(db_path)
+
+
+def _atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return os.path.getsize(path)
+
+
+def export_canvas(conn, canvas_id, out, formats, scale=1.0) -> int:
+    """
+    Write one canvas in each of `formats`; returns bytes written.
+    """
+    row = conn.execute("SELECT width, height, background FROM canvases WHERE id = ?", (canvas_id,)).fetchone()
+    if row is None:
+        return 0  # deleted since it was listed
+    width, height, background = row
+    written = 0
+    for fmt in formats:
+        path = os.path.join(out, fmt, f"{canvas_id}.{fmt}")
+        if fmt == "png":
+            image = render_log(width, height, background, iter_actions(canvas_id, conn=conn), scale)
+            written += _atomic(path, lambda tmp: image.save(tmp, "PNG"))
+        else:
+            def write(tmp):
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for chunk in chunked(iter_svg(width, height, background, iter_actions(canvas_id, conn=conn))):
+                        f.write(chunk)
+            written += _atomic(path, write)
+    return written
+
+
+def export_chunk(canvas_ids, out, formats, scale):
+    """
+    Pool entry point. Returns (exported, bytes, failures).
+    """
+    exported, written, failures = 0, 0, []
+    for canvas_id in canvas_ids:
+        try:
+            written += export_canvas(_conn, canvas_id, out, formats, scale)
+            exported += 1
+        except Exception as e:
+            failures.append((canvas_id, f"{type(e).__name__}: {e}"))
+    return exported, written, failures
+
+
+def _new_pool(opts):
+    return ProcessPoolExecutor(opts.workers, mp_context=get_context("spawn"),
+                               initializer=_init_worker, initargs=(str(opts.db),))
+
+
+def _drain(queue):
+    while queue:
+        yield queue.popleft()
+
+
+def iter_chunks(conn, after, size):
+    """
+    Yield lists of up to `size` canvas IDs greater than `after`, in order.
+    """
+    while True:
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM canvases WHERE id > ? ORDER BY id LIMIT ?", (after, size))]
+        if not ids:
+            return
+        yield ids
+        after = ids[-1]
+
+
+class Checkpoint:
+    """
+    Low-water mark over chunks that finish out of order.
+    """
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.state = {"after": "", "exported": 0, "bytes": 0, "failed": []}
+        if not restart and os.path.exists(path):
+            with open(path) as f:
+                self.state.update(json.load(f))
+        # Failures past the mark are exported again with their chunks
+        self.state["failed"] = [f for f in self.state["failed"] if f[0] <= self.state["after"]]
+        self._pending = []    # last ID of each submitted chunk, in order
+        self._finished = set()
+
+    def submitted(self, last_id):
+        self._pending.append(last_id)
+
+    def retries(self):
+        """
+        IDs of the recorded failures, to export again before resuming.
+        """
+        return [canvas_id for canvas_id, _ in self.state["failed"]]
+
+    def finished(self, ids, exported, written, failures, retried=False):
+        self.state["exported"] += exported
+        self.state["bytes"] += written
+        if retried:
+            # Replace the old failures of these IDs with the new ones, if any
+            done = set(ids)
+            self.state["failed"] = [f for f in self.state["failed"] if f[0] not in done]
+            self.state["failed"].extend(failures)
+            return
+        self.state["failed"].extend(failures)
+        self._finished.add(ids[-1])
+        while self._pending and self._pending[0] in self._finished:
+            self._finished.remove(self._pending[0])
+            self.state["after"] = self._pending.pop(0)
+
+    def save(self):
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def run(opts) -> dict:
+    for fmt in opts.formats:
+        os.makedirs(os.path.join(opts.out, fmt), exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(opts.out, "checkpoint.json"), opts.restart)
+    if checkpoint.state["after"]:
+        print(f"Resuming after {checkpoint.state['after']} ({checkpoint.state['exported']} already exported)")
+    retries = checkpoint.retries()
+    if retries:
+        print(f"Retrying {len(retries)} canvases that failed before")
+
+    conn = connect_readonly(opts.db)
+    total = conn.execute("SELECT COUNT(*) FROM canvases WHERE id > ?", (checkpoint.state["after"],)).fetchone()[0]
+    total += len(retries)
+    print(f"Exporting {total} canvases as {'+'.join(opts.formats)} with {opts.workers} workers")
+
+    started = time.perf_counter()
+    last_report = started
+    exported = written = 0
+    pool = _new_pool(opts)
+    pending = {}
+    isolated = deque()  # canvases of chunks whose worker died, one per task
+    try:
+        chunks = itertools.chain(
+            ((True, retries[i:i + opts.chunk]) for i in range(0, len(retries), opts.chunk)),
+            ((False, ids) for ids in iter_chunks(conn, checkpoint.state["after"], opts.chunk))
+        )
+        while True:
+            # Keep every worker busy without materializing the whole ID list
+            for retried, ids in itertools.chain(_drain(isolated), chunks):
+                future = pool.submit(export_chunk, ids, opts.out, opts.formats, opts.scale)
+                pending[future] = (ids, retried, pool)
+                if not retried:
+                    checkpoint.submitted(ids[-1])
+                if len(pending) >= opts.workers * 2:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ids, retried, used = pending.pop(future)
+                requeued = False
+                try:
+                    n, size, failures = future.result()
+                except Exception as e:
+                    n, size, failures = 0, 0, [(canvas_id, f"{type(e).__name__}: {e}") for canvas_id in ids]
+                    if isinstance(e, BrokenProcessPool):
+                        if used is pool:
+                            print("Worker died; starting a new pool", file=sys.stderr)
+                            pool.shutdown(wait=False, cancel_futures=True)
+                            pool = _new_pool(opts)
+                        if len(ids) > 1:
+                            isolated.extend((True, [canvas_id]) for canvas_id in ids)
+                            requeued = True
+                checkpoint.finished(ids, n, size, failures, retried)
+                exported += n
+                written += size
+                if requeued:
+                    print(f"  retrying {len(ids)} canvases one per task", file=sys.stderr)
+                    continue
+                for canvas_id, error in failures:
+                    print(f"  failed {canvas_id}: {error}", file=sys.stderr)
+            now = time.perf_counter()
+            if now - last_report >= opts.report_every:
+                checkpoint.save()
+                elapsed = now - started
+                print(f"  {exported}/{total} canvases, {exported / elapsed:.1f}/s, {written / elapsed / 1e6:.1f} MB/s")
+                last_report = now
+    except KeyboardInterrupt:
+        print("Interrupted; finished chunks are checkpointed, rerun to resume", file=sys.stderr)
+        raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        conn.close()
+        checkpoint.save()
+
+    elapsed = time.perf_counter() - started
+    summary = {"exported": exported, "failed": len(checkpoint.state["failed"]), "bytes": written,
+               "seconds": round(elapsed, 3), "canvases_per_second": round(exported / elapsed, 2) if elapsed else 0}
+    print(f"Exported {exported} canvases ({written / 1e6:.1f} MB) in {elapsed:.1f}s, "
+          f"{summary['canvases_per_second']}/s")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every canvas to PNG/SVG in parallel")
+    parser.add_argument("--out", required=True, help="Output directory (also holds the checkpoint)")
+    parser.add_argument("--format", dest="formats", action="append", choices=FORMATS,
+                        help="Output format; repeat for several (default: png and svg)")
+    parser.add_argument("--db", default=str(DB_PATH), help="Database to export (opened read-only)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=32, help="Canvases per task")
+    parser.add_argument("--scale", type=float, default=1.0, help="PNG scale factor")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    opts = parser.parse_args()
+    opts.formats = opts.formats or list(FORMATS)
+    try:
+        summary = run(opts)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -46,6 +46,13 @@ function sleep(ms) {
     return new Promise(resolve => setTimeout(resolve, ms));
 }
 
+// Geometry the server resolved for graph actions (crucial/layout.py)
+const LAYOUT_VERSION = 1;
+
+function storedLayout(entry) {
+    return entry.layout && entry.layout.version === LAYOUT_VERSION ? entry.layout : null;
+}
+
 function fadeInBackground(color, duration) {
     const [r, g, b] = hexToRgb(color);
     let step = 0;
@@ -1021,8 +1028,10 @@ async function renderGraphHeatmap(entry) {
 
 
 async function renderGraphHistogram(entry) {
-    const { values, bins = 10, normalize = false, color, theme = "dark", title = "", transparent = false } = entry.params;
-    if (!values || !values.length || !color) return;
+    const { values, counts, normalize = false, color, theme = "dark", title = "", transparent = false } = entry.params;
+    if (!(values && values.length) && !(counts && counts.length) || !color) return;
+    // Large histograms arrive pre-binned (crucial/reduction.py)
+    const bins = counts ? counts.length : (entry.params.bins ?? 10);
 
     const style = themeStyles[theme] || themeStyles["dark"];
     const width = canvas.width, height = canvas.height;
@@ -1043,19 +1052,28 @@ async function renderGraphHistogram(entry) {
         ctx.fillText(title, width / 2, margin);
     }
 
-    const min = Math.min(...values);
-    const max = Math.max(...values);
-    const binSize = (max - min) / bins;
-    const histogram = Array(bins).fill(0);
-
-    for (let v of values) {
-        const i = Math.min(bins - 1, Math.floor((v - min) / binSize));
-        histogram[i]++;
-    }
+    const layout = storedLayout(entry);
+    let histogram;
+    if (layout) {
+        histogram = layout.counts;
+    } else if (counts) {
+        const total = normalize ? counts.reduce((a, b) => a + b, 0) : 0;
+        histogram = total ? counts.map(c => c / total) : counts.slice();
+    } else {
+        const min = Math.min(...values);
+        const max = Math.max(...values);
+        const binSize = (max - min) / bins;
+        histogram = Array(bins).fill(0);
+
+        for (let v of values) {
+            const i = Math.min(bins - 1, Math.floor((v - min) / binSize));
+            histogram[i]++;
+        }
 
-    if (normalize) {
-        const total = histogram.reduce((a, b) => a + b, 0);
-        for (let i = 0; i < bins; i++) histogram[i] /= total;
+        if (normalize) {
+            const total = histogram.reduce((a, b) => a + b, 0);
+            for (let i = 0; i < bins; i++) histogram[i] /= total;
+        }
     }
 
     const maxCount = Math.max(...histogram);
@@ -1624,6 +1642,19 @@ async function renderGraphWordcloud(entry) {
         ctx.fillText(title, canvas.width / 2, margin);
     }
 
+    // Placement resolved server-side: [word index, x, baseline y, font size]
+    const layout = storedLayout(entry);
+    if (layout) {
+        ctx.textAlign = "left";
+        for (const [i, x, y, fontSize] of layout.words) {
+            ctx.font = `bold ${fontSize}px Courier New`;
+            ctx.fillStyle = shades[i];
+            ctx.fillText(word_texts[i], x, y);
+            await sleep(10 * config.drawing.speed);
+        }
+        return;
+    }
+
     // Prepare word list sorted by size
     const wordList = word_texts.map((text, i) => ({
         text,
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: geometry.py
+# Description: Adaptive, tolerance-driven curve tessellation with an LRU of results
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Flattens scene path ops (crucial/scene.py) into polylines for the
+rasterizer and for bounds:
+
+    for points, closed in flatten(ops, scale):   # points: (N, 2) ndarray
+        ...
+
+`scale` is output pixels per path unit; every segment stays within
+TOLERANCE output pixels of the true curve. Quadratics are raised to
+cubics and all cubics of a path are evaluated in one NumPy pass, each
+with its own segment count from Wang's formula (the control polygon's
+second differences bound the curvature). Arcs get as many segments as
+keep the sagitta under the tolerance.
+
+Tessellations of paths with curves are kept in an LRU keyed by a hash
+of the ops and the scale, bounded by total vertices, so repeated renders
+at the same zoom (tiles, thumbnails, exports) and action bounds reuse
+them. The returned arrays are read-only.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+from crucial import metrics
+
+TOLERANCE = 0.25          # output pixels
+MAX_SEGMENTS = 1024       # per curve or arc
+CACHE_POINTS = 1_000_000  # total cached vertices
+
+_cache = OrderedDict()
+_cache_points = 0
+_cache_lock = threading.Lock()
+
+
+def cubic_segments(ctrl, scale=1.0, tolerance=TOLERANCE):
+    """
+    Segments needed by each cubic in `ctrl`, an (N, 4, 2) array.
+    """
+    second = np.linalg.norm(ctrl[:, :2] - 2 * ctrl[:, 1:3] + ctrl[:, 2:], axis=2).max(axis=1)
+    n = np.ceil(np.sqrt(0.75 * second * scale / tolerance))
+    return np.clip(np.nan_to_num(n, nan=1.0), 1, MAX_SEGMENTS).astype(np.int64)
+
+
+def arc_segments(radius, sweep, scale=1.0, tolerance=TOLERANCE):
+    """
+    Segments needed by arcs of `radius` through `sweep` radians (arrays).
+    """
+    ratio = np.clip(tolerance / np.maximum(radius * scale, 1e-9), 0, 1)
+    step = 2 * np.arccos(1 - ratio)
+    n = np.ceil(np.abs(sweep) / np.maximum(step, 1e-9))
+    return np.clip(np.nan_to_num(n, nan=2.0), 2, MAX_SEGMENTS).astype(np.int64)
+
+
+def _params(counts, first):
+    """
+    Concatenated parameters i / n for each count n, i from `first` to n,
+    with the index of the curve each belongs to.
+    """
+    lengths = counts + 1 - first
+    owner = np.repeat(np.arange(len(counts)), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    i = np.arange(lengths.sum()) - np.repeat(offsets, lengths) + first
+    return i / counts[owner], owner, np.cumsum(lengths)[:-1]
+
+
+def _cubics(ctrl, scale, tolerance):
+    """
+    Points after each curve's start, as one array per cubic.
+    """
+    t, owner, splits = _params(cubic_segments(ctrl, scale, tolerance), 1)
+    t = t[:, None]
+    u = 1 - t
+    p = ctrl[owner]
+    points = (u * u * u) * p[:, 0] + (3 * u * u * t) * p[:, 1] + (3 * u * t * t) * p[:, 2] + (t * t * t) * p[:, 3]
+    return np.split(points, splits)
+
+
+def _arcs(arcs, scale, tolerance):
+    """
+    Points of each (cx, cy, r, start, signed sweep) arc, start included.
+    """
+    cx, cy, r, a0, sweep = arcs.T
+    t, owner, splits = _params(arc_segments(r, sweep, scale, tolerance), 0)
+    angle = a0[owner] + sweep[owner] * t
+    points = np.column_stack((cx[owner] + r[owner] * np.cos(angle), cy[owner] + r[owner] * np.sin(angle)))
+    return np.split(points, splits)
+
+
+def _tessellate(ops, scale, tolerance):
+    # First pass: walk the ops for the current point, collecting curves
+    plan, cubics, arcs = [], [], []
+    current = start = None
+    tau = 2 * math.pi
+    for op in ops:
+        kind = op[0]
+        if kind in ("M", "L"):
+            current = (op[1], op[2])
+            if kind == "M":
+                start = current
+            plan.append((kind, current))
+        elif kind in ("Q", "C") and current is not None:
+            if kind == "Q":
+                (x0, y0), x1, y1, x2, y2 = current, *op[1:]
+                cubics.append(((x0, y0), (x0 + 2 / 3 * (x1 - x0), y0 + 2 / 3 * (y1 - y0)),
+                               (x2 + 2 / 3 * (x1 - x2), y2 + 2 / 3 * (y1 - y2)), (x2, y2)))
+            else:
+                cubics.append((current, op[1:3], op[3:5], op[5:7]))
+            current = tuple(op[-2:])
+            plan.append(("C", len(cubics) - 1))
+        elif kind == "A":
+            _, cx, cy, r, a0, a1, ccw = op
+            if r <= 0:
+                continue
+            sweep = (a0 - a1) if ccw else (a1 - a0)
+            sweep = tau if sweep >= tau else sweep % tau
+            sweep = -sweep if ccw else sweep
+            arcs.append((cx, cy, r, a0, sweep))
+            current = (cx + r * math.cos(a0 + sweep), cy + r * math.sin(a0 + sweep))
+            plan.append(("A", len(arcs) - 1))
+        elif kind == "Z":
+            current = start
+            plan.append(("Z", None))
+
+    # Second pass: every curve of the path at once
+    cubic_points = _cubics(np.array(cubics, dtype=np.float64), scale, tolerance) if cubics else []
+    arc_points = _arcs(np.array(arcs, dtype=np.float64), scale, tolerance) if arcs else []
+
+    subpaths, pieces, line = [], [], []
+    start = None
+
+    def close_current(closed):
+        nonlocal pieces, line
+        if line:
+            pieces.append(np.array(line, dtype=np.float64))
+        if sum(map(len, pieces)) > 1:
+            points = np.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+            points.flags.writeable = False
+            subpaths.append((points, closed))
+        pieces, line = [], []
+
+    def append(curve):
+        nonlocal line
+        if line:
+            pieces.append(np.array(line, dtype=np.float64))
+            line = []
+        pieces.append(curve)
+
+    for kind, value in plan:
+        if kind == "M":
+            close_current(False)
+            start = value
+            line = [value]
+        elif kind == "L":
+            line.append(value)
+        elif kind == "C":
+            append(cubic_points[value])
+        elif kind == "A":
+            if not (line or pieces) and start is None:
+                start = tuple(arc_points[value][0])
+            append(arc_points[value])
+        elif kind == "Z" and (line or pieces):
+            close_current(True)
+            if start is not None:
+                line = [start]
+    close_current(False)
+    return subpaths
+
+
+def _key(ops, scale, tolerance):
+    if not any(op[0] in ("Q", "C", "A") for op in ops):
+        return None  # lines only: nothing to reuse
+    try:
+        return hash(tuple(ops)), len(ops), round(scale, 6), tolerance
+    except TypeError:
+        return None
+
+
+def flatten(ops, scale=1.0, tolerance=TOLERANCE):
+    """
+    Return subpaths [(points, closed)] for path ops, curves split finely
+    enough for a `scale` (pixels per unit) rendering.
+    """
+    global _cache_points
+    key = _key(ops, scale, tolerance)
+    if key is None:
+        return _tessellate(ops, scale, tolerance)
+    with _cache_lock:
+        subpaths = _cache.get(key)
+        if subpaths is not None:
+            _cache.move_to_end(key)
+    metrics.cache_lookup("tessellation", subpaths is not None)
+    if subpaths is None:
+        subpaths = _tessellate(ops, scale, tolerance)
+        size = sum(len(points) for points, _ in subpaths)
+        with _cache_lock:
+            if key not in _cache:
+                _cache[key] = subpaths
+                _cache_points += size
+            while _cache_points > CACHE_POINTS and len(_cache) > 1:
+                _, evicted = _cache.popitem(last=False)
+                _cache_points -= sum(len(points) for points, _ in evicted)
+    return subpaths
+
+
+def bounds(ops, tolerance=TOLERANCE):
+    """
+    (x0, y0, x1, y1) of the flattened path in its own units, widened by the
+    tolerance the chords may cut inside curves; None for an empty path.
+    """
+    subpaths = flatten(ops, 1.0, tolerance)
+    if not subpaths:
+        return None
+    points = np.concatenate([points for points, _ in subpaths])
+    (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+    return float(x0) - tolerance, float(y0) - tolerance, float(x1) + tolerance, float(y1) + tolerance
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: layout.py
+# Description: Server-side layout of graph_* actions, computed once and stored with the action
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Resolves the data-dependent geometry of a graph action (scales, bar
+rectangles, histogram counts, slice angles, heatmap levels, word
+placement) into a small JSON-ready dict, in canvas coordinates:
+
+    layout = compute("graph_histogram", params, width, height)
+    # {"version": 1, "counts": [...]}
+
+Canvas._store_action saves it in actions.layout, and every replay path
+hands it back to Scene.compile; the browser renderers and history
+consumers receive it as `entry.layout`. Styling (theme, shades, fonts)
+stays with the renderers. A layout whose version differs from VERSION
+is ignored and recomputed.
+
+Large series are handled with NumPy; pixel coordinates are rounded to
+ROUND places to keep the stored JSON compact.
+"""
+
+import math
+import numpy as np
+
+VERSION = 1
+ROUND = 2
+
+# Shared with the scene builders (frontend/crucial.js)
+MARGIN = 40
+TITLE_PAD = 30
+# Courier New advances 0.6em per glyph; stands in for measureText()
+MONO_ADVANCE = 0.6
+
+
+def _coords(values):
+    return np.round(values, ROUND).tolist()
+
+
+def _title_pad(p):
+    return TITLE_PAD if p.get("title") else 0
+
+
+def _categories(p, minimum=2):
+    labels, values = p.get("labels"), p.get("values")
+    return bool(labels and values and len(labels) == len(values) and len(labels) >= minimum and p.get("color"))
+
+
+def _xy_valid(p, *extra):
+    xs, ys = p.get("x_values"), p.get("y_values")
+    lengths = {len(xs or ()), len(ys or ()), *(len(p.get(k) or ()) for k in extra)}
+    return xs and ys and len(lengths) == 1 and len(xs) >= 2 and p.get("color")
+
+
+def _xy_scales(p, w, h):
+    """
+    Pixel positions of (x_values, y_values) and the data→pixel y mapping.
+    """
+    xs, ys = np.asarray(p["x_values"], dtype=np.float64), np.asarray(p["y_values"], dtype=np.float64)
+    chart_w, chart_h = w - 2 * MARGIN, h - 2 * MARGIN - _title_pad(p)
+    min_x, max_x, min_y, max_y = xs.min(), xs.max(), ys.min(), ys.max()
+    sy = lambda v: h - MARGIN - (v - min_y) / ((max_y - min_y) or 1) * chart_h
+    points = np.column_stack((MARGIN + (xs - min_x) / ((max_x - min_x) or 1) * chart_w, sy(ys)))
+    return points, sy, (min_y, max_y)
+
+
+def _chart_rows(p, h):
+    chart_h = h - 2 * MARGIN - _title_pad(p)
+    return [MARGIN + _title_pad(p) + chart_h * j / 5 for j in range(6)]
+
+
+def bar(p, w, h):
+    if not _categories(p):
+        return None
+    n = len(p["values"])
+    spacing = 10
+    chart_h = h - 2 * MARGIN - _title_pad(p)
+    bar_w = (w - 2 * MARGIN - spacing * (n - 1)) / n
+    values = np.asarray(p["values"], dtype=np.float64)
+    heights = values / (values.max() or 1) * chart_h
+    xs = MARGIN + np.arange(n) * (bar_w + spacing)
+    return {"bars": _coords(np.column_stack((xs, h - MARGIN - heights, np.full(n, bar_w), heights)))}
+
+
+def line(p, w, h):
+    if not _xy_valid(p):
+        return None
+    points, _, _ = _xy_scales(p, w, h)
+    return {"points": _coords(points), "rows": _coords(_chart_rows(p, h))}
+
+
+area = line
+
+
+def scatter(p, w, h):
+    if not _xy_valid(p):
+        return None
+    points, sy, (min_y, max_y) = _xy_scales(p, w, h)
+    rows = [sy(min_y + j / 5 * (max_y - min_y)) for j in range(6)]
+    return {"points": _coords(points), "rows": _coords(rows)}
+
+
+def bubble(p, w, h):
+    if not _xy_valid(p, "sizes"):
+        return None
+    points, _, _ = _xy_scales(p, w, h)
+    sizes = np.asarray(p["sizes"], dtype=np.float64)
+    lo, hi = sizes.min(), sizes.max()
+    radii = 5 + (sizes - lo) / ((hi - lo) or 1) * 30
+    return {"points": _coords(points), "rows": _coords(_chart_rows(p, h)), "radii": _coords(radii)}
+
+
+def _slices(p, w, h, inner_ratio=None):
+    if not _categories(p):
+        return None
+    outer = min(w, h) / 2 - MARGIN
+    values = np.asarray(p["values"], dtype=np.float64)
+    ends = -math.pi / 2 + np.cumsum(values / (values.sum() or 1) * math.pi * 2)
+    starts = np.concatenate(([-math.pi / 2], ends[:-1]))
+    return {"center": [w / 2, h / 2 + 10], "outer": outer, "inner": outer * inner_ratio if inner_ratio else 0,
+            "angles": np.column_stack((starts, ends)).tolist()}
+
+
+def pie(p, w, h):
+    return _slices(p, w, h)
+
+
+def donut(p, w, h):
+    return _slices(p, w, h, inner_ratio=0.55)
+
+
+def heatmap(p, w, h):
+    matrix = p.get("matrix")
+    if not matrix or not isinstance(matrix, list) or not matrix[0] or not p.get("color"):
+        return None
+    rows = [np.asarray(row, dtype=np.float64) for row in matrix]
+    lo = min(row.min() for row in rows)
+    hi = max(row.max() for row in rows)
+    span = (hi - lo) or 1
+    cell_w = (w - 2 * MARGIN) / len(matrix[0])
+    cell_h = (h - 2 * MARGIN - _title_pad(p)) / len(matrix)
+    return {"cell": [MARGIN, MARGIN + _title_pad(p), cell_w, cell_h],
+            # Index into a 100-shade ramp
+            "levels": [((row - lo) / span * 99).astype(np.int64).tolist() for row in rows]}
+
+
+def histogram_counts(values, bins, normalize=False) -> list:
+    """
+    renderGraphHistogram's binning: `bins` equal-width bins over the data
+    range, the maximum falling in the last (numpy.histogram's edges).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lo, hi = values.min(), values.max()
+    if lo < hi:
+        counts = np.histogram(values, bins, range=(lo, hi))[0]
+    else:
+        counts = np.zeros(bins, np.int64)
+        counts[0] = len(values)
+    return (counts / counts.sum()).tolist() if normalize else counts.tolist()
+
+
+def histogram(p, w, h):
+    counts, color = p.get("counts"), p.get("color")
+    if counts and color:
+        # Pre-binned at ingest (crucial/reduction.py)
+        total = sum(counts) if p.get("normalize", False) else 0
+        return {"counts": [c / total for c in counts] if total else list(counts)}
+    values, bins = p.get("values"), p.get("bins", 10)
+    if not values or not color or bins < 1:
+        return None
+    return {"counts": histogram_counts(values, bins, p.get("normalize", False))}
+
+
+def radar(p, w, h):
+    if not _categories(p, minimum=3):
+        return None
+    cx, cy = w / 2, h / 2 + 10
+    radius = min(w, h) / 2 - 50
+    values = np.asarray(p["values"], dtype=np.float64)
+    angles = np.arange(len(values)) * (2 * math.pi / len(values))
+    r = values / (values.max() or 1) * radius
+    return {"center": [cx, cy], "radius": radius,
+            "points": _coords(np.column_stack((cx + r * np.cos(angles), cy + r * np.sin(angles))))}
+
+
+def gauge(p, w, h):
+    value = p.get("value")
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 <= value <= 100 or not p.get("color"):
+        return None
+    arc_w = 30
+    radius = min(w, h) / 2 - MARGIN
+    return {"center": [w / 2, h / 2 + (radius + arc_w / 2 - 20) / 2], "radius": radius}
+
+
+def wordcloud(p, w, h):
+    """
+    renderGraphWordcloud's placement: largest words first, each at the
+    first point of an outward spiral where its box fits the chart and
+    overlaps no placed word. Candidates are tested a block at a time
+    against every placed box at once.
+    """
+    words, weights = p.get("word_texts"), p.get("word_values")
+    if not words or not weights or len(words) != len(weights) or not p.get("color"):
+        return None
+    title_pad = _title_pad(p)
+    weights = np.asarray(weights, dtype=np.float64)
+    lo, hi = weights.min(), weights.max()
+    step = np.arange(math.ceil(max(w, h) / 0.8))
+    spiral_x, spiral_y = 0.8 * step * np.cos(0.2 * step) + w / 2, 0.8 * step * np.sin(0.2 * step) + h / 2
+
+    placed = np.empty((len(words), 4))  # x, top, width, height
+    count = 0
+    out = []
+    for i in np.argsort(-weights, kind="stable").tolist():
+        size = 14 + (weights[i] - lo) / ((hi - lo) or 1) * 36
+        ww = len(str(words[i])) * size * MONO_ADVANCE
+        x, y = spiral_x - ww / 2, spiral_y + size / 2
+        inside = np.flatnonzero((x > MARGIN) & (y > MARGIN + title_pad) & (x + ww < w - MARGIN) & (y + size < h - MARGIN))
+        boxes = placed[:count]
+        for block in range(0, len(inside), 256):
+            candidates = inside[block:block + 256]
+            cx, top = x[candidates, None], y[candidates, None] - size
+            hit = ~((cx + ww < boxes[:, 0]) | (boxes[:, 0] + boxes[:, 2] < cx) |
+                    (top + size < boxes[:, 1]) | (boxes[:, 1] + boxes[:, 3] < top))
+            free = np.flatnonzero(~hit.any(axis=1))
+            if len(free):
+                k = candidates[free[0]]
+                placed[count] = x[k], y[k] - size, ww, size
+                count += 1
+                out.append([i, round(float(x[k]), ROUND), round(float(y[k]), ROUND), round(float(size), ROUND)])
+                break
+    return {"words": out}
+
+
+LAYOUTS = {
+    "graph_bar": bar,
+    "graph_line": line,
+    "graph_area": area,
+    "graph_scatter": scatter,
+    "graph_bubble": bubble,
+    "graph_pie": pie,
+    "graph_donut": donut,
+    "graph_heatmap": heatmap,
+    "graph_histogram": histogram,
+    "graph_radar": radar,
+    "graph_gauge": gauge,
+    "graph_wordcloud": wordcloud,
+}
+
+
+def compute(action, params, width, height):
+    """
+    Layout for a graph action, or None for other actions and for params
+    the renderers would draw nothing for.
+    """
+    fn = LAYOUTS.get(action)
+    if fn is None:
+        return None
+    try:
+        layout = fn(params, width, height)
+    except (KeyError, TypeError, ValueError, IndexError, ZeroDivisionError):
+        return None
+    if layout is not None:
+        layout["version"] = VERSION
+    return layout
+
+
+def valid(layout) -> bool:
+    return isinstance(layout, dict) and layout.get("version") == VERSION
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: lifecycle.py
+# Description: Lifespan-managed background services with ordered startup and graceful drain
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Services start in list order when the app starts and stop in reverse
+order when it shuts down. Readiness drops before the first service stops,
+so load balancers stop routing while in-flight work drains.
+
+    manager = ServiceManager([LogService(), DatabaseService(), ...])
+    app = FastAPI(lifespan=manager.lifespan)
+"""
+
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import HTTPException
+from crucial.config import get_logger, get_log_handler
+from crucial.db import DB_PATH, get_db_connection, cleanup_expired_canvases
+from crucial.canvas import pending_broadcasts
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every worker leads
+    fcntl = None
+
+logger = get_logger(__name__)
+
+
+class Service:
+    name = "service"
+
+    async def start(self):
+        pass
+
+    async def stop(self, timeout: float):
+        pass
+
+    def health(self) -> dict:
+        return {"ok": True}
+
+
+class LogService(Service):
+    """
+    Flushes the shared log queue on shutdown so drain messages are not lost.
+    """
+    name = "logging"
+
+    async def start(self):
+        get_log_handler()
+
+    async def stop(self, timeout):
+        log_queue = get_log_handler().queue
+        deadline = time.monotonic() + timeout
+        while log_queue.qsize() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    def health(self):
+        handler = get_log_handler()
+        return {"ok": True, "queue_depth": handler.queue.qsize(), "dropped": handler.dropped}
+
+
+class DatabaseService(Service):
+    name = "database"
+
+    async def start(self):
+        get_db_connection().close()  # creates/migrates the schema once, before traffic
+
+    def health(self):
+        try:
+            conn = get_db_connection()
+            conn.execute("SELECT 1").fetchone()
+            conn.close()
+            return {"ok": True, "path": str(DB_PATH)}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+
+class WriteGate(Service):
+    """
+    Admits action writes while running; once draining, new writes get a 503
+    (clients retry against another worker) and shutdown waits for the
+    writes already admitted to commit.
+    """
+    name = "writes"
+
+    def __init__(self):
+        self.accepting = False
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self):
+        with self._lock:
+            if not self.accepting:
+                raise HTTPException(status_code=503, detail="Server is shutting down",
+                                    headers={"Retry-After": "1"})
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    async def start(self):
+        self.accepting = True
+
+    async def stop(self, timeout):
+        self.accepting = False
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        if self.in_flight:
+            logger.warning("Shutdown with %d writes still in flight", self.in_flight)
+
+    def health(self):
+        return {"ok": self.accepting, "in_flight": self.in_flight}
+
+
+class BroadcastHub(Service):
+    """
+    Owns the WebSocket subscriber map. On shutdown it lets queued broadcasts
+    finish, then closes viewers with 1001 (going away) so they reconnect
+    to another worker.
+    """
+    name = "broadcast"
+
+    def __init__(self, subscribers: dict):
+        self.subscribers = subscribers
+
+    async def stop(self, timeout):
+        pending = pending_broadcasts()
+        if pending:
+            done, not_done = await asyncio.wait(pending, timeout=timeout)
+            if not_done:
+                logger.warning("Dropped %d unfinished broadcasts at shutdown", len(not_done))
+        sockets = [ws for subs in self.subscribers.values() for ws in subs]
+        for ws in sockets:
+            try:
+                await ws.close(code=1001)
+            except Exception:
+                pass
+        self.subscribers.clear()
+        logger.info("Broadcast hub drained: %d viewers closed", len(sockets))
+
+    def health(self):
+        return {
+            "ok": True,
+            "viewers": sum(len(s) for s in self.subscribers.values()),
+            "pending_broadcasts": len(pending_broadcasts())
+        }
+
+
+class CleanupScheduler(Service):
+    """
+    Runs the eviction sweep every `interval` seconds in a thread. Only the
+    worker holding an exclusive lock on `lock_path` sweeps; the others
+    retry the lock so one of them takes over if the leader exits.
+    """
+    name = "cleanup"
+
+    def __init__(self, interval: int, lock_path: str):
+        self.interval = interval
+        self.lock_path = lock_path
+        self.leader = False
+        self.last_sweep = None
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _try_lead(self) -> bool:
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+            self._lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._lock_file.seek(0)
+        self._lock_file.truncate()
+        self._lock_file.write(str(os.getpid()))
+        self._lock_file.flush()
+        logger.info("Worker %d is the cleanup leader", os.getpid())
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.leader:
+                self.leader = self._try_lead()
+            if self.leader:
+                try:
+                    report = cleanup_expired_canvases()
+                    self.last_sweep = {k: v for k, v in report.items() if k != "evicted"}
+                except Exception:
+                    logger.exception("Cleanup sweep failed")
+            self._stop.wait(self.interval)
+
+    async def start(self):
+        self._thread = threading.Thread(target=self._run, name="crucial-cleanup", daemon=True)
+        self._thread.start()
+
+    async def stop(self, timeout):
+        self._stop.set()
+        if self._thread is not None:
+            # Let a sweep in progress finish its current chunk
+            await asyncio.to_thread(self._thread.join, timeout)
+        if self._lock_file is not None:
+            if self.leader and fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+        self.leader = False
+
+    def health(self):
+        alive = self._thread is not None and self._thread.is_alive()
+        return {"ok": alive, "leader": self.leader, "interval": self.interval, "last_sweep": self.last_sweep}
+
+
+class ThumbnailService(Service):
+    """
+    Runs the thumbnail process pool; renders in progress finish on
+    shutdown, queued ones are dropped and picked up by the next start.
+    """
+    name = "thumbnails"
+
+    def __init__(self, thumbnailer):
+        self.thumbnailer = thumbnailer
+
+    async def start(self):
+        self.thumbnailer.start()
+
+    async def stop(self, timeout):
+        await asyncio.to_thread(self.thumbnailer.stop, timeout)
+
+    def health(self):
+        return self.thumbnailer.health()
+
+
+class TimelineService(Service):
+    """
+    Runs the timeline render pool; renders in progress finish on shutdown.
+    """
+    name = "timelines"
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+
+    async def start(self):
+        self.renderer.start()
+
+    async def stop(self, timeout):
+        await asyncio.to_thread(self.renderer.stop, timeout)
+
+    def health(self):
+        return self.renderer.health()
+
+
+class LoopMonitorService(Service):
+    name = "loop_monitor"
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+
+    async def start(self):
+        self.monitor.start()
+
+    async def stop(self, timeout):
+        self.monitor.stop()
+
+    def health(self):
+        return {"ok": True, "stalls": len(self.monitor.events)}
+
+
+class ServiceManager:
+    def __init__(self, services: list, drain_timeout: float = 10.0):
+        self.services = services
+        self.drain_timeout = drain_timeout
+        self.started = []
+        self.draining = False
+
+    @property
+    def ready(self) -> bool:
+        return (not self.draining and len(self.started) == len(self.services)
+                and all(s.health()["ok"] for s in self.services))
+
+    def health(self) -> dict:
+        return {s.name: s.health() for s in self.started}
+
+    async def start(self):
+        for service in self.services:
+            t0 = time.perf_counter()
+            await service.start()
+            self.started.append(service)
+            logger.info("Started %s (%.1fms)", service.name, (time.perf_counter() - t0) * 1000)
+
+    async def stop(self):
+        self.draining = True
+        for service in reversed(self.started):
+            try:
+                await service.stop(self.drain_timeout)
+                logger.info("Stopped %s", service.name)
+            except Exception:
+                logger.exception("Error stopping %s", service.name)
+        self.started.clear()
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        try:
+            await self.start()
+            yield
+        finally:
+            await self.stop()
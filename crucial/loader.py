@@ -12,18 +12,141 @@ from typing import Optional
 from fastapi.responses import Response
 from crucial.registry import get_registry
 
-def crucial_python_loader(base_url: str) -> Response:
+LOADER_MODES = ("sync", "async")
+
+ASYNC_RUNTIME = '''
+# Shared connection pool; adjust limits before the first call.
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+TIMEOUT = 10.0
+
+# Auto-batching: calls made within BATCH_WINDOW seconds of each other are
+# coalesced into a single POST /canvas/batch of at most BATCH_MAX_SIZE actions.
+AUTO_BATCH = False
+BATCH_WINDOW = 0.005
+BATCH_MAX_SIZE = 100
+
+_client = None
+_batcher = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers={"Content-Type": "application/json", "x-api-key": API_KEY},
+            limits=POOL_LIMITS,
+            timeout=TIMEOUT
+        )
+    return _client
+
+
+class _Batcher:
+    """
+    Collects actions submitted within a short window and sends them as one
+    batch request, resolving each caller's future with its own result.
+    """
+    def __init__(self):
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, action: str, params: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((action, params, future))
+        if len(self._pending) >= BATCH_MAX_SIZE:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(BATCH_WINDOW, lambda: asyncio.ensure_future(self.flush()))
+        return await future
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        payload = {"actions": [{"action": a, "params": p} for a, p, _ in pending]}
+        try:
+            r = await _get_client().post("/canvas/batch", json=payload)
+            r.raise_for_status()
+            results = r.json()["results"]
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def _call(action: str, params: dict) -> dict:
+    """
+    POST one action. Batched or not, returns the same body as POST /canvas:
+    {"status": "ok", "result": {...}}; a failed action raises.
+    """
+    global _batcher
+    if not AUTO_BATCH:
+        r = await _get_client().post("/canvas", json={"action": action, "params": params})
+        r.raise_for_status()
+        return r.json()
+    if _batcher is None:
+        _batcher = _Batcher()
+    entry = await _batcher.submit(action, params)
+    if entry.get("status") != "ok":
+        raise RuntimeError(f"{entry.get('code')}: {entry.get('detail')}")
+    return {"status": "ok", "result": entry["result"]}
+
+
+async def aclose():
+    """
+    Flush any pending batched calls and close the pooled HTTP client.
+    """
+    global _client
+    if _batcher is not None:
+        await _batcher.flush()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+'''.strip()
+
+
+def crucial_python_loader(base_url: str, mode: str = "sync") -> Response:
     """
     Generate Python client functions for registered Crucial tools with typing and LLM-aligned returns.
 
+    Args:
+        base_url (str): Server URL baked into the generated client.
+        mode (str): "sync" for a requests-based client, "async" for an
+            httpx.AsyncClient-based client with pooling and optional auto-batching.
+
     Returns:
         Response: A plain text response containing valid Python code.
     """
+    if mode not in LOADER_MODES:
+        raise ValueError(f"Unknown loader mode: {mode} (expected one of {', '.join(LOADER_MODES)})")
+
     registry = get_registry()
     functions = []
     exported_names = []
 
-    header = f'''\
+    if mode == "async":
+        header = f'''\
+# Auto-generated Crucial async client from {base_url}/python?mode=async
+import asyncio
+import httpx
+from typing import Optional
+
+BASE_URL = "{base_url}"
+API_KEY = "<INSERT-YOUR-API-KEY-HERE>"
+
+LAST_CANVAS_ID = None
+
+''' + ASYNC_RUNTIME + "\n"
+    else:
+        header = f'''\
 # Auto-generated Crucial client from {base_url}/python
 import requests
 from typing import Optional
@@ -95,7 +218,56 @@ LAST_CANVAS_ID = None
         ]
         docstring = "\n".join(docstring_lines)
 
-        if original_name == "create":
+        if mode == "async" and original_name == "create":
+            fn = f'''
+async def {name}({signature}):
+    global LAST_CANVAS_ID
+    {docstring}
+    payload = {{
+        {param_dict}
+    }}
+    try:
+        r = await _get_client().post("/canvas/create", json=payload)
+        r.raise_for_status()
+        data = r.json()
+        LAST_CANVAS_ID = data.get("canvas_id")
+        return {{
+            "status": "success",
+            "action": "create",
+            "data": data
+        }}
+    except Exception as e:
+        return {{
+            "status": "error",
+            "action": "create",
+            "error": str(e),
+            "suggestion": "Check API key, network connection, or payload format."
+        }}
+'''.strip()
+        elif mode == "async":
+            fn = f'''
+async def {name}({signature}):
+    {docstring}
+    params = {{
+        {param_dict}
+    }}
+    params = {{k: v for k, v in params.items() if v is not None}}
+    try:
+        data = await _call("{original_name}", params)
+        return {{
+            "status": "success",
+            "action": "{original_name}",
+            "data": data
+        }}
+    except Exception as e:
+        return {{
+            "status": "error",
+            "action": "{original_name}",
+            "error": str(e),
+            "suggestion": "Check API key, network connection, or request format."
+        }}
+'''.strip()
+        elif original_name == "create":
             fn = f'''
 def {name}({signature}):
     global LAST_CANVAS_ID
@@ -198,6 +370,8 @@ def open_canvas(canvas_id: str):
 
     functions.append(open_canvas_fn)
     exported_names.append("open_canvas")
+    if mode == "async":
+        exported_names.append("aclose")
 
     export_dict = "\n".join([
         f'    "{name}": {name},' for name in exported_names
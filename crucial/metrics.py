@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: metrics.py
+# Description: Dependency-free Prometheus-style metrics for the Crucial server
+# Author: Ms. White
+# Created: 2025-05-12
+
+import math
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; tuned for sub-millisecond dispatch stages up to multi-second sweeps
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield "", self.labelnames, key, None, value
+
+
+class Gauge(_Metric):
+    """
+    Settable gauge. When `collect` is given it is called at scrape time and
+    must return either a number or a {label_values_tuple: number} mapping.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        values = self._values
+        if self._collect is not None:
+            collected = self._collect()
+            values = collected if isinstance(collected, dict) else {(): collected}
+        for key, value in sorted(values.items()):
+            yield "", self.labelnames, key, None, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        bounds = self.buckets + (math.inf,)
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                yield "_bucket", self.labelnames, key, f'le="{_format_value(float(bound))}"', cumulative
+            yield "_sum", self.labelnames, key, None, total
+            yield "_count", self.labelnames, key, None, count
+
+
+def render() -> str:
+    """
+    Render every registered metric in Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# ---------------------------------------------------------------------
+# Crucial metrics
+# ---------------------------------------------------------------------
+ACTIONS = Counter(
+    "crucial_actions_total", "Canvas actions dispatched", ("action", "status"))
+ACTION_SECONDS = Histogram(
+    "crucial_action_duration_seconds", "End-to-end dispatch latency per action", ("action",))
+STAGE_SECONDS = Histogram(
+    "crucial_dispatch_stage_seconds", "Dispatch latency by stage (validate, lookup, storage)", ("stage",))
+BROADCAST_SECONDS = Histogram(
+    "crucial_broadcast_seconds", "WebSocket fan-out time per stored action")
+BROADCAST_MESSAGES = Counter(
+    "crucial_broadcast_messages_total", "WebSocket messages sent", ("result",))
+REDUCED_POINTS = Counter(
+    "crucial_reduced_points_total", "Data points dropped by ingest-time graph reduction", ("action",))
+CLEANUP_SECONDS = Histogram(
+    "crucial_cleanup_sweep_seconds", "Duration of expired-canvas cleanup sweeps")
+DB_CONNECTIONS = Gauge(
+    "crucial_db_connections_open", "SQLite connections currently open")
+DB_CONNECTIONS_OPENED = Counter(
+    "crucial_db_connections_opened_total", "SQLite connections opened")
+CACHE_REQUESTS = Counter(
+    "crucial_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _cache_ratios():
+    ratios = {}
+    caches = {key[0] for key in CACHE_REQUESTS._values}
+    for cache in caches:
+        hits = CACHE_REQUESTS.value(cache=cache, result="hit")
+        total = hits + CACHE_REQUESTS.value(cache=cache, result="miss")
+        ratios[(cache,)] = hits / total if total else 0.0
+    return ratios
+
+
+CACHE_HIT_RATIO = Gauge(
+    "crucial_cache_hit_ratio", "Hit ratio per cache since start", ("cache",), collect=_cache_ratios)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: profiler.py
+# Description: In-process stack sampler and asyncio event-loop lag monitor
+# Author: Ms. White
+# Created: 2025-05-12
+
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter, deque
+from crucial import metrics
+from crucial.config import CONFIG, get_logger, get_file_logger
+
+logger = get_logger(__name__)
+
+LOOP_LAG = metrics.Histogram(
+    "crucial_event_loop_lag_seconds", "Delay between scheduled and actual event-loop heartbeats")
+LOOP_STALLS = metrics.Counter(
+    "crucial_event_loop_stalls_total", "Event-loop blocks longer than the configured threshold")
+
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def collapse_stack(frame, thread_name: str) -> str:
+    """
+    Render a frame chain root-first as one ';'-joined collapsed stack line.
+    """
+    parts = []
+    while frame is not None:
+        parts.append(_frame_label(frame))
+        frame = frame.f_back
+    parts.append(thread_name)
+    return ";".join(reversed(parts))
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """
+    Sample every thread's Python stack for `seconds` and return the result
+    in collapsed-stack format ("frame;frame;frame count" per line), ready
+    for flamegraph.pl or speedscope. Only one profile runs at a time.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    stacks[collapse_stack(frame, names.get(ident, f"thread-{ident}"))] += 1
+            time.sleep(interval)
+        logger.info("Profile complete: %.1fs, %d distinct stacks", seconds, len(stacks))
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    finally:
+        _profile_lock.release()
+
+
+class LoopLagMonitor:
+    """
+    Detect event-loop blocking. A coroutine on the loop stamps a heartbeat
+    every `interval`; a watchdog thread checks how stale that heartbeat is
+    and, once it exceeds `threshold`, captures the loop thread's stack so the
+    blocking call (e.g. synchronous SQLite inside a handler) is identified.
+    """
+    def __init__(self, threshold_ms: float, interval_ms: float = 50, history: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.events = deque(maxlen=history)
+        self._heartbeat = time.perf_counter()
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+        self._log = None
+
+    async def _beat(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            LOOP_LAG.observe(max(0.0, now - expected))
+            self._heartbeat = now
+
+    def _watch(self):
+        stalled = False
+        while not self._stop.wait(self.interval):
+            lag = time.perf_counter() - self._heartbeat
+            if lag < self.threshold + self.interval:
+                stalled = False
+                continue
+            if stalled:
+                continue  # one report per stall
+            stalled = True
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = collapse_stack(frame, "event-loop") if frame else ""
+            event = {"time": time.time(), "lag_ms": round(lag * 1000, 1), "stack": stack}
+            self.events.append(event)
+            LOOP_STALLS.inc()
+            self._log.warning("Event loop blocked %.1fms at %s", event["lag_ms"], stack)
+
+    def start(self):
+        """
+        Start monitoring; must be called from the event loop thread.
+        """
+        self._log = get_file_logger("crucial.loop_lag", CONFIG["PROFILING"]["loop_lag_log_path"])
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        threading.Thread(target=self._watch, name="crucial-loop-watchdog", daemon=True).start()
+        logger.info("Event loop lag monitor started (threshold %.0fms)", self.threshold * 1000)
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: raster.py
+# Description: Pillow rasterizer for scene primitives
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Draws scene primitives (crucial/scene.py) into a Pillow image through a
+world→pixel transform, so the same code renders whole canvases, tiles
+at any zoom, and thumbnails:
+
+    r = Rasterizer(256, 256, view=(s, 0, 0, s, -tx, -ty), background="#000000")
+    for matrix, prim in prims:
+        r.draw(prim, matrix)
+    r.image().save(...)
+
+Curves and arcs are flattened by crucial.geometry to within a quarter
+of an output pixel, and reused across renders at the same scale. Drawing
+happens at `supersample`× resolution and is box-filtered down, which is
+the only anti-aliasing ImageDraw gets.
+
+Any transform is valid, so work is bounded by the output, not by the
+primitive: polylines and polygons are clipped to the target (plus the
+pen width) before Pillow sees them, stroke widths and font sizes are
+capped to the output size, and of text only the glyphs (and, rotated,
+the label window) that can reach the output are drawn. A primitive
+Pillow still rejects is skipped.
+"""
+
+import math
+import json
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont, ImageColor
+import numpy as np
+from crucial.config import get_logger
+from crucial.scene import Scene, IDENTITY, multiply, apply
+from crucial.geometry import flatten
+
+logger = get_logger(__name__)
+
+MONO_FAMILIES = {"courier", "courier new", "monospace", "consolas", "menlo"}
+
+
+@lru_cache(maxsize=512)
+def rgba(color):
+    try:
+        value = ImageColor.getrgb(color)
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return value if len(value) == 4 else (*value, 255)
+
+
+@lru_cache(maxsize=128)
+def font(family, size, bold=False):
+    size = max(1, int(round(size)))
+    mono = str(family).lower() in MONO_FAMILIES
+    fallback = "DejaVuSansMono" if mono else "DejaVuSans"
+    for name in (f"{family}{' Bold' if bold else ''}.ttf", f"{fallback}{'-Bold' if bold else ''}.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def transform(m, points) -> np.ndarray:
+    """
+    Apply matrix `m` to an (N, 2) array.
+    """
+    a, b, c, d, e, f = m
+    x, y = points[:, 0], points[:, 1]
+    return np.column_stack((a * x + c * y + e, b * x + d * y + f))
+
+
+def clip_polyline(points, rect) -> list:
+    """
+    Pieces of a pixel-space polyline ((N, 2) array) inside `rect`
+    (x0, y0, x1, y1), each as ([[x, y], ...], distance along the polyline
+    to its first point). Liang-Barsky, all segments at once.
+    """
+    x0, y0, x1, y1 = rect
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    if lo[0] >= x0 and lo[1] >= y0 and hi[0] <= x1 and hi[1] <= y1:
+        return [(points.tolist(), 0.0)]
+    a, d = points[:-1], np.diff(points, axis=0)
+    t0, t1 = np.zeros(len(d)), np.ones(len(d))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-d[:, 0], a[:, 0] - x0), (d[:, 0], x1 - a[:, 0]),
+                     (-d[:, 1], a[:, 1] - y0), (d[:, 1], y1 - a[:, 1])):
+            t = q / p
+            t0 = np.where(p < 0, np.maximum(t0, t), t0)
+            t1 = np.where(p > 0, np.minimum(t1, t), t1)
+            t1 = np.where((p == 0) & (q < 0), -1.0, t1)
+    keep = np.flatnonzero(t0 <= t1)
+    if not len(keep):
+        return []
+    length = np.hypot(d[:, 0], d[:, 1])
+    along = np.r_[0.0, np.cumsum(length)]
+    k0, k1 = t0[keep], t1[keep]
+    starts, ends = a[keep] + k0[:, None] * d[keep], a[keep] + k1[:, None] * d[keep]
+    # A piece continues while consecutive segments are kept whole at the joint
+    new = np.ones(len(keep), dtype=bool)
+    new[1:] = (np.diff(keep) != 1) | (k0[1:] > 0) | (k1[:-1] < 1)
+    first = np.flatnonzero(new)
+    last = np.r_[first[1:], len(keep)] - 1
+    return [(np.vstack((starts[i:j + 1], ends[j:j + 1])).tolist(), float(along[keep[i]] + k0[i] * length[keep[i]]))
+            for i, j in zip(first.tolist(), last.tolist())]
+
+
+def clip_polygon(points, rect) -> np.ndarray:
+    """
+    A pixel-space polygon ((N, 2) array) clipped to `rect` (x0, y0, x1, y1):
+    Sutherland-Hodgman, one vectorized pass per edge of the rectangle.
+    """
+    x0, y0, x1, y1 = rect
+    for axis, bound, above in ((0, x0, True), (0, x1, False), (1, y0, True), (1, y1, False)):
+        if not len(points):
+            break
+        ahead = np.roll(points, -1, axis=0)
+        inside = points[:, axis] >= bound if above else points[:, axis] <= bound
+        if inside.all():
+            continue
+        crosses = inside != np.roll(inside, -1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (bound - points[:, axis]) / (ahead[:, axis] - points[:, axis])
+            cut = points + t[:, None] * (ahead - points)
+        # Each vertex if inside, then the edge's crossing if it has one
+        points = np.stack((points, cut), axis=1).reshape(-1, 2)[np.stack((inside, crosses), axis=1).reshape(-1)]
+    return points
+
+
+def _dashes(points, pattern, offset=0.0):
+    """
+    Split a pixel-space polyline into dash segments, the pattern starting
+    `offset` pixels in.
+    """
+    # An odd-length pattern repeats twice to cover one on/off cycle
+    period = sum(pattern) * (2 if len(pattern) % 2 else 1)
+    if period <= 0:
+        return [points]
+    out, on, index = [], True, 0
+    offset %= period
+    while offset >= pattern[index]:
+        offset -= pattern[index]
+        index = (index + 1) % len(pattern)
+        on = not on
+    remaining = pattern[index] - offset
+    run = [points[0]]
+    for a, b in zip(points, points[1:]):
+        seg = math.dist(a, b)
+        pos = 0.0
+        while seg - pos > remaining:
+            pos += remaining
+            t = pos / seg
+            p = (a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t)
+            if on:
+                run.append(p)
+                out.append(run)
+            run = [p]
+            on = not on
+            index = (index + 1) % len(pattern)
+            remaining = pattern[index]
+        remaining -= seg - pos
+        run.append(b)
+    if on and len(run) > 1:
+        out.append(run)
+    return out
+
+
+def _visible(text, face, anchor, lo, hi, size):
+    """
+    The run of `text` whose glyphs can reach [lo, hi] along the baseline
+    (relative to the anchor), and the baseline offset the run starts at.
+    Long text at a large size is never laid out whole.
+    """
+    # Pillow puts a middle anchor on a whole pixel, rounding half up
+    start = -math.floor(face.getlength(text) / 2 + 0.5) if anchor == "ms" else 0.0
+    advances = np.cumsum([start] + [face.getlength(ch) for ch in text])
+    # Glyphs overhang their advance by well under half an em
+    i0 = max(0, int(np.searchsorted(advances, lo - size / 2, side="right")) - 1)
+    i1 = min(len(text), int(np.searchsorted(advances, hi + size / 2, side="left")))
+    if i0 >= i1:
+        return "", 0.0
+    return text[i0:i1], start + face.getlength(text[:i0])
+
+
+class Rasterizer:
+    def __init__(self, width, height, view=IDENTITY, background=None, supersample=2, clip=None):
+        """
+        `view` maps canvas coordinates to output pixels; `clip` is the
+        canvas rectangle (x0, y0, x1, y1) in canvas coordinates, outside
+        of which the output is transparent.
+        """
+        self.width = width
+        self.height = height
+        self.ss = max(1, int(supersample))
+        self.view = multiply((self.ss, 0.0, 0.0, self.ss, 0.0, 0.0), view)
+        self.clip = clip
+        self.img = Image.new("RGB", (width * self.ss, height * self.ss), rgba(background or "#000000")[:3])
+        self.canvas = ImageDraw.Draw(self.img, "RGBA")
+        # Caps in drawing pixels: a wider pen or larger glyph adds no visible pixels
+        self.max_pen = self.img.width + self.img.height
+        self.max_text = max(self.img.width, self.img.height)
+
+    def draw(self, prim, matrix=IDENTITY):
+        try:
+            getattr(self, f"_draw_{prim['kind']}")(prim, self.view if prim.get("screen") else multiply(self.view, matrix))
+        except (KeyError, TypeError, ValueError, ZeroDivisionError, OverflowError,
+                OSError, Image.DecompressionBombError) as e:
+            logger.debug("Skipping %s primitive: %s", prim.get("kind"), e)
+
+    def image(self) -> Image.Image:
+        """
+        Return the finished RGBA image, downsampled and clipped to the canvas.
+        """
+        img = self.img
+        if self.ss > 1:
+            img = img.resize((self.width, self.height), Image.Resampling.BOX)
+        img = img.convert("RGBA")
+        if self.clip is not None:
+            x0, y0 = apply(self.view, self.clip[0], self.clip[1])
+            x1, y1 = apply(self.view, self.clip[2], self.clip[3])
+            x0, y0, x1, y1 = (v / self.ss for v in (x0, y0, x1, y1))
+            if x0 > 0 or y0 > 0 or x1 < self.width or y1 < self.height:
+                mask = Image.new("L", img.size, 0)
+                ImageDraw.Draw(mask).rectangle((round(x0), round(y0), round(x1) - 1, round(y1) - 1), fill=255)
+                img.putalpha(mask)
+        return img
+
+    # -----------------------------------------------------------------
+    @staticmethod
+    def _scale(m):
+        return math.sqrt(abs(m[0] * m[3] - m[1] * m[2]))
+
+    def _pen(self, width, m):
+        return max(1, int(round(min(width * self._scale(m), self.max_pen))))
+
+    def _target(self, pad=0):
+        """
+        The drawing rectangle grown by `pad` pixels.
+        """
+        return -pad, -pad, self.img.width + pad, self.img.height + pad
+
+    def _clip_rect(self, px=0):
+        """
+        Where geometry is clipped: a full output size (plus the pen) beyond
+        every edge, so ordinary off-canvas coordinates reach Pillow as they
+        are and only far-flung ones are cut.
+        """
+        return self._target(self.max_pen + px + 2)
+
+    def _stroke(self, subpaths, color, width, m, dash=None, cap=None):
+        fill = rgba(color)
+        if fill is None:
+            return
+        px = self._pen(width, m)
+        # Sub-pixel dashes would only cost time
+        pattern = [max(d * self._scale(m), 0.5) if d > 0 else 0.0 for d in dash] if dash else None
+        for points, closed in subpaths:
+            pts = transform(m, points)
+            if closed:
+                pts = np.vstack((pts, pts[:1]))
+            for piece, offset in clip_polyline(pts, self._clip_rect(px)):
+                for run in (_dashes(piece, pattern, offset) if pattern else [piece]):
+                    self._line(run, fill, px, cap)
+
+    def _line(self, run, fill, px, cap=None):
+        self.canvas.line(run, fill=fill, width=px)
+        if px > 3:
+            # Round joins (and caps, if asked); Pillow's own joints notch on short segments
+            r = px / 2
+            w, h = self.img.size
+            for x, y in (run if cap == "round" else run[1:-1]):
+                if -r < x < w + r and -r < y < h + r:
+                    self.canvas.ellipse((x - r, y - r, x + r, y + r), fill=fill)
+
+    def _fill(self, subpaths, color, m):
+        fill = rgba(color)
+        if fill is None:
+            return
+        for points, _ in subpaths:
+            if len(points) > 2:
+                polygon = clip_polygon(transform(m, points), self._clip_rect())
+                if len(polygon) > 2:
+                    self.canvas.polygon(polygon.tolist(), fill=fill)
+
+    def _draw_path(self, prim, m):
+        subpaths = flatten(prim["ops"], self._scale(m))
+        if prim["fill"]:
+            self._fill(subpaths, prim["fill"], m)
+        if prim["stroke"]:
+            self._stroke(subpaths, prim["stroke"], prim["width"], m, prim["dash"], prim["cap"])
+
+    def _draw_polyline(self, prim, m):
+        fill = rgba(prim["stroke"])
+        if fill is None or len(prim["points"]) < 2:
+            return
+        px = self._pen(prim["width"], m)
+        for piece, _ in clip_polyline(transform(m, prim["points"]), self._clip_rect(px)):
+            self._line(piece, fill, px)
+
+    def _draw_circle(self, prim, m):
+        r = abs(prim["r"])
+        ops = [("A", prim["cx"], prim["cy"], r, 0, 2 * math.pi, False), ("Z",)]
+        self._draw_path({"ops": ops, "fill": prim["fill"], "stroke": prim["stroke"],
+                         "width": prim["width"], "dash": None, "cap": None}, m)
+
+    def _draw_rect(self, prim, m):
+        x, y, w, h = prim["x"], prim["y"], prim["w"], prim["h"]
+        if m[1] == 0 and m[2] == 0 and prim["fill"] and not prim["stroke"]:
+            x0, y0 = apply(m, x, y)
+            x1, y1 = apply(m, x + w, y + h)
+            fill = rgba(prim["fill"])
+            left, top, right, bottom = self._clip_rect()
+            left, top = max(min(x0, x1), left), max(min(y0, y1), top)
+            right, bottom = min(max(x0, x1), right), min(max(y0, y1), bottom)
+            if fill is not None and x1 != x0 and y1 != y0 and right > left and bottom > top:
+                self.canvas.rectangle((left, top, right - 1, bottom - 1), fill=fill)
+            return
+        ops = [("M", x, y), ("L", x + w, y), ("L", x + w, y + h), ("L", x, y + h), ("Z",)]
+        self._draw_path({"ops": ops, "fill": prim["fill"], "stroke": prim["stroke"],
+                         "width": prim["width"], "dash": None, "cap": None}, m)
+
+    def _draw_text(self, prim, m):
+        fill = rgba(prim["color"])
+        text = prim["text"]
+        if fill is None or not text:
+            return
+        x, y = apply(m, prim["x"], prim["y"])
+        size = min(prim["size"] * self._scale(m), self.max_text)
+        face = font(prim["family"], size, prim["weight"] == "bold")
+        anchor = "ms" if prim["anchor"] == "middle" else "ls"
+        box = face.getbbox(text, anchor=anchor)
+        # Farthest label pixel from the anchor, in any rotation
+        reach = math.hypot(max(-box[0], box[2]), max(-box[1], box[3])) + 2
+        w, h = self.img.size
+        if math.hypot(max(-x, x - w, 0), max(-y, y - h, 0)) > reach:
+            return  # no glyph can land on the output
+        # Angle of the text baseline after the transform
+        angle = prim["angle"] + math.degrees(math.atan2(m[1], m[0]))
+        if abs(angle) < 0.01:
+            if -x <= box[0] and box[2] <= w - x:
+                self.canvas.text((x, y), text, fill=fill, font=face, anchor=anchor)
+                return
+            run, offset = _visible(text, face, anchor, -x, w - x, size)
+            if run:
+                self.canvas.text((x + offset, y), run, fill=fill, font=face, anchor="ls")
+            return
+        half = int(math.ceil(max(abs(v) for v in box))) + 2
+        if 2 * half <= self.max_pen:
+            # Draw on a square label centred on the anchor, rotate about the centre
+            label = Image.new("RGBA", (2 * half, 2 * half), (0, 0, 0, 0))
+            ImageDraw.Draw(label).text((half, half), text, fill=fill, font=face, anchor=anchor)
+            label = label.rotate(-angle, resample=Image.Resampling.BICUBIC)
+            self.img.paste(label, (int(round(x)) - half, int(round(y)) - half), label)
+            return
+        # A label larger than the output: draw only the part of it the
+        # rotation maps into the output, and resample that into place
+        cos, sin = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        x, y = round(x), round(y)  # the pixel grid the small-label path rotates on
+        ox0, oy0 = max(0, int(math.floor(x - reach))), max(0, int(math.floor(y - reach)))
+        ox1, oy1 = min(w, int(math.ceil(x + reach))), min(h, int(math.ceil(y + reach)))
+        corners = [((cx - x) * cos + (cy - y) * sin, (cy - y) * cos - (cx - x) * sin)
+                   for cx, cy in ((ox0, oy0), (ox1, oy0), (ox0, oy1), (ox1, oy1))]
+        lx0 = max(box[0], int(math.floor(min(c[0] for c in corners)))) - 2
+        ly0 = max(box[1], int(math.floor(min(c[1] for c in corners)))) - 2
+        lx1 = min(box[2], int(math.ceil(max(c[0] for c in corners)))) + 2
+        ly1 = min(box[3], int(math.ceil(max(c[1] for c in corners)))) + 2
+        if ox1 <= ox0 or oy1 <= oy0 or lx1 <= lx0 or ly1 <= ly0:
+            return
+        run, offset = _visible(text, face, anchor, lx0, lx1, size)
+        if not run:
+            return
+        # Coverage only (one byte a pixel); the colour goes on at the paste
+        label = Image.new("L", (lx1 - lx0, ly1 - ly0), 0)
+        if run == text:
+            ImageDraw.Draw(label).text((-lx0, -ly0), text, fill=fill[3], font=face, anchor=anchor)
+        else:
+            ImageDraw.Draw(label).text((offset - lx0, -ly0), run, fill=fill[3], font=face, anchor="ls")
+        # Output pixel → label pixel is the inverse rotation about the anchor
+        mask = label.transform(
+            (ox1 - ox0, oy1 - oy0), Image.Transform.AFFINE,
+            (cos, sin, (ox0 - x) * cos + (oy0 - y) * sin - lx0,
+             -sin, cos, (oy0 - y) * cos - (ox0 - x) * sin - ly0),
+            resample=Image.Resampling.BICUBIC
+        )
+        self.img.paste(fill[:3], (ox0, oy0, ox1, oy1), mask)
+
+    def _draw_gradient(self, prim, m):
+        start, end = rgba(prim["start"]), rgba(prim["end"])
+        if start is None or end is None:
+            return
+        x, y, w, h = prim["x"], prim["y"], prim["w"], prim["h"]
+        corners = [apply(m, cx, cy) for cx, cy in ((x, y), (x + w, y), (x + w, y + h), (x, y + h))]
+        x0 = max(0, int(math.floor(min(c[0] for c in corners))))
+        y0 = max(0, int(math.floor(min(c[1] for c in corners))))
+        x1 = min(self.img.width, int(math.ceil(max(c[0] for c in corners))))
+        y1 = min(self.img.height, int(math.ceil(max(c[1] for c in corners))))
+        if x1 <= x0 or y1 <= y0:
+            return
+        # Map each output pixel back to canvas space to evaluate the gradient
+        a, b, c, d, e, f = m
+        det = a * d - b * c
+        if det == 0:
+            return
+        px, py = np.meshgrid(np.arange(x0, x1) + 0.5, np.arange(y0, y1) + 0.5)
+        ux = (d * (px - e) - c * (py - f)) / det
+        uy = (-b * (px - e) + a * (py - f)) / det
+        if prim["type"] == "linear":
+            t = (ux - x) / (w or 1)
+        else:
+            r = min(w, h) / 2
+            inner = r / 4
+            t = (np.hypot(ux - (x + w / 2), uy - (y + h / 2)) - inner) / ((r - inner) or 1)
+        t = np.clip(t, 0, 1)[..., None]
+        colors = np.array(start, dtype=np.float32) * (1 - t) + np.array(end, dtype=np.float32) * t
+        inside = ((ux >= min(x, x + w)) & (ux < max(x, x + w)) & (uy >= min(y, y + h)) & (uy < max(y, y + h)))
+        colors[..., 3] *= inside
+        layer = Image.fromarray(colors.astype(np.uint8), "RGBA")
+        region = self.img.crop((x0, y0, x1, y1)).convert("RGBA")
+        self.img.paste(Image.alpha_composite(region, layer).convert("RGB"), (x0, y0))
+
+
+def render_log(width, height, background, actions, scale=1.0, supersample=2) -> Image.Image:
+    """
+    Replay (action, params_json, layout_json) rows, e.g. from
+    db.iter_actions, into a whole-canvas image scaled by `scale`.
+    """
+    r = Rasterizer(max(1, round(width * scale)), max(1, round(height * scale)),
+                   view=(scale, 0.0, 0.0, scale, 0.0, 0.0), background=background, supersample=supersample)
+    scene = Scene(width, height, background)
+    for action, params, layout in actions:
+        try:
+            prims = scene.compile(action, json.loads(params), layout and json.loads(layout))
+        except ValueError:
+            continue
+        for prim in prims:
+            r.draw(prim, scene.matrix)
+    return r.image()
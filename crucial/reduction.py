@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: reduction.py
+# Description: Ingest-time reduction of large graph datasets, with optional compressed raw storage
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Shrinks the data arrays of graph actions before they are stored and
+broadcast, to what the canvas can actually show:
+
+    graph_histogram     values → counts (numpy.histogram over the data
+                        range), plus the range
+    graph_line/area     min-max per pixel column (first, last, lowest and
+                        highest point of each), or LTTB down to one point
+                        per column
+    graph_scatter       one point per occupied pixel
+
+The global extremes of x and y are always kept, so the stored series
+scales exactly like the raw one. Only series longer than
+REDUCE.min_points are touched.
+
+Each action picks its method with `reduce` ("auto", "none", or for
+line/area "minmax" / "lttb") and may set `keep_raw` to have the original
+arrays kept zlib-compressed in action_raw, served by
+/object/{id}/actions/{action_id}/raw. The stored params carry the report
+as `reduced`; dispatch returns it as `reduction`.
+"""
+
+import json
+import zlib
+from collections import namedtuple
+import numpy as np
+from crucial.config import CONFIG
+from crucial.layout import MARGIN, TITLE_PAD, histogram_counts
+
+Reduction = namedtuple("Reduction", "params raw report")
+
+RAW_ENCODING = "zlib+json"
+
+
+def _chart_size(p, width, height):
+    title_pad = TITLE_PAD if p.get("title") else 0
+    return max(1, int(width - 2 * MARGIN)), max(1, int(height - 2 * MARGIN - title_pad))
+
+
+def _pixels(values, size):
+    """
+    Pixel index (0..size) of each value across the data range.
+    """
+    lo, hi = values.min(), values.max()
+    return ((values - lo) / ((hi - lo) or 1) * size).astype(np.int64)
+
+
+def _extremes(x, y):
+    return np.array([x.argmin(), x.argmax(), y.argmin(), y.argmax()])
+
+
+def minmax(x, y, columns):
+    """
+    Indices of the first, last, lowest and highest point per bucket: pixel
+    columns when x is monotonic, else equal runs of consecutive points.
+    """
+    n = len(x)
+    step = np.diff(x)
+    if (step >= 0).all() or (step <= 0).all():
+        bucket = _pixels(x, columns)
+    else:
+        bucket = np.arange(n) * columns // n
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    owner = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    picks = [starts, np.r_[starts[1:], n] - 1, _extremes(x, y)]
+    for extreme in (np.minimum, np.maximum):
+        # First point of each bucket equal to the bucket's extreme
+        hit = np.flatnonzero(y == extreme.reduceat(y, starts)[owner])
+        picks.append(hit[np.r_[True, owner[hit][1:] != owner[hit][:-1]]])
+    return np.unique(np.concatenate(picks))
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: the first and last point, and from each
+    of threshold - 2 buckets the point forming the largest triangle with
+    the previous pick and the next bucket's mean.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    bounds = np.append(edges, n)
+    sum_x, sum_y = np.r_[0, np.cumsum(x)], np.r_[0, np.cumsum(y)]
+    # Mean of the bucket after each bucket (the last point after the last)
+    lo, hi = bounds[1:-1], bounds[2:]
+    mean_x, mean_y = (sum_x[hi] - sum_x[lo]) / (hi - lo), (sum_y[hi] - sum_y[lo]) / (hi - lo)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        bx, by = x[start:stop], y[start:stop]
+        area = np.abs((x[a] - mean_x[i]) * (by - y[a]) - (x[a] - bx) * (mean_y[i] - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return np.unique(np.concatenate((keep, _extremes(x, y))))
+
+
+def pixel_grid(x, y, columns, rows):
+    """
+    Indices of the first point in each occupied pixel of the chart.
+    """
+    n = len(x)
+    cells = _pixels(x, columns) * (rows + 1) + _pixels(y, rows)
+    first = np.full((columns + 1) * (rows + 1), n)
+    np.minimum.at(first, cells, np.arange(n))
+    return np.unique(np.concatenate((first[first < n], _extremes(x, y))))
+
+
+def _report(method, points_in, points_out):
+    return {"method": method, "points_in": points_in, "points_out": points_out,
+            "ratio": round(points_in / max(points_out, 1), 2)}
+
+
+def _histogram(p, width, height):
+    values, bins = p.get("values"), p.get("bins", 10)
+    if not isinstance(bins, int) or bins < 1:
+        return None
+    data = np.asarray(values, dtype=np.float64)
+    reduced = {k: v for k, v in p.items() if k != "values"}
+    reduced["counts"] = histogram_counts(data, bins)
+    reduced["range"] = [float(data.min()), float(data.max())]
+    return reduced, {"values": values}, _report("histogram", len(values), bins)
+
+
+def _xy(p):
+    xs, ys = p.get("x_values"), p.get("y_values")
+    if not isinstance(ys, list) or len(xs) != len(ys):
+        return None
+    return np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+
+
+def _decimated(p, x, y, keep, method):
+    if len(keep) >= len(x):
+        return None
+    reduced = {k: v for k, v in p.items() if k not in ("x_values", "y_values")}
+    reduced["x_values"], reduced["y_values"] = x[keep].tolist(), y[keep].tolist()
+    return reduced, {"x_values": p["x_values"], "y_values": p["y_values"]}, _report(method, len(x), len(keep))
+
+
+def _line(p, width, height):
+    xy = _xy(p)
+    if xy is None:
+        return None
+    columns, _ = _chart_size(p, width, height)
+    method = p.get("reduce", "auto")
+    if method == "auto":
+        method = CONFIG["REDUCE"]["line_method"]
+    if method == "lttb":
+        return _decimated(p, *xy, lttb(*xy, columns), "lttb")
+    return _decimated(p, *xy, minmax(*xy, columns), "minmax")
+
+
+def _scatter(p, width, height):
+    xy = _xy(p)
+    if xy is None:
+        return None
+    return _decimated(p, *xy, pixel_grid(*xy, *_chart_size(p, width, height)), "grid")
+
+
+REDUCERS = {
+    "graph_histogram": ("values", _histogram),
+    "graph_line": ("x_values", _line),
+    "graph_area": ("x_values", _line),
+    "graph_scatter": ("x_values", _scatter),
+}
+
+
+def reduce(action, params, width, height):
+    """
+    Reduction of a graph action's data for a width x height canvas, or
+    None when the action is left as sent.
+    """
+    entry = REDUCERS.get(action)
+    settings = CONFIG["REDUCE"]
+    if entry is None or not settings["enabled"] or params.get("reduce", "auto") == "none":
+        return None
+    key, fn = entry
+    data = params.get(key)
+    if not isinstance(data, list) or len(data) <= settings["min_points"]:
+        return None
+    try:
+        result = fn(params, width, height)
+    except (TypeError, ValueError):
+        return None
+    if result is None:
+        return None
+    reduced, raw, report = result
+    keep_raw = params.get("keep_raw", settings["keep_raw"])
+    reduced["reduced"] = report
+    return Reduction(reduced, raw if keep_raw else None, report)
+
+
+def store_raw(cursor, canvas_id, action_id, raw) -> int:
+    """
+    Keep the raw arrays of a reduced action; returns the stored size.
+    """
+    data = zlib.compress(json.dumps(raw).encode(), CONFIG["REDUCE"]["raw_level"])
+    cursor.execute("INSERT OR REPLACE INTO action_raw (action_id, canvas_id, encoding, data) VALUES (?, ?, ?, ?)",
+                   (action_id, canvas_id, RAW_ENCODING, data))
+    return len(data)
+
+
+def load_raw(cursor, canvas_id, action_id):
+    """
+    The compressed raw arrays of one action, or None.
+    """
+    cursor.execute("SELECT data FROM action_raw WHERE action_id = ? AND canvas_id = ?", (action_id, canvas_id))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def delete_raw(cursor, canvas_ids):
+    marks = ",".join("?" * len(canvas_ids))
+    cursor.execute(f"DELETE FROM action_raw WHERE canvas_id IN ({marks})", list(canvas_ids))
@@ -0,0 +1,648 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: scene.py
+# Description: Compile logged canvas actions into renderer-neutral drawing primitives
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Server-side mirror of the frontend renderers (frontend/crucial.js). Each
+action compiles to a list of primitive dicts that exporters (SVG, raster)
+draw without knowing about tools:
+
+    {"kind": "path", "ops": [...], "stroke", "width", "fill", "dash", "cap"}
+    {"kind": "polyline", "points": (N, 2) ndarray, "stroke", "width", "fill": None}
+    {"kind": "circle", "cx", "cy", "r", "stroke", "width", "fill"}
+    {"kind": "rect", "x", "y", "w", "h", "stroke", "width", "fill"}
+    {"kind": "text", "x", "y", "text", "size", "family", "weight", "color", "anchor", "angle"}
+    {"kind": "gradient", "x", "y", "w", "h", "type", "start", "end"}
+
+Path ops follow the 2D canvas API:
+
+    ("M", x, y)  ("L", x, y)  ("Q", cx, cy, x, y)  ("C", c1x, c1y, c2x, c2y, x, y)
+    ("A", cx, cy, r, start, end, ccw)   # arc(); lines to its start if a point is current
+    ("Z",)
+
+rotate/scale/translate update a current transform (an SVG-style
+(a, b, c, d, e, f) matrix) that applies to every later action, like the
+canvas context transform. set_background repaints the whole canvas at
+that point in the log.
+"""
+
+import math
+from crucial import geometry
+from crucial import layout as graphs
+from crucial.config import get_logger
+from crucial.layout import MARGIN, MONO_ADVANCE
+from crucial.turtles import compile_turtle
+
+logger = get_logger(__name__)
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+# frontend/config.js themeStyles
+THEMES = {
+    "dark": {"background": "#000000", "text": "#ffffff", "accent": "#4ba3ff", "grid": "#444444"},
+    "light": {"background": "#ffffff", "text": "#000000", "accent": "#0066cc", "grid": "#cccccc"}
+}
+
+GRAPH_FONT = "Courier New"
+DASH = (4, 4)
+
+
+# ---------------------------------------------------------------------
+# Transforms
+# ---------------------------------------------------------------------
+def multiply(m, n):
+    """
+    Return m·n: the transform that applies n first, then m.
+    """
+    return (
+        m[0] * n[0] + m[2] * n[1],
+        m[1] * n[0] + m[3] * n[1],
+        m[0] * n[2] + m[2] * n[3],
+        m[1] * n[2] + m[3] * n[3],
+        m[0] * n[4] + m[2] * n[5] + m[4],
+        m[1] * n[4] + m[3] * n[5] + m[5]
+    )
+
+
+def apply(m, x, y):
+    return m[0] * x + m[2] * y + m[4], m[1] * x + m[3] * y + m[5]
+
+
+# ---------------------------------------------------------------------
+# Colours (ports of config.js helpers, so graph shades match the browser)
+# ---------------------------------------------------------------------
+def _round(v):
+    return math.floor(v + 0.5)  # Math.round, not banker's rounding
+
+
+def parse_hex(color):
+    """
+    Return (r, g, b) for #rgb / #rrggbb[aa], or None.
+    """
+    if not isinstance(color, str) or not color.startswith("#"):
+        return None
+    c = color[1:]
+    if len(c) == 3:
+        c = "".join(ch * 2 for ch in c)
+    try:
+        return int(c[0:2], 16), int(c[2:4], 16), int(c[4:6], 16)
+    except ValueError:
+        return None
+
+
+def hex_to_hsl(color):
+    r, g, b = (v / 255 for v in parse_hex(color))
+    hi, lo = max(r, g, b), min(r, g, b)
+    light = (hi + lo) / 2
+    if hi == lo:
+        hue = sat = 0.0
+    else:
+        d = hi - lo
+        sat = d / (2 - hi - lo) if light > 0.5 else d / (hi + lo)
+        if hi == r:
+            hue = (g - b) / d + (6 if g < b else 0)
+        elif hi == g:
+            hue = (b - r) / d + 2
+        else:
+            hue = (r - g) / d + 4
+        hue *= 60
+    return _round(hue), _round(sat * 100), _round(light * 100)
+
+
+def hsl_to_hex(h, s, l):
+    s /= 100
+    l /= 100
+    a = s * min(l, 1 - l)
+
+    def channel(n):
+        k = (n + h / 30) % 12
+        c = l - a * max(-1, min(k - 3, 9 - k, 1))
+        return f"{_round(255 * c):02x}"
+
+    return f"#{channel(0)}{channel(8)}{channel(4)}"
+
+
+def shades(color, count):
+    """
+    generateCrucialShadesN: `count` lightness steps around `color`.
+    """
+    if parse_hex(color) is None:
+        return [color] * count
+    h, s, l = hex_to_hsl(color)
+    step = 100 / (count + 1)
+    return [hsl_to_hex(h, s, max(10, min(90, l + (i - count // 2) * step))) for i in range(count)]
+
+
+def is_light(color):
+    rgb = parse_hex(color)
+    return rgb is not None and 0.299 * rgb[0] + 0.587 * rgb[1] + 0.114 * rgb[2] > 186
+
+
+# ---------------------------------------------------------------------
+# Primitive builders
+# ---------------------------------------------------------------------
+def path(ops, stroke=None, width=1, fill=None, dash=None, cap=None):
+    return {"kind": "path", "ops": ops, "stroke": stroke, "width": width, "fill": fill, "dash": dash, "cap": cap}
+
+
+def polyline(points, stroke, width=1):
+    """
+    An open stroked polyline over an (N, 2) array, for long vertex lists.
+    """
+    return {"kind": "polyline", "points": points, "stroke": stroke, "width": width, "fill": None}
+
+
+def text(x, y, content, size, color, family=GRAPH_FONT, weight=None, anchor="start", angle=0):
+    return {"kind": "text", "x": x, "y": y, "text": str(content), "size": size, "family": family,
+            "weight": weight, "color": color, "anchor": anchor, "angle": angle}
+
+
+def polyline_ops(points, closed=False):
+    ops = [("M", points[0][0], points[0][1])]
+    ops.extend(("L", p[0], p[1]) for p in points[1:])
+    if closed:
+        ops.append(("Z",))
+    return ops
+
+
+def smooth_ops(points, tension=0.5):
+    """
+    drawSmoothLine: Catmull-Rom through `points` as cubic Béziers.
+    """
+    ops = [("M", points[0][0], points[0][1])]
+    last = len(points) - 1
+    for i in range(last):
+        p0 = points[i - 1 if i > 0 else i]
+        p1, p2 = points[i], points[i + 1]
+        p3 = points[i + 2 if i + 2 <= last else i + 1]
+        ops.append((
+            "C",
+            p1[0] + (p2[0] - p0[0]) / 6 * tension, p1[1] + (p2[1] - p0[1]) / 6 * tension,
+            p2[0] - (p3[0] - p1[0]) / 6 * tension, p2[1] - (p3[1] - p1[1]) / 6 * tension,
+            p2[0], p2[1]
+        ))
+    return ops
+
+
+def _filled(fill):
+    return fill if fill and fill != "none" else None
+
+
+# ---------------------------------------------------------------------
+# Drawing tools
+# ---------------------------------------------------------------------
+def draw_line(p, w, h):
+    return [path([("M", p["start_x"], p["start_y"]), ("L", p["end_x"], p["end_y"])],
+                 stroke=p["color"], width=p["width"])]
+
+
+def draw_circle(p, w, h):
+    return [{"kind": "circle", "cx": p["center_x"], "cy": p["center_y"], "r": p["radius"],
+             "stroke": p["color"], "width": 1, "fill": _filled(p.get("fill"))}]
+
+
+def draw_rectangle(p, w, h):
+    return [{"kind": "rect", "x": p["x"], "y": p["y"], "w": p["width"], "h": p["height"],
+             "stroke": p["color"], "width": 1, "fill": _filled(p.get("fill"))}]
+
+
+def draw_text(p, w, h):
+    return [text(p["x"], p["y"], p["text"], p["size"], p.get("color") or "#ffffff", family=p["font"])]
+
+
+def draw_point(p, w, h):
+    return [{"kind": "circle", "cx": p["x"], "cy": p["y"], "r": p["radius"],
+             "stroke": None, "width": 0, "fill": p["color"]}]
+
+
+def draw_arc(p, w, h):
+    return [path([("A", p["center_x"], p["center_y"], p["radius"], p["start_angle"], p["end_angle"], False)],
+                 stroke=p["color"], width=p["width"])]
+
+
+def draw_polygon(p, w, h):
+    if not p["points"]:
+        return []
+    return [path(polyline_ops(p["points"], closed=True), stroke=p["color"], fill=_filled(p.get("fill")))]
+
+
+def draw_bezier(p, w, h):
+    cp = p["control_points"]
+    if len(cp) < 4:
+        return []
+    return [path([("M", cp[0][0], cp[0][1]), ("C", *cp[1][:2], *cp[2][:2], *cp[3][:2])],
+                 stroke=p["color"], width=p["width"])]
+
+
+def draw_gradient(p, w, h):
+    if p["type"] not in ("linear", "radial"):
+        return []
+    return [{"kind": "gradient", "x": p["x"], "y": p["y"], "w": p["width"], "h": p["height"],
+             "type": p["type"], "start": p["start_color"], "end": p["end_color"]}]
+
+
+def draw_path(p, w, h):
+    if not p["points"] or len(p["points"]) < 2:
+        return []
+    return [path(polyline_ops(p["points"]), stroke=p["color"], width=p["width"])]
+
+
+def draw_spline(p, w, h):
+    cp = p["control_points"]
+    if not cp or len(cp) < 2:
+        return []
+    ops = [("M", cp[0][0], cp[0][1])]
+    for (x0, y0), (x1, y1) in zip(cp[1:-1], cp[2:]):
+        ops.append(("Q", x0, y0, (x0 + x1) / 2, (y0 + y1) / 2))
+    ops.append(("L", cp[-1][0], cp[-1][1]))
+    return [path(ops, stroke=p["color"], width=p["width"])]
+
+
+def draw_turtle(p, w, h):
+    """
+    Consecutive pen-down moves with the same pen become one polyline; the
+    program is compiled (and cached) by crucial.turtles.
+    """
+    turtle = compile_turtle(p)
+    return [polyline(turtle.points[start:stop], stroke=color, width=width)
+            for start, stop, color, width in turtle.runs]
+
+
+# ---------------------------------------------------------------------
+# Graphs
+# ---------------------------------------------------------------------
+def _frame(p, w, h, title_size=18, title_y=MARGIN):
+    """
+    Background and title shared by every graph; returns (style, prims).
+    """
+    style = THEMES.get(p.get("theme") or "dark", THEMES["dark"])
+    prims = []
+    if not p.get("transparent", False):
+        prims.append({"kind": "rect", "x": 0, "y": 0, "w": w, "h": h,
+                      "stroke": None, "width": 0, "fill": style["background"]})
+    if p.get("title"):
+        prims.append(text(w / 2, title_y, p["title"], title_size, style["text"], weight="bold", anchor="middle"))
+    return style, prims
+
+
+def _grid(style, w, h, xs, ys):
+    ops = []
+    for x in xs:
+        ops += [("M", x, MARGIN), ("L", x, h - MARGIN)]
+    for y in ys:
+        ops += [("M", MARGIN, y), ("L", w - MARGIN, y)]
+    return path(ops, stroke=style["grid"], width=1, dash=DASH)
+
+
+def _axis_labels(p, style, w, h):
+    prims = []
+    if p.get("x_label"):
+        prims.append(text(w / 2, h - 8, p["x_label"], 12, style["text"], anchor="middle"))
+    if p.get("y_label"):
+        prims.append(text(12, h / 2, p["y_label"], 12, style["text"], anchor="middle", angle=-90))
+    return prims
+
+
+# Each graph draws from its crucial.layout geometry: the one stored with
+# the action when given, else computed here.
+def graph_bar(p, w, h, layout=None):
+    layout = layout or graphs.bar(p, w, h)
+    if not layout:
+        return []
+    style, prims = _frame(p, w, h)
+    colors = shades(p["color"], len(p["labels"]))
+    for (x, y, bar_w, bar_h), label, color in zip(layout["bars"], p["labels"], colors):
+        r = max(0, min(bar_w, bar_h) * 0.15)
+        prims.append(path([
+            ("M", x, y + bar_h),
+            ("L", x, y + r),
+            ("A", x + r, y + r, r, math.pi, 1.5 * math.pi, False),
+            ("L", x + bar_w - r, y),
+            ("A", x + bar_w - r, y + r, r, 1.5 * math.pi, 2 * math.pi, False),
+            ("L", x + bar_w, y + bar_h),
+            ("Z",)
+        ], fill=color))
+        prims.append(text(x + bar_w / 2, h - MARGIN + 14, label, 12, style["text"], anchor="middle"))
+    return prims
+
+
+def graph_line(p, w, h, layout=None):
+    layout = layout or graphs.line(p, w, h)
+    if not layout:
+        return []
+    style, prims = _frame(p, w, h)
+    points = layout["points"]
+    prims.append(_grid(style, w, h, [pt[0] for pt in points], layout["rows"]))
+    prims.append(path(smooth_ops(points), stroke=shades(p["color"], 1)[0], width=2))
+    return prims + _axis_labels(p, style, w, h)
+
+
+def graph_area(p, w, h, layout=None):
+    layout = layout or graphs.area(p, w, h)
+    if not layout:
+        return []
+    style, prims = _frame(p, w, h)
+    stroke = shades(p["color"], 1)[0]
+    points = layout["points"]
+    prims.append(_grid(style, w, h, [pt[0] for pt in points], layout["rows"]))
+    curve = smooth_ops(points)
+    area = [("M", points[0][0], h - MARGIN), ("L", *points[0])] + curve[1:] + [("L", points[-1][0], h - MARGIN), ("Z",)]
+    prims.append(path(area, fill=stroke + "33"))
+    prims.append(path(curve, stroke=stroke, width=2))
+    return prims + _axis_labels(p, style, w, h)
+
+
+def graph_scatter(p, w, h, layout=None):
+    layout = layout or graphs.scatter(p, w, h)
+    if not layout:
+        return []
+    style, prims = _frame(p, w, h)
+    prims.append(_grid(style, w, h, [pt[0] for pt in layout["points"]], layout["rows"]))
+    color = shades(p["color"], 1)[0]
+    prims.extend({"kind": "circle", "cx": x, "cy": y, "r": 4, "stroke": None, "width": 0, "fill": color}
+                 for x, y in layout["points"])
+    return prims + _axis_labels(p, style, w, h)
+
+
+def graph_bubble(p, w, h, layout=None):
+    layout = layout or graphs.bubble(p, w, h)
+    if not layout:
+        return []
+    style, prims = _frame(p, w, h)
+    prims.append(_grid(style, w, h, [pt[0] for pt in layout["points"]], layout["rows"]))
+    color = shades(p["color"], 1)[0]
+    prims.extend({"kind": "circle", "cx": x, "cy": y, "r": r, "stroke": None, "width": 0, "fill": color}
+                 for (x, y), r in zip(layout["points"], layout["radii"]))
+    return prims + _axis_labels(p, style, w, h)
+
+
+def _slices(p, w, h, layout):
+    style, prims = _frame(p, w, h)
+    colors = shades(p["color"], len(p["labels"]))
+    (cx, cy), outer, inner = layout["center"], layout["outer"], layout["inner"]
+    for label, (start, end), color in zip(p["labels"], layout["angles"], colors):
+        if inner:
+            ops = [("A", cx, cy, outer, start, end, False), ("A", cx, cy, inner, end, start, True), ("Z",)]
+            label_r = (outer + inner) / 2
+        else:
+            ops = [("M", cx, cy), ("A", cx, cy, outer, start, end, False), ("Z",)]
+            label_r = outer * 0.7
+        prims.append(path(ops, fill=color))
+        mid = start + (end - start) / 2
+        prims.append(text(cx + math.cos(mid) * label_r, cy + math.sin(mid) * label_r, label, 12,
+                          "#000000" if is_light(color) else "#ffffff", anchor="middle"))
+    return style, prims
+
+
+def graph_pie(p, w, h, layout=None):
+    layout = layout or graphs.pie(p, w, h)
+    return _slices(p, w, h, layout)[1] if layout else []
+
+
+def graph_donut(p, w, h, layout=None):
+    layout = layout or graphs.donut(p, w, h)
+    if not layout:
+        return []
+    style, prims = _slices(p, w, h, layout)
+    values = p["values"]
+    top = p["labels"][values.index(max(values))]
+    prims.append(text(w / 2, h / 2 + 16, top, 16, style["text"], weight="bold", anchor="middle"))
+    return prims
+
+
+def graph_heatmap(p, w, h, layout=None):
+    layout = layout or graphs.heatmap(p, w, h)
+    if not layout:
+        return []
+    style, prims = _frame(p, w, h)
+    tint = shades(p["color"], 100)
+    x0, y0, cell_w, cell_h = layout["cell"]
+    for r, row in enumerate(layout["levels"]):
+        for c, level in enumerate(row):
+            prims.append({"kind": "rect", "x": x0 + c * cell_w, "y": y0 + r * cell_h,
+                          "w": cell_w, "h": cell_h, "stroke": None, "width": 0, "fill": tint[level]})
+    return prims
+
+
+def graph_histogram(p, w, h, layout=None):
+    layout = layout or graphs.histogram(p, w, h)
+    if not layout:
+        return []
+    style, prims = _frame(p, w, h)
+    counts = layout["counts"]
+    chart_h = h - MARGIN * 2 - (30 if p.get("title") else 0)
+    bar_w = (w - MARGIN * 2) / len(counts)
+    peak = max(counts) or 1
+    for i, (count, color) in enumerate(zip(counts, shades(p["color"], len(counts)))):
+        bar_h = count / peak * chart_h
+        prims.append({"kind": "rect", "x": MARGIN + i * bar_w + 2, "y": h - MARGIN - bar_h,
+                      "w": bar_w - 4, "h": bar_h, "stroke": None, "width": 0, "fill": color})
+    return prims
+
+
+def graph_radar(p, w, h, layout=None):
+    layout = layout or graphs.radar(p, w, h)
+    if not layout:
+        return []
+    labels = p["labels"]
+    style, prims = _frame(p, w, h)
+    stroke = shades(p["color"], 1)[0]
+    (cx, cy), radius = layout["center"], layout["radius"]
+    step = 2 * math.pi / len(labels)
+    at = lambda r, i: (cx + r * math.cos(i * step), cy + r * math.sin(i * step))
+
+    grid = []
+    for level in range(1, 6):
+        grid += polyline_ops([at(radius * level / 5, i) for i in range(len(labels) + 1)], closed=True)
+    for i in range(len(labels)):
+        grid += [("M", cx, cy), ("L", *at(radius, i))]
+    prims.append(path(grid, stroke=style["grid"], width=1, dash=DASH))
+
+    shape = polyline_ops(layout["points"], closed=True)
+    prims.append(path(shape, fill=stroke + "33"))
+    prims.append(path(shape, stroke=stroke, width=2))
+    prims.extend(text(*at(radius + 20, i), label, 12, style["text"], anchor="middle")
+                 for i, label in enumerate(labels))
+    return prims
+
+
+def graph_gauge(p, w, h, layout=None):
+    layout = layout or graphs.gauge(p, w, h)
+    if not layout:
+        return []
+    value = p["value"]
+    arc_w = 30
+    (cx, cy), radius = layout["center"], layout["radius"]
+    style, prims = _frame(p, w, h, title_size=20)
+    prims.append(path([("A", cx, cy, radius, math.pi, 2 * math.pi, False)],
+                      stroke=style["grid"], width=arc_w, cap="round"))
+    prims.append(path([("A", cx, cy, radius, math.pi, math.pi + math.pi * value / 100, False)],
+                      stroke=shades(p["color"], 1)[0], width=arc_w, cap="round"))
+    prims.append(text(cx, cy + 10, f"{value:.0f}%", 28, style["text"], weight="bold", anchor="middle"))
+    if p.get("label"):
+        prims.append(text(cx, cy + 36, p["label"], 14, style["text"], anchor="middle"))
+    return prims
+
+
+def graph_wordcloud(p, w, h, layout=None):
+    layout = layout or graphs.wordcloud(p, w, h)
+    if not layout:
+        return []
+    style, prims = _frame(p, w, h)
+    words = p["word_texts"]
+    colors = shades(p["color"], len(words))
+    prims.extend(text(x, y, words[i], size, colors[i], weight="bold") for i, x, y, size in layout["words"])
+    return prims
+
+
+# ---------------------------------------------------------------------
+# Bounding boxes
+# ---------------------------------------------------------------------
+def _local_bounds(prim):
+    kind = prim["kind"]
+    pad = prim.get("width", 0) / 2 if prim.get("stroke") else 0
+    if kind == "path":
+        if any(op[0] in ("Q", "C", "A") for op in prim["ops"]):
+            # Extent of the tessellated path, padded by the chord tolerance
+            box = geometry.bounds(prim["ops"])
+            return box and (box[0] - pad, box[1] - pad, box[2] + pad, box[3] + pad)
+        xs = [op[1] for op in prim["ops"] if op[0] != "Z"]
+        ys = [op[2] for op in prim["ops"] if op[0] != "Z"]
+        if not xs:
+            return None
+        return min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad
+    if kind == "polyline":
+        (x0, y0), (x1, y1) = prim["points"].min(axis=0), prim["points"].max(axis=0)
+        return float(x0) - pad, float(y0) - pad, float(x1) + pad, float(y1) + pad
+    if kind == "circle":
+        r = abs(prim["r"]) + pad
+        return prim["cx"] - r, prim["cy"] - r, prim["cx"] + r, prim["cy"] + r
+    if kind in ("rect", "gradient"):
+        x0, x1 = sorted((prim["x"], prim["x"] + prim["w"]))
+        y0, y1 = sorted((prim["y"], prim["y"] + prim["h"]))
+        return x0 - pad, y0 - pad, x1 + pad, y1 + pad
+    if kind == "text":
+        width = len(prim["text"]) * prim["size"] * MONO_ADVANCE
+        x0 = prim["x"] - (width / 2 if prim["anchor"] == "middle" else 0)
+        box = (x0, prim["y"] - prim["size"], x0 + width, prim["y"] + prim["size"] * 0.25)
+        if prim["angle"]:
+            rad = math.radians(prim["angle"])
+            cos, sin = math.cos(rad), math.sin(rad)
+            x, y = prim["x"], prim["y"]
+            rotation = (cos, sin, -sin, cos, x - x * cos + y * sin, y - x * sin - y * cos)
+            return transform_bounds(box, rotation)
+        return box
+    return None
+
+
+def transform_bounds(box, matrix):
+    if matrix == IDENTITY:
+        return box
+    x0, y0, x1, y1 = box
+    corners = [apply(matrix, x, y) for x, y in ((x0, y0), (x1, y0), (x0, y1), (x1, y1))]
+    xs = [c[0] for c in corners]
+    ys = [c[1] for c in corners]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def bounds(prim, matrix=IDENTITY):
+    """
+    Conservative axis-aligned (x0, y0, x1, y1) of a primitive in canvas
+    coordinates, or None if it draws nothing. Curves and arcs use the
+    extent of their tessellation widened by the flattening tolerance, so
+    boxes hug the drawn path yet never miss it.
+    """
+    box = _local_bounds(prim)
+    if box is None:
+        return None
+    return transform_bounds(box, IDENTITY if prim.get("screen") else matrix)
+
+
+def union(boxes):
+    boxes = [b for b in boxes if b is not None]
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+BUILDERS = {
+    "draw_line": draw_line,
+    "draw_circle": draw_circle,
+    "draw_rectangle": draw_rectangle,
+    "draw_text": draw_text,
+    "draw_point": draw_point,
+    "draw_arc": draw_arc,
+    "draw_polygon": draw_polygon,
+    "draw_bezier": draw_bezier,
+    "draw_gradient": draw_gradient,
+    "draw_path": draw_path,
+    "draw_spline": draw_spline,
+    "draw_turtle": draw_turtle,
+    "graph_bar": graph_bar,
+    "graph_line": graph_line,
+    "graph_area": graph_area,
+    "graph_scatter": graph_scatter,
+    "graph_bubble": graph_bubble,
+    "graph_pie": graph_pie,
+    "graph_donut": graph_donut,
+    "graph_heatmap": graph_heatmap,
+    "graph_histogram": graph_histogram,
+    "graph_radar": graph_radar,
+    "graph_gauge": graph_gauge,
+    "graph_wordcloud": graph_wordcloud
+}
+
+
+class Scene:
+    """
+    Compiles a canvas's actions in log order, carrying the transform
+    state between them.
+    """
+    def __init__(self, width, height, background=None):
+        self.width = width
+        self.height = height
+        self.background = background
+        self.matrix = IDENTITY
+
+    def compile(self, action, params, layout=None) -> list:
+        """
+        Return the primitives for one action, in the frame of self.matrix
+        as it stands after the call. Malformed params compile to nothing,
+        as the browser would draw nothing. `layout` is the action's stored
+        crucial.layout geometry, if any.
+        """
+        if action == "rotate":
+            rad = math.radians(params.get("angle_in_degrees", 0))
+            cos, sin = math.cos(rad), math.sin(rad)
+            self.matrix = multiply(self.matrix, (cos, sin, -sin, cos, 0.0, 0.0))
+            return []
+        if action == "scale":
+            self.matrix = multiply(self.matrix, (params.get("scale_x", 1), 0.0, 0.0, params.get("scale_y", 1), 0.0, 0.0))
+            return []
+        if action == "translate":
+            self.matrix = multiply(self.matrix, (1.0, 0.0, 0.0, 1.0, params.get("dx", 0), params.get("dy", 0)))
+            return []
+        if action == "set_background":
+            self.background = params.get("color", self.background)
+            return [{"kind": "rect", "x": 0, "y": 0, "w": self.width, "h": self.height,
+                     "stroke": None, "width": 0, "fill": self.background, "screen": True}]
+
+        builder = BUILDERS.get(action)
+        if builder is None:
+            return []
+        try:
+            if graphs.valid(layout) and action in graphs.LAYOUTS:
+                return builder(params, self.width, self.height, layout)
+            return builder(params, self.width, self.height)
+        except (KeyError, TypeError, ValueError, IndexError, ZeroDivisionError) as e:
+            logger.debug("Skipping malformed %s: %s", action, e)
+            return []
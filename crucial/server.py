@@ -10,11 +10,14 @@
 
 import os
 import json
+import zlib
+import asyncio
 import time
+import tempfile
 import uvicorn
-import threading
 
 from io import BytesIO
+from typing import Optional
 from collections import defaultdict
 
 from fastapi import(
@@ -30,17 +33,48 @@ from fastapi.responses import (
     FileResponse,
     StreamingResponse,
     Response, 
-    HTMLResponse
+    HTMLResponse,
+    PlainTextResponse
 )
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 
+from crucial import metrics, spatial
 from crucial.registry import get_registry
 from crucial.dispatcher import Dispatcher
-from crucial.db import get_db_connection, cleanup_expired_canvases
-from crucial.canvas import Canvas, set_canvas_subscribers
-from crucial.auth import require_api_key_header
-from crucial.config import CONFIG, get_logger
+from crucial.db import (
+    DB_PATH,
+    get_db_connection,
+    get_canvas_stats,
+    list_canvas_stats,
+    record_action_stats,
+    reset_action_stats
+)
+from crucial.canvas import Canvas, set_canvas_subscribers, human_ids
+from crucial.eviction import owner_fingerprint, get_engine
+from crucial.auth import require_api_key_header, require_admin_key_header
+from crucial.config import CONFIG, get_logger, get_log_handler
 from crucial.loader import crucial_python_loader
+from crucial.tracing import tracing_middleware, annotate
+from crucial.profiler import sample_stacks, LoopLagMonitor
+from crucial.svg import stream_canvas
+from crucial.tiles import get_tile_cache
+from crucial.thumbs import get_thumbnailer, placeholder
+from crucial.timeline import get_timeline_renderer, TimelineRenderError, MAX_FRAMES
+from crucial.layout import compute as compute_layout
+from crucial.reduction import load_raw, delete_raw
+from crucial.lifecycle import (
+    ServiceManager,
+    LogService,
+    DatabaseService,
+    BroadcastHub,
+    WriteGate,
+    CleanupScheduler,
+    ThumbnailService,
+    TimelineService,
+    LoopMonitorService
+)
+from crucial.utils.human_id import HumanIdExhausted
 
 logger = get_logger(__name__)
 
@@ -49,7 +83,31 @@ dispatcher = Dispatcher()
 SCHEMA_DIR = os.path.join(os.path.dirname(__file__), "schema")
 FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "frontend")
 
-app = FastAPI(title="Crucial API", version="0.1.0")
+# ---------------------------------------------------------------------
+# Lifecycle: services start in this order and stop in reverse
+# ---------------------------------------------------------------------
+canvas_subscribers = defaultdict(set)
+set_canvas_subscribers(canvas_subscribers)
+
+loop_monitor = LoopLagMonitor(CONFIG["PROFILING"]["loop_lag_threshold_ms"])
+writes = WriteGate()
+cleanup = CleanupScheduler(
+    CONFIG["CANVAS"]["cleanup_interval"],
+    CONFIG["CANVAS"]["cleanup_lock_path"] or f"{DB_PATH}.cleanup.lock"
+)
+
+services = [LogService(), DatabaseService(), BroadcastHub(canvas_subscribers), writes, cleanup,
+            TimelineService(get_timeline_renderer())]
+if CONFIG["THUMBS"]["enabled"]:
+    services.append(ThumbnailService(get_thumbnailer()))
+if CONFIG["PROFILING"]["loop_lag_monitor"]:
+    services.append(LoopMonitorService(loop_monitor))
+lifecycle = ServiceManager(services, drain_timeout=CONFIG["SERVER"]["drain_timeout"])
+
+app = FastAPI(title="Crucial API", version="0.1.0", lifespan=lifecycle.lifespan)
+
+if CONFIG["TRACING"]["enabled"]:
+    app.middleware("http")(tracing_middleware)
 
 # ---------------------------------------------------------------------
 # Serve static frontend files
@@ -94,8 +152,10 @@ async def canvas_action(request: Request, payload: dict):
         logger.warning("Canvas action missing 'action' field")
         raise HTTPException(status_code=400, detail="Missing 'action' field")
 
+    annotate(action=action)
     try:
-        result = dispatcher.dispatch(action, params)
+        with writes.hold():
+            result = dispatcher.dispatch(action, params)
         logger.info("Executed canvas action: %s", action)
         return JSONResponse(content={"status": "ok", "result": result})
     except HTTPException as e:
@@ -105,6 +165,49 @@ async def canvas_action(request: Request, payload: dict):
         logger.exception("Canvas dispatch error for action: %s", action)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@app.post("/canvas/batch")
+async def canvas_batch(request: Request, payload: dict):
+    """
+    Execute many canvas actions in one round-trip.
+    Body: {"actions": [{"action": ..., "params": {...}}, ...]}
+    Returns one result entry per action, in order.
+    """
+    require_api_key_header(request.headers)
+    require_api_key(request)
+
+    actions = payload.get("actions")
+    if not isinstance(actions, list):
+        raise HTTPException(status_code=400, detail="Missing or invalid 'actions' array")
+
+    with writes.hold():
+        results = dispatcher.dispatch_batch(actions)
+    return JSONResponse(content={"status": "ok", "results": results})
+
+@app.post("/canvas/create/bulk")
+async def create_canvases(request: Request, payload: dict):
+    """
+    Create several canvases in one request, their human IDs reserved
+    together. Body: {"canvases": [{"name", "x", "y", "color"}, ...]}
+    """
+    require_api_key_header(request.headers)
+    require_api_key(request)
+
+    specs = payload.get("canvases")
+    if not isinstance(specs, list) or not specs or not all(isinstance(spec, dict) for spec in specs):
+        raise HTTPException(status_code=400, detail="Missing or invalid 'canvases' array")
+    limit = CONFIG["CANVAS"]["bulk_create_max"]
+    if len(specs) > limit:
+        raise HTTPException(status_code=413, detail=f"At most {limit} canvases per request")
+
+    try:
+        with writes.hold():
+            results = Canvas.create_many(specs, owner=owner_fingerprint(request.headers.get("x-api-key")))
+    except HumanIdExhausted as e:
+        logger.error("Bulk canvas creation failed: %s", e)
+        raise HTTPException(status_code=503, detail=str(e))
+    logger.info("Created %d canvases in bulk", len(results))
+    return {"status": "created", "canvases": results}
+
 @app.get("/canvas")
 async def serve_canvas_query(id: str = Query(None)):
     if not id:
@@ -143,7 +246,8 @@ async def post_canvas_action_uri(request: Request, canvas_id: str, action: str,
 
     payload["canvas_id"] = canvas_id
     try:
-        result = dispatcher.dispatch(action, payload)
+        with writes.hold():
+            result = dispatcher.dispatch(action, payload)
         return JSONResponse(content={"status": "ok", "result": result})
     except HTTPException as e:
         raise e
@@ -161,7 +265,12 @@ async def create_canvas(request: Request, payload: dict):
     height = payload.get("y", 600)
     color = payload.get("color", "#000000")
 
-    canvas = Canvas(name, width, height, color)
+    try:
+        with writes.hold():
+            canvas = Canvas(name, width, height, color, owner=owner_fingerprint(request.headers.get("x-api-key")))
+    except HumanIdExhausted as e:
+        logger.error("Canvas creation failed: %s", e)
+        raise HTTPException(status_code=503, detail=str(e))
     logger.info("Created new canvas: %s (%s) %s %sx%s", name, canvas.id, color, width, height)
     return {
         "status": "created",
@@ -181,18 +290,40 @@ async def get_canvas_metadata(canvas_id: str):
         logger.warning("Metadata fetch failed: canvas %s not found", resolved_id)
         raise HTTPException(status_code=404, detail="Canvas not found")
     logger.debug("Fetched metadata for canvas %s", resolved_id)
-    return dict(row)
+    metadata = dict(row)
+    metadata["stats"] = get_canvas_stats(resolved_id)
+    return metadata
 
 
 @app.get("/object/{canvas_id}/history")
-async def get_canvas_history(canvas_id: str):
+async def get_canvas_history(canvas_id: str, region: Optional[str] = Query(default=None)):
+    """
+    Full action log, or with `region=x0,y0,x1,y1` only the actions whose
+    bounds touch that rectangle plus the transforms needed to replay them.
+    Graph actions carry their stored crucial.layout geometry as `layout`.
+    """
     resolved_id = Canvas.resolve_id(canvas_id)
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute(
-        "SELECT timestamp, action, params FROM actions WHERE canvas_id = ? ORDER BY timestamp ASC",
-        (resolved_id,)
-    )
+    if isinstance(region, str):
+        try:
+            box = tuple(float(v) for v in region.split(","))
+        except ValueError:
+            box = ()
+        if len(box) != 4:
+            raise HTTPException(status_code=400, detail="region must be x0,y0,x1,y1")
+        if not spatial.enabled(cur):
+            raise HTTPException(status_code=501, detail="Spatial index unavailable")
+        ids = spatial.actions_in_region(cur, resolved_id, box, include_state=True)
+        cur.execute(
+            f"SELECT timestamp, action, params, layout FROM actions WHERE id IN ({','.join('?' * len(ids))})"
+            " ORDER BY timestamp ASC, id ASC", ids
+        )
+    else:
+        cur.execute(
+            "SELECT timestamp, action, params, layout FROM actions WHERE canvas_id = ? ORDER BY timestamp ASC",
+            (resolved_id,)
+        )
     rows = []
     for row in cur.fetchall():
         action = dict(row)
@@ -200,10 +331,116 @@ async def get_canvas_history(canvas_id: str):
             action["params"] = json.loads(action["params"])
         except Exception:
             action["params"] = {}
+        action["layout"] = json.loads(action["layout"]) if action["layout"] else None
         rows.append(action)
     return rows
 
 
+
+@app.get("/object/{canvas_id}/actions/{action_id}/raw")
+async def get_action_raw(request: Request, canvas_id: str, action_id: int):
+    """
+    The original data arrays of a graph action reduced at ingest with
+    `keep_raw`, as JSON. Sent still compressed when the client accepts
+    deflate (the stored zlib stream is exactly that encoding).
+    """
+    resolved_id = Canvas.resolve_id(canvas_id)
+    conn = get_db_connection()
+    data = load_raw(conn.cursor(), resolved_id, action_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="No raw data kept for this action")
+    if "deflate" in request.headers.get("accept-encoding", ""):
+        return Response(data, media_type="application/json", headers={"Content-Encoding": "deflate"})
+    return Response(await asyncio.to_thread(zlib.decompress, data), media_type="application/json")
+
+@app.get("/canvas/{canvas_id}/export.svg")
+async def export_canvas_svg(canvas_id: str, download: bool = Query(False)):
+    canvas = Canvas.from_id(canvas_id)
+    if not canvas:
+        raise HTTPException(status_code=404, detail="Canvas not found")
+    disposition = "attachment" if download else "inline"
+    return StreamingResponse(
+        stream_canvas(canvas),
+        media_type="image/svg+xml",
+        headers={"Content-Disposition": f'{disposition}; filename="{canvas.human_id or canvas.id}.svg"'}
+    )
+
+
+@app.get("/canvas/{canvas_id}/tiles")
+async def describe_canvas_tiles(canvas_id: str):
+    canvas = Canvas.from_id(canvas_id)
+    if not canvas:
+        raise HTTPException(status_code=404, detail="Canvas not found")
+    return get_tile_cache().describe(canvas)
+
+
+@app.get("/canvas/{canvas_id}/tiles/{z}/{x}/{y}.png")
+async def get_canvas_tile(canvas_id: str, z: int, x: int, y: int):
+    canvas = Canvas.from_id(canvas_id)
+    if not canvas:
+        raise HTTPException(status_code=404, detail="Canvas not found")
+    try:
+        # Rendering is CPU-bound; keep it off the event loop
+        path = await asyncio.to_thread(get_tile_cache().tile_path, canvas, z, x, y)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/canvas/{canvas_id}/timeline.{ext}")
+async def export_canvas_timeline(
+    canvas_id: str,
+    ext: str,
+    frames: int = Query(100, ge=1, le=MAX_FRAMES),
+    delay: int = Query(100, ge=20, le=10000),
+    scale: float = Query(1.0, gt=0, le=1.0)
+):
+    """
+    Animated replay of the action log: timeline.gif or timeline.png (APNG),
+    rendered in a memory-capped worker process.
+    """
+    formats = {"gif": "gif", "png": "apng"}
+    if ext not in formats:
+        raise HTTPException(status_code=404, detail="Timeline is available as .gif or .png")
+    canvas = Canvas.from_id(canvas_id)
+    if not canvas:
+        raise HTTPException(status_code=404, detail="Canvas not found")
+    fd, path = tempfile.mkstemp(suffix=f".{ext}")
+    os.close(fd)
+    try:
+        await get_timeline_renderer().render(canvas, path, formats[ext], frames, delay, 2000, scale)
+    except TimelineRenderError as e:
+        os.remove(path)
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception:
+        os.remove(path)
+        raise
+    return FileResponse(path, media_type=f"image/{ext}", background=BackgroundTask(os.remove, path),
+                        filename=f"{canvas.human_id or canvas.id}-timeline.{ext}",
+                        content_disposition_type="inline")
+
+
+@app.get("/canvas/{canvas_id}/thumb.png")
+async def get_canvas_thumbnail(canvas_id: str):
+    """
+    Cached thumbnail, or a placeholder while one renders in the background.
+    X-Thumbnail says which: fresh, stale (a newer one is queued) or placeholder.
+    """
+    canvas = Canvas.from_id(canvas_id)
+    if not canvas:
+        raise HTTPException(status_code=404, detail="Canvas not found")
+    thumbnailer = get_thumbnailer()
+    body, fresh = await asyncio.to_thread(thumbnailer.lookup, canvas.id)
+    metrics.cache_lookup("thumbnails", fresh)
+    if not fresh and CONFIG["THUMBS"]["enabled"]:
+        thumbnailer.request(canvas.id)
+    headers = {"Cache-Control": "no-cache"}
+    if body:
+        return Response(body, media_type="image/png", headers={**headers, "X-Thumbnail": "fresh" if fresh else "stale"})
+    body = placeholder(canvas.width, canvas.height, canvas.bg_color, thumbnailer.size)
+    return Response(body, media_type="image/png", headers={**headers, "X-Thumbnail": "placeholder"})
+
+
 @app.post("/object/{canvas_id}/load")
 async def load_canvas_log(request: Request, canvas_id: str, payload: dict):
     require_api_key_header(request.headers)
@@ -214,15 +451,27 @@ async def load_canvas_log(request: Request, canvas_id: str, payload: dict):
     if not isinstance(history, list):
         raise HTTPException(status_code=400, detail="Missing or invalid 'history' array")
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM actions WHERE canvas_id = ?", (resolved_id,))
-    for entry in history:
-        cur.execute(
-            "INSERT INTO actions (canvas_id, timestamp, action, params) VALUES (?, ?, ?, ?)",
-            (resolved_id, entry["timestamp"], entry["action"], json.dumps(entry["params"]))
-        )
-    conn.commit()
+    with writes.hold():
+        conn = get_db_connection()
+        cur = conn.cursor()
+        size = cur.execute("SELECT width, height FROM canvases WHERE id = ?", (resolved_id,)).fetchone()
+        spatial.delete_action_bounds(cur, [resolved_id])
+        delete_raw(cur, [resolved_id])
+        cur.execute("DELETE FROM actions WHERE canvas_id = ?", (resolved_id,))
+        reset_action_stats(cur, resolved_id)
+        for entry in history:
+            encoded = json.dumps(entry["params"])
+            # Recomputed rather than trusting any layout the history carries
+            resolved = size and compute_layout(entry["action"], entry["params"], *size)
+            cur.execute(
+                "INSERT INTO actions (canvas_id, timestamp, action, params, layout) VALUES (?, ?, ?, ?, ?)",
+                (resolved_id, entry["timestamp"], entry["action"], encoded, resolved and json.dumps(resolved))
+            )
+            action_id = cur.lastrowid
+            record_action_stats(cur, resolved_id, entry["action"], len(encoded.encode()), action_id, entry["timestamp"])
+            if size:
+                spatial.record_action_bounds(cur, resolved_id, action_id, entry["action"], entry["params"], *size)
+        conn.commit()
     return {"status": "loaded", "canvas_id": resolved_id, "actions_loaded": len(history)}
 
 
@@ -247,13 +496,14 @@ def require_api_key(request: Request):
 # ---------------------------------------------------------------------
 # WebSockets 
 # ---------------------------------------------------------------------
-# Keep track of canvas_id → set of connected WebSockets
-canvas_subscribers = defaultdict(set)
-set_canvas_subscribers(canvas_subscribers)
-
+# canvas_subscribers (canvas_id → set of connected WebSockets) is owned by
+# the BroadcastHub service defined above.
 @app.websocket("/ws/canvas/{canvas_id}")
 async def websocket_canvas_updates(websocket: WebSocket, canvas_id: str):
     await websocket.accept()
+    if lifecycle.draining:
+        await websocket.close(code=1013)  # try again later, on another worker
+        return
     canvas_subscribers[canvas_id].add(websocket)
     logger.info("WebSocket connected: canvas %s", canvas_id)
 
@@ -264,6 +514,106 @@ async def websocket_canvas_updates(websocket: WebSocket, canvas_id: str):
         canvas_subscribers[canvas_id].remove(websocket)
         logger.info("WebSocket disconnected: canvas %s", canvas_id)
 
+# ---------------------------------------------------------------------
+# Health
+# ---------------------------------------------------------------------
+@app.get("/health")
+async def health():
+    """
+    Liveness: the process is serving. Includes per-service detail.
+    """
+    return {"status": "draining" if lifecycle.draining else "ok", "services": lifecycle.health()}
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: every service started and healthy, and not draining.
+    """
+    body = {"ready": lifecycle.ready, "services": lifecycle.health()}
+    return JSONResponse(content=body, status_code=200 if body["ready"] else 503)
+
+# ---------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------
+metrics.Gauge(
+    "crucial_ws_subscribers", "Connected WebSocket viewers per canvas", ("canvas_id",),
+    collect=lambda: {(cid,): len(subs) for cid, subs in list(canvas_subscribers.items()) if subs}
+)
+metrics.Gauge(
+    "crucial_log_queue_depth", "Log records waiting to be written",
+    collect=lambda: get_log_handler().queue.qsize()
+)
+metrics.Gauge(
+    "crucial_log_records_dropped", "Log records dropped because the queue was full",
+    collect=lambda: get_log_handler().dropped
+)
+metrics.Gauge(
+    "crucial_human_id_allocations", "Human ID allocator counters", ("counter",),
+    collect=lambda: {(k,): v for k, v in human_ids.stats().items()}
+)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# ---------------------------------------------------------------------
+# Admin: profiling, canvas listing and eviction
+# ---------------------------------------------------------------------
+@app.get("/admin/profile")
+async def profile_worker(request: Request, seconds: float = Query(10, gt=0), interval_ms: float = Query(5, gt=0)):
+    """
+    Sample this worker's stacks and return them in collapsed-stack format.
+    The sampler runs in a thread so the event loop keeps serving (and is
+    itself sampled) for the duration.
+    """
+    require_admin_key_header(request.headers)
+    seconds = min(seconds, CONFIG["PROFILING"]["max_seconds"])
+    try:
+        collapsed = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    filename = f"crucial-{os.getpid()}-{int(time.time())}.collapsed"
+    return PlainTextResponse(collapsed, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/admin/canvases")
+async def admin_list_canvases(
+    request: Request,
+    sort: str = Query("last_action_at"),
+    order: str = Query("desc"),
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Page through canvases with action count, byte size and last activity.
+    """
+    require_admin_key_header(request.headers)
+    try:
+        return list_canvas_stats(sort=sort, order=order, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/eviction")
+async def admin_eviction_report(request: Request):
+    """
+    Report of the most recent eviction sweep: what was removed and why.
+    """
+    require_admin_key_header(request.headers)
+    engine = get_engine()
+    return {
+        "policies": [p.name for p in engine.policies],
+        "batch_size": engine.batch_size,
+        "last_sweep": engine.last_report
+    }
+
+@app.get("/admin/loop-lag")
+async def loop_lag_events(request: Request):
+    require_admin_key_header(request.headers)
+    return {
+        "enabled": CONFIG["PROFILING"]["loop_lag_monitor"],
+        "threshold_ms": loop_monitor.threshold * 1000,
+        "events": list(loop_monitor.events)
+    }
+
 # ---------------------------------------------------------------------
 # Help 
 # ---------------------------------------------------------------------
@@ -320,9 +670,12 @@ async def help_action(action: str):
 # Python Module Autoloader
 # ---------------------------------------------------------------------
 @app.get("/python")
-async def serve_dynamic_python_loader(request: Request):
+async def serve_dynamic_python_loader(request: Request, mode: str = Query("sync")):
     host = str(request.base_url).rstrip("/")
-    return crucial_python_loader(base_url=host)
+    try:
+        return crucial_python_loader(base_url=host, mode=mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # ---------------------------------------------------------------------
 # Entrypoint
@@ -330,20 +683,6 @@ async def serve_dynamic_python_loader(request: Request):
 
 app.mount("/", StaticFiles(directory=FRONTEND_DIR, html=True), name="frontend")
 
-def start_periodic_cleanup():
-    interval = CONFIG["CANVAS"]["cleanup_interval"]
-    
-    def loop():
-        logger.info("Starting first canvas cleanup immediately")
-        cleanup_expired_canvases()  # ← immediate
-        while True:
-            time.sleep(interval)
-            cleanup_expired_canvases()
-    
-    t = threading.Thread(target=loop, daemon=True)
-    t.start()
-    logger.info("Started background canvas cleanup every %d seconds", interval)
-
 if __name__ == "__main__":
     import asyncio
     from uvicorn import Config, Server
@@ -351,7 +690,6 @@ if __name__ == "__main__":
     logger.info("Starting Crucial API server...")
     config = Config("crucial.server:app", host="0.0.0.0", port=8000, reload=True)
     server = Server(config)
-    start_periodic_cleanup()
 
     try:
         asyncio.run(server.serve())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: spatial.py
+# Description: Per-action bounding boxes in a SQLite R-tree for region queries
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Every stored action gets its axis-aligned canvas-space bounding box
+written to the action_bounds R-tree in the same transaction:
+
+    draw_*      union of its primitives' boxes under the current transform
+    graph_*     the full canvas (transformed)
+    rotate/scale/translate/set_background
+                EVERYWHERE, so region queries always return the state
+                needed to replay what they select
+
+The R-tree's first dimension is a 24-bit hash of the canvas ID, which
+keeps a region search on one canvas from walking every canvas's boxes.
+The exact canvas_id is an auxiliary column that filters out hash
+collisions. The transform current after the latest action is kept in
+canvas_stats.matrix, so storing an action never replays the log.
+"""
+
+import json
+import zlib
+import sqlite3
+from crucial.config import get_logger
+from crucial.scene import Scene, IDENTITY, bounds, transform_bounds, union
+
+logger = get_logger(__name__)
+
+EVERYWHERE = (-1e30, -1e30, 1e30, 1e30)
+TRANSFORMS = ("rotate", "scale", "translate")
+STATE_ACTIONS = TRANSFORMS + ("set_background",)
+
+RTREE_DDL = ("CREATE VIRTUAL TABLE IF NOT EXISTS action_bounds "
+             "USING rtree(id, min_c, max_c, min_x, max_x, min_y, max_y, +canvas_id)")
+
+_enabled = None
+
+
+def enabled(cursor) -> bool:
+    """
+    Whether the R-tree exists (SQLite may be built without the module).
+    """
+    global _enabled
+    if _enabled is None:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'action_bounds'")
+        _enabled = cursor.fetchone() is not None
+    return _enabled
+
+
+def canvas_key(canvas_id: str) -> int:
+    # 24 bits: exactly representable in the R-tree's 32-bit floats
+    return zlib.crc32(canvas_id.encode()) & 0xFFFFFF
+
+
+def action_box(action, params, width, height, matrix=IDENTITY):
+    """
+    Return (box, matrix_after) for an action drawn under `matrix`; box is
+    None for actions that draw nothing.
+    """
+    if action in TRANSFORMS:
+        scene = Scene(width, height)
+        scene.matrix = matrix
+        scene.compile(action, params)
+        return EVERYWHERE, scene.matrix
+    if action == "set_background":
+        return EVERYWHERE, matrix
+    if action.startswith("graph_"):
+        return transform_bounds((0, 0, width, height), matrix), matrix
+    scene = Scene(width, height)
+    scene.matrix = matrix
+    return union(bounds(p, matrix) for p in scene.compile(action, params)), matrix
+
+
+def _insert(cursor, canvas_id, action_id, box):
+    key = canvas_key(canvas_id)
+    cursor.execute(
+        "INSERT INTO action_bounds VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (action_id, key, key, box[0], box[2], box[1], box[3], canvas_id)
+    )
+
+
+def load_matrix(cursor, canvas_id):
+    cursor.execute("SELECT matrix FROM canvas_stats WHERE canvas_id = ?", (canvas_id,))
+    row = cursor.fetchone()
+    return tuple(json.loads(row[0])) if row and row[0] else IDENTITY
+
+
+def record_action_bounds(cursor, canvas_id, action_id, action, params, width, height):
+    """
+    Index one stored action. Call after record_action_stats, in the same
+    transaction.
+    """
+    if not enabled(cursor):
+        return
+    matrix = load_matrix(cursor, canvas_id) if action != "set_background" else IDENTITY
+    box, after = action_box(action, params, width, height, matrix)
+    if box is not None:
+        _insert(cursor, canvas_id, action_id, box)
+    if after != matrix:
+        cursor.execute("UPDATE canvas_stats SET matrix = ? WHERE canvas_id = ?", (json.dumps(after), canvas_id))
+
+
+def delete_action_bounds(cursor, canvas_ids):
+    """
+    Drop the boxes of every action of `canvas_ids`. Call before the
+    actions themselves are deleted.
+    """
+    if not enabled(cursor) or not canvas_ids:
+        return
+    marks = ",".join("?" * len(canvas_ids))
+    cursor.execute(
+        f"DELETE FROM action_bounds WHERE id IN (SELECT id FROM actions WHERE canvas_id IN ({marks}))",
+        list(canvas_ids)
+    )
+
+
+def backfill(cursor):
+    """
+    Index actions written before the R-tree existed.
+    """
+    cursor.execute("SELECT id, width, height FROM canvases")
+    indexed = 0
+    for canvas in cursor.fetchall():
+        matrix = IDENTITY
+        rows = cursor.execute(
+            "SELECT id, action, params FROM actions WHERE canvas_id = ? ORDER BY timestamp, id", (canvas[0],)
+        ).fetchall()
+        for action_id, action, params in rows:
+            try:
+                box, matrix = action_box(action, json.loads(params), canvas[1], canvas[2], matrix)
+            except ValueError:
+                continue
+            if box is not None:
+                _insert(cursor, canvas[0], action_id, box)
+                indexed += 1
+        if matrix != IDENTITY:
+            cursor.execute("UPDATE canvas_stats SET matrix = ? WHERE canvas_id = ?", (json.dumps(matrix), canvas[0]))
+    logger.info("Created action_bounds (indexed %d actions)", indexed)
+
+
+def create_index(cursor):
+    """
+    Create and backfill the R-tree; returns False if SQLite lacks rtree.
+    """
+    global _enabled
+    if _enabled is False:
+        return False
+    try:
+        cursor.execute(RTREE_DDL)
+    except sqlite3.OperationalError as e:
+        logger.warning("SQLite rtree unavailable, spatial queries disabled: %s", e)
+        _enabled = False
+        return False
+    _enabled = True
+    backfill(cursor)
+    return True
+
+
+# ---------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------
+REGION_WHERE = """
+    b.min_c <= :key AND b.max_c >= :key AND b.canvas_id = :canvas_id
+    AND b.max_x >= :x0 AND b.min_x <= :x1 AND b.max_y >= :y0 AND b.min_y <= :y1
+"""
+
+
+def _region_args(canvas_id, box):
+    return {"key": canvas_key(canvas_id), "canvas_id": canvas_id,
+            "x0": box[0], "y0": box[1], "x1": box[2], "y1": box[3]}
+
+
+def actions_in_region(cursor, canvas_id, box, include_state=False) -> list:
+    """
+    IDs of the actions whose boxes intersect `box`, in log order.
+    Transforms and background changes are left out unless `include_state`.
+    """
+    state = "" if include_state else f"AND a.action NOT IN ({','.join(repr(a) for a in STATE_ACTIONS)})"
+    cursor.execute(f"""
+        SELECT a.id FROM action_bounds b JOIN actions a ON a.id = b.id
+        WHERE {REGION_WHERE} {state}
+        ORDER BY a.timestamp, a.id
+    """, _region_args(canvas_id, box))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def iter_region(db_path, canvas_id, box, batch_size=500):
+    """
+    Yield (action, params_json, layout_json) for actions touching `box`,
+    plus the state actions needed to replay them, in log order. Batched
+    like db.iter_actions.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        args = _region_args(canvas_id, box)
+        last = ("", 0)
+        while True:
+            rows = conn.execute(f"""
+                SELECT a.id, a.timestamp, a.action, a.params, a.layout
+                FROM action_bounds b JOIN actions a ON a.id = b.id
+                WHERE {REGION_WHERE} AND (a.timestamp, a.id) > (:ts, :id)
+                ORDER BY a.timestamp, a.id LIMIT :limit
+            """, {**args, "ts": last[0], "id": last[1], "limit": batch_size}).fetchall()
+            for row in rows:
+                yield row[2], row[3], row[4]
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1][1], rows[-1][0])
+    finally:
+        conn.close()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_batch_drawing.py
+# Description: Draws hundreds of primitives through crucial.api.batch in a few round-trips
+# Author: Ms. White
+# Created: 2025-05-12
+
+import math
+import random
+import requests
+import crucial.api as api
+
+BASE_URL = "http://localhost:8000"
+
+def test_batch_drawing():
+    api.CONFIG["url"] = BASE_URL
+    canvas_id = api.create(name="Batch Draw Test", x=800, y=800, color="#000000")["canvas_id"]
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    with api.batch(canvas_id, max_size=100) as b:
+        for i in range(0, 360, 2):
+            api.draw_line(
+                start_x=400,
+                start_y=400,
+                end_x=int(400 + 350 * math.cos(math.radians(i))),
+                end_y=int(400 + 350 * math.sin(math.radians(i))),
+                color=f'#{random.randint(0, 0xFFFFFF):06x}',
+                width=1
+            )
+        for _ in range(120):
+            api.draw_point(
+                x=random.randint(0, 800),
+                y=random.randint(0, 800),
+                color="#ffffff",
+                radius=2
+            )
+        bad = api.draw_circle(canvas_id="does-not-exist", center_x=1, center_y=1, radius=1, color="#fff", fill="none")
+
+    assert len(b.results) == 301
+    assert all(r["status"] == "ok" for r in b.results[:300])
+    assert not bad.ok and bad.result["code"] == 404
+
+    print(f"[✓] {len(b.results)} batched actions flushed")
+    print(f"[→] View at: {BASE_URL}/canvas/{canvas_id}")
+
+def test_batch_bad_entries():
+    canvas_id = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Batch Errors", "x": 100, "y": 100}).json()["canvas_id"]
+    actions = [
+        {"action": "draw_point", "params": {"canvas_id": canvas_id, "x": 1, "y": 1, "color": "#ffffff"}},
+        {"action": "draw_point", "params": ["not", "an", "object"]},
+        {"action": "draw_point", "params": {"canvas_id": canvas_id, "x": 2, "y": 2, "color": "#ffffff"}}
+    ]
+    response = requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["ok", "error", "ok"]
+    assert results[1]["code"] == 400
+    print("[✓] Malformed batch entry reported in its own slot")
+
+if __name__ == "__main__":
+    test_batch_drawing()
+    test_batch_bad_entries()
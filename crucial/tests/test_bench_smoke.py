@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_bench_smoke.py
+# Description: Runs the offline micro-benchmarks once at minimal size so they keep working
+# Author: Ms. White
+# Created: 2025-05-12
+
+import sys
+import subprocess
+
+def test_micro_bench_smoke():
+    run = subprocess.run(
+        [sys.executable, "-m", "crucial.bench.micro", "--rounds", "1", "--min-time", "0", "--history-rows", "10"],
+        capture_output=True, text=True, timeout=300
+    )
+    assert run.returncode == 0, run.stderr[-2000:]
+    assert "server.get_canvas_history[10]" in run.stdout
+    print("[✓] Micro-benchmarks ran")
+
+if __name__ == "__main__":
+    test_micro_bench_smoke()
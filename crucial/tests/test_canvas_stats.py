@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_canvas_stats.py
+# Description: Checks canvas_stats counters via /object/{id} and /admin/canvases
+# Author: Ms. White
+# Created: 2025-05-12
+
+import json
+import requests
+from crucial.auth import load_keys  # same AUTH_ADMIN_KEYS_FILE as the server
+
+BASE_URL = "http://localhost:8000"
+
+def test_canvas_stats():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Stats Test"}).json()
+    canvas_id = canvas["canvas_id"]
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    line = {"canvas_id": canvas_id, "start_x": 0, "start_y": 0, "end_x": 100, "end_y": 100, "color": "#ff0000", "width": 2}
+    point = {"canvas_id": canvas_id, "x": 10, "y": 10, "color": "#ffffff", "radius": 3}
+    actions = [{"action": "draw_line", "params": dict(line)} for _ in range(3)]
+    actions.append({"action": "draw_point", "params": dict(point)})
+    requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions}).raise_for_status()
+
+    stats = requests.get(f"{BASE_URL}/object/{canvas['human_id']}").json()["stats"]
+    history = requests.get(f"{BASE_URL}/object/{canvas_id}/history").json()
+    assert stats["action_count"] == 4
+    assert stats["action_counts"] == {"draw_line": 3, "draw_point": 1}
+    assert stats["byte_size"] == sum(len(json.dumps(h["params"]).encode()) for h in history)
+    assert stats["last_action_at"] == history[-1]["timestamp"]
+    print(f"[✓] Stats: {stats}")
+
+    assert requests.get(f"{BASE_URL}/admin/canvases").status_code == 403
+    admin = {"x-api-key": next(iter(load_keys("admin_keys_file")), "")}
+    listing = requests.get(f"{BASE_URL}/admin/canvases", params={"sort": "last_action_at", "limit": 5},
+                           headers=admin).json()
+    assert listing["canvases"][0]["id"] == canvas_id
+    assert requests.get(f"{BASE_URL}/admin/canvases", params={"sort": "bogus"}, headers=admin).status_code == 400
+    print(f"[✓] Listed {len(listing['canvases'])} of {listing['total']} canvases")
+
+if __name__ == "__main__":
+    test_canvas_stats()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_canvas_thumbnail.py
+# Description: Checks placeholder-then-cached behaviour of background-rendered thumbnails
+# Author: Ms. White
+# Created: 2025-05-12
+
+import io
+import time
+import requests
+from PIL import Image
+
+BASE_URL = "http://localhost:8000"
+
+def wait_for(url, state, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = requests.get(url)
+        if response.headers.get("X-Thumbnail") == state:
+            return response
+        time.sleep(0.2)
+    raise AssertionError(f"thumbnail never became {state}")
+
+def test_canvas_thumbnail():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Thumbs", "x": 1024, "y": 512}).json()
+    canvas_id = canvas["canvas_id"]
+    url = f"{BASE_URL}/canvas/{canvas_id}/thumb.png"
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    rect = {"canvas_id": canvas_id, "x": 0, "y": 0, "width": 512, "height": 512,
+            "color": "#ff0000", "fill": "#ff0000"}
+    requests.post(f"{BASE_URL}/canvas", json={"action": "draw_rectangle", "params": rect}).raise_for_status()
+
+    first = requests.get(url)
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/png"
+    assert first.headers["X-Thumbnail"] in ("placeholder", "stale", "fresh")
+
+    image = Image.open(io.BytesIO(wait_for(url, "fresh").content)).convert("RGB")
+    assert image.size == (256, 128)
+    assert image.getpixel((32, 64)) == (255, 0, 0)
+    print("[✓] Thumbnail rendered in the background")
+
+    rect.update(x=512, color="#00ff00", fill="#00ff00")
+    requests.post(f"{BASE_URL}/canvas", json={"action": "draw_rectangle", "params": rect}).raise_for_status()
+    assert requests.get(url).headers["X-Thumbnail"] in ("stale", "fresh")
+    image = Image.open(io.BytesIO(wait_for(url, "fresh").content)).convert("RGB")
+    assert image.getpixel((192, 64)) == (0, 255, 0)
+    print("[✓] Thumbnail refreshed after new actions")
+
+    assert requests.get(f"{BASE_URL}/canvas/no-such-canvas/thumb.png").status_code == 404
+
+if __name__ == "__main__":
+    test_canvas_thumbnail()
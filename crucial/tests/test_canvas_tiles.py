@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_canvas_tiles.py
+# Description: Checks the raster tile pyramid and dirty-tile invalidation
+# Author: Ms. White
+# Created: 2025-05-12
+
+import re
+import requests
+from io import BytesIO
+from PIL import Image
+
+BASE_URL = "http://localhost:8000"
+
+def tile_hits():
+    text = requests.get(f"{BASE_URL}/metrics").text
+    match = re.search(r'crucial_cache_requests_total\{cache="tiles",result="hit"\} (\S+)', text)
+    return float(match.group(1)) if match else 0.0
+
+def test_canvas_tiles():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Tiles", "x": 2000, "y": 1000}).json()
+    canvas_id = canvas["canvas_id"]
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    line = {"canvas_id": canvas_id, "start_x": 0, "start_y": 0, "end_x": 200, "end_y": 200, "color": "#ff0000", "width": 4}
+    requests.post(f"{BASE_URL}/canvas", json={"action": "draw_line", "params": line}).raise_for_status()
+
+    pyramid = requests.get(f"{BASE_URL}/canvas/{canvas_id}/tiles").json()
+    top = pyramid["max_zoom"]
+    assert top == 3 and pyramid["levels"][top] == {"z": 3, "columns": 8, "rows": 4}
+
+    tile = requests.get(f"{BASE_URL}/canvas/{canvas_id}/tiles/{top}/0/0.png")
+    assert tile.status_code == 200 and tile.headers["content-type"] == "image/png"
+    image = Image.open(BytesIO(tile.content))
+    assert image.size == (256, 256)
+    assert image.getpixel((100, 100))[:3] == (255, 0, 0)
+    print("[✓] Tile rendered")
+
+    # A line far from tile 0/0 must not invalidate it
+    far = dict(line, start_x=1800, start_y=900, end_x=1900, end_y=950)
+    requests.post(f"{BASE_URL}/canvas", json={"action": "draw_line", "params": far}).raise_for_status()
+    hits = tile_hits()
+    again = requests.get(f"{BASE_URL}/canvas/{canvas_id}/tiles/{top}/0/0.png")
+    assert again.content == tile.content
+    assert tile_hits() == hits + 1
+    print("[✓] Untouched tile served from cache")
+
+    assert requests.get(f"{BASE_URL}/canvas/{canvas_id}/tiles/{top}/8/0.png").status_code == 404
+
+def test_extreme_transform_tiles():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Zoomed", "x": 800, "y": 600}).json()
+    canvas_id = canvas["canvas_id"]
+    zoom = {"action": "scale", "params": {"canvas_id": canvas_id, "scale_x": 500, "scale_y": 500}}
+    shapes = [
+        {"action": "draw_circle", "params": {"canvas_id": canvas_id, "center_x": 1, "center_y": 1, "radius": 3,
+                                             "color": "#ff0000", "fill": "#00ff00"}},
+        {"action": "draw_polygon", "params": {"canvas_id": canvas_id, "points": [[-1, -1], [2, 0], [1, 2]],
+                                              "color": "#00ffff"}},
+        {"action": "draw_text", "params": {"canvas_id": canvas_id, "x": 0.0001, "y": 0.0001, "text": "Huge",
+                                           "size": 30, "font": "Courier New", "color": "#ffffff"}}
+    ]
+    requests.post(f"{BASE_URL}/canvas/batch", json={"actions": [zoom, zoom] + shapes}).raise_for_status()
+
+    # Bounded by the tile size, not by the 250000x transform
+    tile = requests.get(f"{BASE_URL}/canvas/{canvas_id}/tiles/2/0/0.png", timeout=30)
+    assert tile.status_code == 200
+    assert requests.get(f"{BASE_URL}/canvas/{canvas_id}/thumb.png", timeout=30).status_code == 200
+    print("[✓] Extreme transform rendered")
+
+def test_extreme_rotated_text_tiles():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Tilted", "x": 800, "y": 600}).json()
+    canvas_id = canvas["canvas_id"]
+    # The gauge title lands tens of thousands of pixels away, in glyphs larger than the canvas
+    actions = [
+        {"action": "scale", "params": {"canvas_id": canvas_id, "scale_x": 60, "scale_y": 60}},
+        {"action": "rotate", "params": {"canvas_id": canvas_id, "angle_in_degrees": 33}},
+        {"action": "graph_gauge", "params": {"canvas_id": canvas_id, "value": 42, "color": "#ff8800",
+                                             "title": "Quarterly throughput of the ingest pipeline"}}
+    ]
+    requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions}).raise_for_status()
+
+    for path in ("tiles/0/0/0.png", "tiles/2/1/1.png", "thumb.png"):
+        assert requests.get(f"{BASE_URL}/canvas/{canvas_id}/{path}", timeout=30).status_code == 200
+    print("[✓] Extreme rotated text rendered")
+
+if __name__ == "__main__":
+    test_canvas_tiles()
+    test_extreme_transform_tiles()
+    test_extreme_rotated_text_tiles()
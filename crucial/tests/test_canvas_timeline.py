@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_canvas_timeline.py
+# Description: Checks animated GIF/APNG replay export of a canvas's action log
+# Author: Ms. White
+# Created: 2025-05-12
+
+import io
+import requests
+from PIL import Image, ImageSequence
+
+BASE_URL = "http://localhost:8000"
+
+def test_canvas_timeline():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Timeline", "x": 300, "y": 200}).json()
+    canvas_id = canvas["canvas_id"]
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    colors = ["#ff0000", "#00ff00", "#0000ff", "#ffff00"]
+    actions = [{"action": "draw_rectangle", "params": {"canvas_id": canvas_id, "x": i * 75, "y": 0, "width": 75,
+                                                       "height": 200, "color": c, "fill": c}}
+               for i, c in enumerate(colors)]
+    requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions}).raise_for_status()
+
+    response = requests.get(f"{BASE_URL}/canvas/{canvas_id}/timeline.gif", params={"frames": 4, "delay": 50})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/gif"
+    gif = Image.open(io.BytesIO(response.content))
+    frames = [frame.convert("RGB") for frame in ImageSequence.Iterator(gif)]
+    assert len(frames) == 5  # blank canvas plus one per rectangle
+    assert frames[1].getpixel((10, 100)) == (255, 0, 0) and frames[1].getpixel((100, 100)) == (0, 0, 0)
+    assert frames[-1].getpixel((260, 100)) == (255, 255, 0)
+    print(f"[✓] GIF timeline: {len(frames)} frames")
+
+    response = requests.get(f"{BASE_URL}/canvas/{canvas_id}/timeline.png", params={"frames": 2})
+    assert response.status_code == 200
+    apng = Image.open(io.BytesIO(response.content))
+    assert apng.is_animated and apng.n_frames == 3
+    print("[✓] APNG timeline")
+
+    assert requests.get(f"{BASE_URL}/canvas/{canvas_id}/timeline.mp4").status_code == 404
+
+def test_extreme_transform_timeline():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Tilted", "x": 800, "y": 600}).json()
+    canvas_id = canvas["canvas_id"]
+    # Far-off title in glyphs larger than the canvas; rendered at full scale in a worker
+    actions = [
+        {"action": "scale", "params": {"canvas_id": canvas_id, "scale_x": 60, "scale_y": 60}},
+        {"action": "rotate", "params": {"canvas_id": canvas_id, "angle_in_degrees": 33}},
+        {"action": "graph_gauge", "params": {"canvas_id": canvas_id, "value": 42, "color": "#ff8800",
+                                             "title": "Quarterly throughput of the ingest pipeline"}}
+    ]
+    requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions}).raise_for_status()
+
+    response = requests.get(f"{BASE_URL}/canvas/{canvas_id}/timeline.png", params={"frames": 3}, timeout=60)
+    assert response.status_code == 200 and response.headers["content-type"] == "image/png"
+    timelines = requests.get(f"{BASE_URL}/health").json()["services"]["timelines"]
+    assert timelines["ok"] and timelines["failed"] == 0
+    print("[✓] Extreme transform timeline rendered")
+
+if __name__ == "__main__":
+    test_canvas_timeline()
+    test_extreme_transform_timeline()
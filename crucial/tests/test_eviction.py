@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_eviction.py
+# Description: Boots servers with eviction policies enabled and checks what each sweep removes
+# Author: Ms. White
+# Created: 2025-05-12
+
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+import requests
+from contextlib import contextmanager
+
+ADMIN_KEY = "eviction-admin"
+
+@contextmanager
+def boot(**env):
+    """
+    Run a server on a free port against a throwaway database, sweeping every second.
+    """
+    with tempfile.TemporaryDirectory() as tmp, socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        keys = os.path.join(tmp, "admin_keys.json")
+        with open(keys, "w") as f:
+            json.dump([ADMIN_KEY], f)
+        settings = {k: v for k, v in os.environ.items() if not k.startswith(("EVICT_", "CANVAS_TTL"))}
+        settings.update({
+            "CRUCIAL_DB_PATH": os.path.join(tmp, "crucial.db"),
+            "CRUCIAL_LOG_PATH": os.path.join(tmp, "logs", "crucial.log"),
+            "CRUCIAL_TILE_CACHE_DIR": os.path.join(tmp, "tiles"),
+            "CRUCIAL_THUMB_CACHE_DIR": os.path.join(tmp, "thumbs"),
+            "CRUCIAL_SAVE_IMAGES_PATH": os.path.join(tmp, "images"),
+            "AUTH_ADMIN_KEYS_FILE": keys,
+            "AUTH_REQUIRE_API_KEY": "false",
+            "CLEANUP_INTERVAL_SECONDS": "1",
+            **env
+        })
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "crucial.server:app", "--port", str(port), "--log-level", "warning"],
+            env=settings, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            for _ in range(100):
+                try:
+                    requests.get(f"{base_url}/health", timeout=1)
+                    break
+                except requests.ConnectionError:
+                    time.sleep(0.1)
+            yield base_url
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+def create(base_url, name, key=None):
+    headers = {"x-api-key": key} if key else {}
+    response = requests.post(f"{base_url}/canvas/create", json={"name": name, "x": 64, "y": 48}, headers=headers)
+    response.raise_for_status()
+    return response.json()["canvas_id"]
+
+def draw(base_url, canvas_id, text="."):
+    params = {"canvas_id": canvas_id, "x": 1, "y": 1, "text": text, "color": "#ffffff"}
+    requests.post(f"{base_url}/canvas", json={"action": "draw_text", "params": params}).raise_for_status()
+
+def exists(base_url, canvas_id):
+    return requests.get(f"{base_url}/object/{canvas_id}").status_code == 200
+
+def report(base_url):
+    response = requests.get(f"{base_url}/admin/eviction", headers={"x-api-key": ADMIN_KEY})
+    response.raise_for_status()
+    return response.json()
+
+def wait_for_eviction(base_url, canvas_id, keep_alive=(), timeout=15):
+    """
+    Poll sweep reports until one evicts `canvas_id`, drawing on `keep_alive` meanwhile.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for alive in keep_alive:
+            draw(base_url, alive)
+        sweep = report(base_url)["last_sweep"] or {"evicted": []}
+        for entry in sweep["evicted"]:
+            if entry["canvas_id"] == canvas_id:
+                return sweep, entry
+        time.sleep(0.1)
+    raise AssertionError(f"canvas {canvas_id} was not evicted")
+
+def test_idle_eviction():
+    with boot(EVICT_IDLE_SECONDS="2") as base_url:
+        assert report(base_url)["policies"] == ["ttl", "idle"]
+        idle, active = create(base_url, "Idle"), create(base_url, "Active")
+        sweep, entry = wait_for_eviction(base_url, idle, keep_alive=[active])
+        assert entry["policy"] == "idle" and entry["reason"].startswith("idle since")
+        assert sweep["by_policy"] == {"idle": 1}
+        assert not exists(base_url, idle) and exists(base_url, active)
+    print("[✓] Idle canvas evicted, active canvas kept")
+
+def test_key_quota_eviction():
+    with boot(EVICT_KEY_MAX_CANVASES="2") as base_url:
+        assert report(base_url)["policies"] == ["ttl", "quota"]
+        oldest = create(base_url, "Heavy 1", key="heavy-key")
+        light = [create(base_url, f"Light {i}", key="light-key") for i in range(2)]
+        time.sleep(1.1)  # activity is stored per second
+        newer = [create(base_url, f"Heavy {i}", key="heavy-key") for i in (2, 3)]
+        sweep, entry = wait_for_eviction(base_url, oldest)
+        assert entry["policy"] == "quota" and "over quota (canvas #3" in entry["reason"]
+        assert all(exists(base_url, canvas_id) for canvas_id in newer + light)
+    print("[✓] Over-quota key lost its least recently active canvas")
+
+def test_byte_budget_eviction():
+    with boot(EVICT_BYTE_BUDGET="2000", EVICT_BUDGET_STRATEGY="largest") as base_url:
+        assert report(base_url)["policies"] == ["ttl", "budget"]
+        small = [create(base_url, f"Small {i}") for i in range(2)]
+        for canvas_id in small:
+            draw(base_url, canvas_id, "small")
+        large = create(base_url, "Large")
+        draw(base_url, large, "x" * 3000)
+        sweep, entry = wait_for_eviction(base_url, large)
+        assert entry["policy"] == "budget" and entry["bytes"] > 3000
+        assert entry["reason"].endswith("over budget 2000 B (largest)")
+        assert sweep["evicted_count"] == 1
+        assert all(exists(base_url, canvas_id) for canvas_id in small)
+    print("[✓] Byte budget evicted the largest canvas only")
+
+def test_default_evicts_by_ttl_only():
+    with boot(CANVAS_TTL_SECONDS="2") as base_url:
+        assert report(base_url)["policies"] == ["ttl"]
+        expiring = create(base_url, "Expiring", key="heavy-key")
+        draw(base_url, expiring, "x" * 3000)
+        sweep, entry = wait_for_eviction(base_url, expiring, timeout=20)
+        assert entry["policy"] == "ttl" and entry["reason"].endswith("ttl 2s")
+        assert set(sweep["by_policy"]) == {"ttl"}
+    print("[✓] Default config evicts by TTL only")
+
+if __name__ == "__main__":
+    test_idle_eviction()
+    test_key_quota_eviction()
+    test_byte_budget_eviction()
+    test_default_evicts_by_ttl_only()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_export_svg.py
+# Description: Checks the streamed SVG export of a canvas's action log
+# Author: Ms. White
+# Created: 2025-05-12
+
+import requests
+import xml.etree.ElementTree as ET
+
+BASE_URL = "http://localhost:8000"
+SVG = "{http://www.w3.org/2000/svg}"
+
+def test_export_svg():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "SVG Export", "x": 400, "y": 300}).json()
+    canvas_id = canvas["canvas_id"]
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    actions = [
+        {"action": "draw_line", "params": {"canvas_id": canvas_id, "start_x": 0, "start_y": 0,
+                                           "end_x": 100, "end_y": 100, "color": "#ff0000", "width": 2}},
+        {"action": "draw_text", "params": {"canvas_id": canvas_id, "text": "a < b & c", "x": 10, "y": 20,
+                                           "font": "Arial", "size": 14, "color": "#ffffff"}},
+        {"action": "draw_turtle", "params": {"canvas_id": canvas_id, "start_x": 200, "start_y": 200,
+                                             "commands": ["forward 50", "left 90", "forward 50", "penup",
+                                                          "forward 10", "pendown", "setcolor #ff00ff", "forward 5"]}},
+        {"action": "translate", "params": {"canvas_id": canvas_id, "dx": 50, "dy": 25}},
+        {"action": "draw_circle", "params": {"canvas_id": canvas_id, "center_x": 0, "center_y": 0,
+                                             "radius": 20, "color": "#00ff00", "fill": "none"}},
+        {"action": "graph_pie", "params": {"canvas_id": canvas_id, "labels": ["a", "b"],
+                                           "values": [1, 3], "color": "#3498db"}}
+    ]
+    requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions}).raise_for_status()
+
+    response = requests.get(f"{BASE_URL}/canvas/{canvas['human_id']}/export.svg")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("image/svg+xml")
+    root = ET.fromstring(response.content)
+    assert root.get("width") == "400" and root.get("height") == "300"
+    assert root.find(f"{SVG}text").text == "a < b & c"
+    turtle = root.findall(f"{SVG}polyline")
+    assert [p.get("points") for p in turtle] == ["200 200 250 200 250 150", "250 140 250 135"]
+    assert turtle[1].get("stroke") == "#ff00ff"
+
+    group = root.find(f"{SVG}g")
+    assert group.get("transform") == "matrix(1 0 0 1 50 25)"
+    assert group.find(f"{SVG}circle").get("r") == "20"
+    assert len(group.findall(f"{SVG}path")) == 2  # one per pie slice
+    print(f"[✓] Exported {len(response.content)} bytes of SVG")
+
+    assert requests.get(f"{BASE_URL}/canvas/no-such-canvas/export.svg").status_code == 404
+
+if __name__ == "__main__":
+    test_export_svg()
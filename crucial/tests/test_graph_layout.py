@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_graph_layout.py
+# Description: Checks that graph actions are stored and served with their resolved layout
+# Author: Ms. White
+# Created: 2025-05-12
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+def test_graph_layout():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Layout", "x": 600, "y": 400}).json()
+    canvas_id = canvas["canvas_id"]
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    actions = [
+        {"action": "graph_histogram", "params": {"canvas_id": canvas_id, "values": [1, 2, 2, 3, 3, 3, 10],
+                                                 "bins": 3, "color": "#3498db"}},
+        {"action": "graph_wordcloud", "params": {"canvas_id": canvas_id, "word_texts": ["alpha", "beta", "gamma"],
+                                                 "word_values": [5, 20, 10], "color": "#e67e22"}},
+        {"action": "draw_line", "params": {"canvas_id": canvas_id, "start_x": 0, "start_y": 0,
+                                           "end_x": 10, "end_y": 10, "color": "#ffffff", "width": 1}}
+    ]
+    requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions}).raise_for_status()
+
+    history = requests.get(f"{BASE_URL}/object/{canvas_id}/history").json()
+    histogram, wordcloud, line = history[-3:]
+    assert histogram["layout"]["counts"] == [6, 0, 1]
+    print("[✓] Histogram counts stored with the action")
+
+    placed = wordcloud["layout"]["words"]
+    assert [word[0] for word in placed] == [1, 2, 0]  # largest first
+    assert all(40 < x < 560 and 40 < y < 360 for _, x, y, _ in placed)
+    print(f"[✓] Wordcloud placement stored: {len(placed)} words")
+
+    assert line["layout"] is None
+
+if __name__ == "__main__":
+    test_graph_layout()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_graph_reduction.py
+# Description: Checks ingest-time reduction of large graph datasets and the raw data side storage
+# Author: Ms. White
+# Created: 2025-05-12
+
+import math
+import jsonschema
+import requests
+
+from crucial.registry import get_action_to_schema
+
+BASE_URL = "http://localhost:8000"
+
+def test_graph_reduction():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Reduction", "x": 600, "y": 400}).json()
+    canvas_id = canvas["canvas_id"]
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    n = 10000
+    xs = [i / 10 for i in range(n)]
+    ys = [math.sin(i / 50) * 100 + (i % 7) for i in range(n)]
+    actions = [
+        {"action": "graph_line", "params": {"canvas_id": canvas_id, "x_values": xs, "y_values": ys,
+                                            "color": "#00ffcc", "keep_raw": True}},
+        {"action": "graph_histogram", "params": {"canvas_id": canvas_id, "values": ys, "bins": 8, "color": "#3498db"}},
+        {"action": "graph_scatter", "params": {"canvas_id": canvas_id, "x_values": xs, "y_values": ys,
+                                               "color": "#ff00cc", "reduce": "none"}}
+    ]
+    results = requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions}).json()["results"]
+    line, histogram, scatter = (entry["result"] for entry in results)
+
+    report = line["reduction"]
+    assert report["method"] == "minmax" and report["points_in"] == n
+    assert report["points_out"] < n and report["ratio"] > 1
+    print(f"[✓] Line decimated {report['points_in']} → {report['points_out']} (x{report['ratio']})")
+    assert histogram["reduction"]["points_out"] == 8
+    assert "reduction" not in scatter
+
+    history = requests.get(f"{BASE_URL}/object/{canvas_id}/history").json()
+    stored_line, stored_histogram, stored_scatter = (entry["params"] for entry in history[-3:])
+    assert len(stored_line["x_values"]) == report["points_out"]
+    assert min(stored_line["y_values"]) == min(ys) and max(stored_line["y_values"]) == max(ys)
+    assert "values" not in stored_histogram and sum(stored_histogram["counts"]) == n
+    assert len(history[-2]["layout"]["counts"]) == 8
+    assert len(stored_scatter["x_values"]) == n
+    print("[✓] Reduced data stored, extremes kept")
+
+    # The stored form is itself a valid action and draws the same bars
+    stored_params = dict(stored_histogram, canvas_id=canvas_id)
+    schema = get_action_to_schema()["graph_histogram"]["parameters"]
+    jsonschema.validate(stored_params, schema)
+    missing_data = {k: v for k, v in stored_params.items() if k != "counts"}
+    assert not jsonschema.Draft7Validator(schema).is_valid(missing_data)
+    replay = requests.post(f"{BASE_URL}/canvas", json={"action": "graph_histogram", "params": stored_params})
+    assert replay.status_code == 200, replay.text
+    replayed = requests.get(f"{BASE_URL}/object/{canvas_id}/history").json()[-1]
+    assert replayed["params"]["counts"] == stored_histogram["counts"]
+    assert replayed["layout"] == history[-2]["layout"]
+    print("[✓] Stored histogram accepted as input")
+
+    raw = requests.get(f"{BASE_URL}/object/{canvas_id}/actions/{report['raw_action_id']}/raw")
+    assert raw.status_code == 200
+    assert raw.json()["y_values"] == ys
+    print("[✓] Raw data served from side storage")
+
+    missing = requests.get(f"{BASE_URL}/object/{canvas_id}/actions/{report['raw_action_id'] + 1}/raw")
+    assert missing.status_code == 404
+
+if __name__ == "__main__":
+    test_graph_reduction()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_human_ids.py
+# Description: Checks human ID allocation, the word index and bulk canvas creation
+# Author: Ms. White
+# Created: 2025-05-12
+
+import os
+import re
+import tempfile
+import requests
+from pathlib import Path
+
+from crucial.eviction import owner_fingerprint
+from crucial.utils.human_id import WordIndex, HumanIdAllocator, HumanIdExhausted, generate_human_id
+
+API_KEY = "demo-key"
+BASE_URL = "http://localhost:8000"
+HEADERS = {"x-api-key": API_KEY}
+
+def test_allocator_retry_and_exhaustion():
+    allocator = HumanIdAllocator(max_attempts=4)
+    calls = []
+    claimed = allocator.allocate(lambda human_id: calls.append(human_id) or len(calls) == 3)
+    assert claimed == calls[-1] and len(calls) == 3
+    assert allocator.stats() == {"allocated": 1, "attempts": 3, "collisions": 2, "exhausted": 0,
+                                 "collision_rate": 2 / 3}
+    print("[✓] Allocator retried past collisions")
+
+    try:
+        allocator.allocate(lambda human_id: False)
+        assert False, "allocate should give up"
+    except HumanIdExhausted:
+        pass
+    stats = allocator.stats()
+    assert stats["exhausted"] == 1 and stats["attempts"] == 7 and stats["collisions"] == 6
+    print("[✓] Allocator gave up after max_attempts")
+
+def test_reserve_collisions_and_seeds():
+    allocator = HumanIdAllocator(max_attempts=4, deterministic=True)
+    seeds = ["canvas-a", "canvas-b", "canvas-c"]
+    first = [generate_human_id(seed, deterministic=True) for seed in seeds]
+    # The second seed's first choice is taken, so only it moves to attempt 1
+    ids = allocator.reserve(3, lambda candidates: {first[1]} & set(candidates), seeds=seeds)
+    assert ids == [first[0], generate_human_id(seeds[1], deterministic=True, attempt=1), first[2]]
+    assert allocator.stats()["collisions"] == 1 and allocator.stats()["attempts"] == 4
+    print("[✓] Reserved IDs follow their seeds")
+
+    try:
+        allocator.reserve(2, lambda candidates: set(candidates), seeds=seeds[:2])
+        assert False, "reserve should give up"
+    except HumanIdExhausted:
+        pass
+    assert allocator.stats()["exhausted"] == 1
+    print("[✓] Reserve gave up after max_attempts")
+
+def test_word_index_rebuild():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "words.txt"
+        source.write_text("alpha\nbeta\n")
+        index = WordIndex(source)
+        assert len(index) == 2 and index[1] == "beta"
+        assert index.path.exists()
+
+        # A new mtime and size invalidate the compiled index
+        source.write_text("gamma\ndelta\nepsilon\n")
+        stat = source.stat()
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        index = WordIndex(source)
+        assert len(index) == 3 and [index[i] for i in range(3)] == ["gamma", "delta", "epsilon"]
+        assert index[-1] == "epsilon"
+    print("[✓] Word index rebuilt after the source changed")
+
+def test_bulk_create():
+    specs = [{"name": f"Bulk {i}", "x": 64, "y": 48} for i in range(5)]
+    response = requests.post(f"{BASE_URL}/canvas/create/bulk", json={"canvases": specs}, headers=HEADERS)
+    assert response.status_code == 200, response.text
+    created = response.json()["canvases"]
+    assert [c["metadata"]["name"] for c in created] == [s["name"] for s in specs]
+    assert len({c["human_id"] for c in created}) == 5
+
+    meta = requests.get(f"{BASE_URL}/object/{created[0]['canvas_id']}").json()
+    assert meta["human_id"] == created[0]["human_id"] and meta["width"] == 64
+    assert meta["owner"] == owner_fingerprint(API_KEY)
+    print("[✓] Bulk created canvases")
+
+    assert requests.post(f"{BASE_URL}/canvas/create/bulk", json={"canvases": []}).status_code == 400
+    assert requests.post(f"{BASE_URL}/canvas/create/bulk", json={"canvases": "x"}).status_code == 400
+
+def test_collision_gauge():
+    text = requests.get(f"{BASE_URL}/metrics").text
+    match = re.search(r'crucial_human_id_allocations\{counter="collision_rate"\} (\S+)', text)
+    assert match and 0.0 <= float(match.group(1)) <= 1.0
+    allocated = re.search(r'crucial_human_id_allocations\{counter="allocated"\} (\S+)', text)
+    assert allocated and float(allocated.group(1)) >= 5
+    print("[✓] Collision-rate gauge exported")
+
+if __name__ == "__main__":
+    test_allocator_retry_and_exhaustion()
+    test_reserve_collisions_and_seeds()
+    test_word_index_rebuild()
+    test_bulk_create()
+    test_collision_gauge()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: test_region_history.py
+# Description: Checks region-limited history queries backed by the action_bounds R-tree
+# Author: Ms. White
+# Created: 2025-05-12
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+def test_region_history():
+    canvas = requests.post(f"{BASE_URL}/canvas/create", json={"name": "Regions", "x": 1000, "y": 1000}).json()
+    canvas_id = canvas["canvas_id"]
+    print(f"[✓] Canvas created: {canvas_id}")
+
+    actions = [
+        {"action": "draw_line", "params": {"canvas_id": canvas_id, "start_x": 0, "start_y": 0,
+                                           "end_x": 100, "end_y": 100, "color": "#ff0000", "width": 2}},
+        {"action": "translate", "params": {"canvas_id": canvas_id, "dx": 500, "dy": 500}},
+        {"action": "draw_circle", "params": {"canvas_id": canvas_id, "center_x": 100, "center_y": 100,
+                                             "radius": 50, "color": "#00ff00", "fill": "none"}}
+    ]
+    requests.post(f"{BASE_URL}/canvas/batch", json={"actions": actions}).raise_for_status()
+
+    def region(box):
+        response = requests.get(f"{BASE_URL}/object/{canvas_id}/history", params={"region": box})
+        assert response.status_code == 200
+        return [entry["action"] for entry in response.json()]
+
+    # The circle is drawn at (600, 600) once the translate applies
+    assert region("590,590,610,610") == ["translate", "draw_circle"]
+    assert region("0,0,10,10") == ["draw_line", "translate"]
+    assert region("300,300,400,400") == ["translate"]
+    print("[✓] Region queries select only the actions touching them")
+
+    assert len(requests.get(f"{BASE_URL}/object/{canvas_id}/history").json()) == 3
+    assert requests.get(f"{BASE_URL}/object/{canvas_id}/history", params={"region": "1,2"}).status_code == 400
+
+if __name__ == "__main__":
+    test_region_history()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: thumbs.py
+# Description: Gallery thumbnails rendered by a background process pool into a content-addressed cache
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Thumbnails are never rendered on the request path. A Thumbnailer owns a
+bounded process pool and a priority queue of canvas IDs:
+
+    - GET /canvas/{id}/thumb.png answers at once with the cached image
+      (possibly a version behind) or a placeholder, and queues the canvas
+      ahead of background work, most recently viewed first
+    - a periodic sweep queues every canvas whose action log has moved past
+      its thumbnail, most recently active first
+
+Images are stored by the SHA-256 of their PNG bytes under
+THUMBS cache_dir/<2 hex>/<digest>.png, so identical previews (every blank
+800x600 canvas) share a file. The thumbnails table maps each canvas to
+its digest and the log position it shows; a file is deleted once no
+canvas references it.
+"""
+
+import io
+import os
+import time
+import heapq
+import hashlib
+import itertools
+import threading
+from datetime import datetime
+from functools import lru_cache
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+from crucial import metrics
+from crucial.config import CONFIG, get_logger
+from crucial.db import DB_PATH, get_db_connection, connect_readonly, iter_actions
+from crucial.raster import render_log, rgba
+
+logger = get_logger(__name__)
+
+THUMB_RENDER_SECONDS = metrics.Histogram(
+    "crucial_thumbnail_render_seconds", "Worker time to render and store one thumbnail")
+THUMBNAILS = metrics.Counter(
+    "crucial_thumbnails_total", "Thumbnail renders by result", ("result",))
+THUMB_QUEUE = metrics.Gauge(
+    "crucial_thumbnail_queue_depth", "Canvases waiting for a thumbnail render")
+
+# Priority tiers; lower runs first
+VIEWED, STALE = 0, 1
+
+
+def thumbnail_path(root, digest) -> str:
+    return os.path.join(root, digest[:2], f"{digest}.png")
+
+
+def thumbnail_size(width, height, size):
+    scale = min(1.0, size / max(width or 1, height or 1))
+    return scale, max(1, round((width or 1) * scale)), max(1, round((height or 1) * scale))
+
+
+@lru_cache(maxsize=64)
+def placeholder(width, height, background, size) -> bytes:
+    """
+    Flat background-coloured PNG at the thumbnail's size.
+    """
+    _, w, h = thumbnail_size(width, height, size)
+    buf = io.BytesIO()
+    Image.new("RGB", (w, h), (rgba(background or "#000000") or (0, 0, 0))[:3]).save(buf, "PNG")
+    return buf.getvalue()
+
+
+# ---------------------------------------------------------------------
+# Worker processes
+# ---------------------------------------------------------------------
+_worker_conn = None
+
+
+def _init_worker(db_path):
+    global _worker_conn
+    _worker_conn = connect_readonly(db_path)
+
+
+def render_thumbnail(canvas_id, root, size, supersample=2):
+    """
+    Pool entry point: render a canvas's thumbnail and store it, returning
+    what to record, or None if the canvas is gone. The log position is
+    read before replaying, so a thumbnail never claims actions it may
+    have missed.
+    """
+    started = time.perf_counter()
+    conn = _worker_conn
+    canvas = conn.execute("SELECT width, height, background FROM canvases WHERE id = ?", (canvas_id,)).fetchone()
+    if canvas is None:
+        return None
+    stats = conn.execute(
+        "SELECT action_count, last_action_id FROM canvas_stats WHERE canvas_id = ?", (canvas_id,)
+    ).fetchone() or (0, None)
+    width, height, background = canvas
+    scale, _, _ = thumbnail_size(width, height, size)
+    image = render_log(width, height, background, iter_actions(canvas_id, conn=conn), scale, supersample)
+
+    buf = io.BytesIO()
+    image.save(buf, "PNG", optimize=True)
+    data = buf.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    path = thumbnail_path(root, digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return {"canvas_id": canvas_id, "digest": digest, "action_count": stats[0],
+            "last_action_id": stats[1], "seconds": time.perf_counter() - started}
+
+
+# ---------------------------------------------------------------------
+# Cache bookkeeping (main process)
+# ---------------------------------------------------------------------
+def collect(conn, digests, root=None):
+    """
+    Delete the files of `digests` no canvas references any more.
+    """
+    root = root or CONFIG["THUMBS"]["cache_dir"]
+    for digest in set(digests):
+        if conn.execute("SELECT 1 FROM thumbnails WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+            try:
+                os.remove(thumbnail_path(root, digest))
+            except FileNotFoundError:
+                pass
+
+
+def delete_thumbnails(cursor, canvas_ids) -> list:
+    """
+    Drop the thumbnail rows of `canvas_ids`, returning their digests for
+    collect() once the transaction commits.
+    """
+    marks = ",".join("?" * len(canvas_ids))
+    cursor.execute(f"SELECT digest FROM thumbnails WHERE canvas_id IN ({marks})", list(canvas_ids))
+    digests = [row[0] for row in cursor.fetchall()]
+    cursor.execute(f"DELETE FROM thumbnails WHERE canvas_id IN ({marks})", list(canvas_ids))
+    return digests
+
+
+class Thumbnailer:
+    def __init__(self, root, size=256, workers=2, interval=30, queue_size=10000, supersample=2):
+        self.root = root
+        self.size = size
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.queue_size = queue_size
+        self.supersample = supersample
+        self.rendered = 0
+        self.failed = 0
+        self.last_sweep = None
+        self._heap = []
+        self._queued = {}  # canvas_id -> live priority; stale heap entries are skipped
+        self._in_flight = set()
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._pool = None
+        self._thread = None
+
+    # -----------------------------------------------------------------
+    # Queue
+    # -----------------------------------------------------------------
+    def _push(self, canvas_id, priority):
+        with self._cond:
+            if canvas_id in self._in_flight:
+                return
+            current = self._queued.get(canvas_id)
+            if current is not None and current <= priority:
+                return
+            if current is None and priority[0] == STALE and len(self._queued) >= self.queue_size:
+                return  # the next sweep finds it again
+            self._queued[canvas_id] = priority
+            heapq.heappush(self._heap, (priority, canvas_id))
+            THUMB_QUEUE.set(len(self._queued))
+            self._cond.notify()
+
+    def request(self, canvas_id):
+        """
+        Queue a canvas someone is looking at ahead of background work.
+        """
+        self._push(canvas_id, (VIEWED, -time.time()))
+
+    def _take(self) -> list:
+        """
+        Pop as many canvases as there are idle workers. Called with the
+        condition held.
+        """
+        jobs = []
+        while self._heap and len(self._in_flight) < self.workers:
+            priority, canvas_id = heapq.heappop(self._heap)
+            if self._queued.get(canvas_id) != priority:
+                continue
+            del self._queued[canvas_id]
+            self._in_flight.add(canvas_id)
+            jobs.append(canvas_id)
+        THUMB_QUEUE.set(len(self._queued))
+        return jobs
+
+    def sweep(self) -> int:
+        """
+        Queue every canvas whose log moved past its thumbnail.
+        """
+        conn = get_db_connection()
+        rows = conn.execute("""
+            SELECT s.canvas_id FROM canvas_stats s LEFT JOIN thumbnails t ON t.canvas_id = s.canvas_id
+            WHERE t.canvas_id IS NULL OR t.action_count != s.action_count
+                OR t.last_action_id IS NOT s.last_action_id
+            ORDER BY s.last_action_at DESC LIMIT ?
+        """, (self.queue_size,)).fetchall()
+        conn.close()
+        for row in rows:
+            self._push(row[0], (STALE, next(self._order)))
+        self.last_sweep = {"at": datetime.utcnow().isoformat(), "stale": len(rows)}
+        return len(rows)
+
+    # -----------------------------------------------------------------
+    # Rendering
+    # -----------------------------------------------------------------
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"),
+                                   initializer=_init_worker, initargs=(str(DB_PATH),))
+
+    def _submit(self, canvas_id):
+        args = (render_thumbnail, canvas_id, self.root, self.size, self.supersample)
+        try:
+            future = self._pool.submit(*args)
+        except BrokenProcessPool:
+            logger.warning("Thumbnail pool broke; starting a new one")
+            self._pool = self._new_pool()
+            future = self._pool.submit(*args)
+        future.add_done_callback(lambda f: self._done(canvas_id, f))
+
+    def _done(self, canvas_id, future):
+        try:
+            if future.cancelled():
+                return
+            result = future.result()
+            if result is not None:
+                self._record(result)
+                THUMB_RENDER_SECONDS.observe(result["seconds"])
+            self.rendered += 1
+            THUMBNAILS.inc(result="rendered")
+        except Exception as e:
+            self.failed += 1
+            THUMBNAILS.inc(result="failed")
+            logger.warning("Thumbnail for canvas %s failed: %s", canvas_id, e)
+        finally:
+            with self._cond:
+                self._in_flight.discard(canvas_id)
+                self._cond.notify()
+
+    def _record(self, result):
+        conn = get_db_connection()
+        old = conn.execute("SELECT digest FROM thumbnails WHERE canvas_id = ?", (result["canvas_id"],)).fetchone()
+        conn.execute("""
+            INSERT INTO thumbnails (canvas_id, digest, action_count, last_action_id, rendered_at)
+            SELECT :canvas_id, :digest, :action_count, :last_action_id, :rendered_at
+            WHERE EXISTS (SELECT 1 FROM canvases WHERE id = :canvas_id)
+            ON CONFLICT(canvas_id) DO UPDATE SET
+                digest = excluded.digest,
+                action_count = excluded.action_count,
+                last_action_id = excluded.last_action_id,
+                rendered_at = excluded.rendered_at
+        """, {**result, "rendered_at": datetime.utcnow().isoformat()})
+        conn.commit()
+        if old and old[0] != result["digest"]:
+            collect(conn, [old[0]], self.root)
+        conn.close()
+
+    def _run(self):
+        next_sweep = 0.0
+        while True:
+            with self._cond:
+                while (not self._stopping and time.monotonic() < next_sweep
+                       and (not self._heap or len(self._in_flight) >= self.workers)):
+                    self._cond.wait(next_sweep - time.monotonic())
+                if self._stopping:
+                    return
+                jobs = self._take()
+            for canvas_id in jobs:
+                self._submit(canvas_id)
+            if time.monotonic() >= next_sweep:
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Thumbnail sweep failed")
+                next_sweep = time.monotonic() + self.interval
+
+    # -----------------------------------------------------------------
+    # Lookup
+    # -----------------------------------------------------------------
+    def lookup(self, canvas_id):
+        """
+        Return (png, fresh) for a canvas's cached thumbnail, or (None, False)
+        if it has none yet. The bytes are read here rather than served from
+        the path, which collect() may remove once a newer render lands.
+        """
+        conn = get_db_connection()
+        row = conn.execute("""
+            SELECT t.digest, t.action_count = COALESCE(s.action_count, 0)
+                AND t.last_action_id IS s.last_action_id AS fresh
+            FROM thumbnails t LEFT JOIN canvas_stats s ON s.canvas_id = t.canvas_id
+            WHERE t.canvas_id = ?
+        """, (canvas_id,)).fetchone()
+        conn.close()
+        if row is None:
+            return None, False
+        try:
+            with open(thumbnail_path(self.root, row["digest"]), "rb") as f:
+                return f.read(), bool(row["fresh"])
+        except FileNotFoundError:
+            return None, False
+
+    # -----------------------------------------------------------------
+    # Lifecycle
+    # -----------------------------------------------------------------
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._stopping = False
+        self._pool = self._new_pool()
+        self._thread = threading.Thread(target=self._run, name="crucial-thumbs", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._pool is not None:
+            # Renders already running finish; queued ones are dropped
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            with self._cond:
+                while self._in_flight and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+            if self._in_flight:
+                logger.warning("Shutdown with %d thumbnails still rendering", len(self._in_flight))
+            self._pool = None
+
+    def health(self) -> dict:
+        alive = self._thread is not None and self._thread.is_alive()
+        return {"ok": alive, "workers": self.workers, "queued": len(self._queued),
+                "in_flight": len(self._in_flight), "rendered": self.rendered,
+                "failed": self.failed, "last_sweep": self.last_sweep}
+
+
+_thumbnailer = None
+
+def get_thumbnailer() -> Thumbnailer:
+    global _thumbnailer
+    if _thumbnailer is None:
+        settings = CONFIG["THUMBS"]
+        _thumbnailer = Thumbnailer(settings["cache_dir"], settings["size"], settings["workers"],
+                                   settings["interval"], settings["queue_size"])
+    return _thumbnailer
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: tiles.py
+# Description: Level-of-detail PNG tile pyramid with dirty-tile invalidation and a disk cache
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Zoom level `max_zoom` draws the canvas 1:1; each level below halves the
+scale, down to z=0 where the whole canvas fits in one tile.
+
+Tiles are cached under TILES cache_dir/<canvas_id>/ with a manifest
+recording the action log position they were rendered at. When a tile is
+requested, the stored bounding boxes (see spatial.py) of actions appended
+since then select the cached tiles to drop. A change appends cannot
+explain (clear, overwrite, load) drops the whole canvas cache. Rendering
+replays only the actions whose boxes touch the tile.
+"""
+
+import os
+import json
+import math
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+from crucial import metrics, spatial
+from crucial.config import CONFIG, get_logger
+from crucial.db import DB_PATH, get_db_connection, get_canvas_stats, iter_actions
+from crucial.raster import Rasterizer
+from crucial.scene import Scene, bounds, intersects
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = get_logger(__name__)
+
+TILE_RENDER_SECONDS = metrics.Histogram(
+    "crucial_tile_render_seconds", "Time to render one uncached tile")
+TILES_INVALIDATED = metrics.Counter(
+    "crucial_tiles_invalidated_total", "Cached tiles dropped because new actions touched them")
+
+def max_zoom(width, height, tile_size):
+    return max(0, math.ceil(math.log2(max(width, height, 1) / tile_size)))
+
+
+def grid(z, width, height, tile_size):
+    """
+    (columns, rows) of tiles at zoom `z`.
+    """
+    scale = 2 ** (z - max_zoom(width, height, tile_size))
+    return max(1, math.ceil(width * scale / tile_size)), max(1, math.ceil(height * scale / tile_size))
+
+
+def tile_bounds(z, x, y, width, height, tile_size):
+    """
+    Canvas-space rectangle covered by tile (z, x, y).
+    """
+    span = tile_size / 2 ** (z - max_zoom(width, height, tile_size))
+    return x * span, y * span, (x + 1) * span, (y + 1) * span
+
+
+class TileCache:
+    def __init__(self, root, tile_size=256, supersample=2):
+        self.root = root
+        self.tile_size = tile_size
+        self.supersample = supersample
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _dir(self, canvas_id):
+        return os.path.join(self.root, canvas_id)
+
+    def _tile_file(self, canvas_id, key):
+        return os.path.join(self._dir(canvas_id), key.replace("/", "-") + ".png")
+
+    @contextmanager
+    def _locked(self, canvas_id):
+        """
+        Serialize manifest updates for one canvas across threads and workers.
+        """
+        with self._locks_guard:
+            lock = self._locks.setdefault(canvas_id, threading.Lock())
+        with lock:
+            os.makedirs(self._dir(canvas_id), exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self._dir(canvas_id), ".lock"), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_manifest(self, canvas_id):
+        try:
+            with open(os.path.join(self._dir(canvas_id), "manifest.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_manifest(self, canvas_id, manifest):
+        path = os.path.join(self._dir(canvas_id), "manifest.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    # -----------------------------------------------------------------
+    # Invalidation
+    # -----------------------------------------------------------------
+    def _reset(self, canvas, stats):
+        for name in os.listdir(self._dir(canvas.id)):
+            if name.endswith(".png"):
+                os.remove(os.path.join(self._dir(canvas.id), name))
+        return {"version": stats["last_action_id"], "count": stats["action_count"], "tiles": {}}
+
+    def _invalidate(self, canvas, manifest, boxes):
+        """
+        Drop cached tiles intersecting any of `boxes`.
+        """
+        w, h, size = canvas.width, canvas.height, self.tile_size
+        by_zoom = {}
+        for key in manifest["tiles"]:
+            z, x, y = map(int, key.split("/"))
+            by_zoom.setdefault(z, set()).add((x, y))
+        dropped = set()
+        for z, cached in by_zoom.items():
+            span = size / 2 ** (z - max_zoom(w, h, size))
+            for x0, y0, x1, y1 in boxes:
+                cols = range(max(0, int(x0 // span)), int(x1 // span) + 1)
+                rows = range(max(0, int(y0 // span)), int(y1 // span) + 1)
+                if len(cols) * len(rows) < len(cached):
+                    hits = {(cx, cy) for cx in cols for cy in rows} & cached
+                else:
+                    hits = {(cx, cy) for cx, cy in cached if cx in cols and cy in rows}
+                cached -= hits
+                dropped.update(f"{z}/{cx}/{cy}" for cx, cy in hits)
+        for key in dropped:
+            manifest["tiles"].pop(key, None)
+            try:
+                os.remove(self._tile_file(canvas.id, key))
+            except FileNotFoundError:
+                pass
+        TILES_INVALIDATED.inc(len(dropped))
+        return len(dropped)
+
+    def _sync(self, canvas):
+        """
+        Bring the manifest up to the current log, invalidating dirty tiles.
+        Called with the canvas lock held.
+        """
+        stats = get_canvas_stats(canvas.id)
+        manifest = self._load_manifest(canvas.id)
+        if manifest is None or stats["action_count"] < manifest["count"]:
+            manifest = self._reset(canvas, stats)
+        elif stats["last_action_id"] != manifest["version"]:
+            conn = get_db_connection()
+            rows = None  # without stored boxes any change resets the cache
+            if spatial.enabled(conn.cursor()):
+                rows = conn.execute(
+                    "SELECT a.action, b.min_x, b.min_y, b.max_x, b.max_y"
+                    " FROM actions a LEFT JOIN action_bounds b ON b.id = a.id"
+                    " WHERE a.canvas_id = ? AND a.id > ? ORDER BY a.id",
+                    (canvas.id, manifest["version"] or 0)).fetchall()
+            conn.close()
+            if rows is None or manifest["count"] + len(rows) != stats["action_count"]:
+                manifest = self._reset(canvas, stats)
+            else:
+                # Transforms are stored as unbounded; they move later
+                # actions' boxes, not existing pixels
+                boxes = [tuple(row)[1:] for row in rows
+                         if row["min_x"] is not None and row["action"] not in spatial.TRANSFORMS]
+                dropped = self._invalidate(canvas, manifest, boxes)
+                logger.debug("Canvas %s: %d new actions invalidated %d tiles", canvas.id, len(rows), dropped)
+                manifest.update(version=stats["last_action_id"], count=stats["action_count"])
+        else:
+            return manifest
+        self._save_manifest(canvas.id, manifest)
+        return manifest
+
+    # -----------------------------------------------------------------
+    # Rendering
+    # -----------------------------------------------------------------
+    def render(self, canvas, z, x, y):
+        w, h, size = canvas.width, canvas.height, self.tile_size
+        scale = 2 ** (z - max_zoom(w, h, size))
+        area = tile_bounds(z, x, y, w, h, size)
+        r = Rasterizer(size, size, view=(scale, 0.0, 0.0, scale, -x * size, -y * size),
+                       background=canvas.bg_color, supersample=self.supersample, clip=(0, 0, w, h))
+        conn = get_db_connection()
+        indexed = spatial.enabled(conn.cursor())
+        conn.close()
+        scene = Scene(w, h, canvas.bg_color)
+        log = spatial.iter_region(DB_PATH, canvas.id, area) if indexed else iter_actions(canvas.id)
+        for action, params, layout in log:
+            try:
+                prims = scene.compile(action, json.loads(params), layout and json.loads(layout))
+            except ValueError:
+                continue
+            for prim in prims:
+                box = bounds(prim, scene.matrix)
+                if box and intersects(box, area):
+                    r.draw(prim, scene.matrix)
+        return r.image()
+
+    def tile_path(self, canvas, z, x, y) -> str:
+        """
+        Return the path of an up-to-date PNG for tile (z, x, y), rendering
+        it if needed. Raises ValueError for tiles outside the pyramid.
+        """
+        w, h, size = canvas.width, canvas.height, self.tile_size
+        cols, rows = grid(z, w, h, size) if 0 <= z <= max_zoom(w, h, size) else (0, 0)
+        if not (0 <= x < cols and 0 <= y < rows):
+            raise ValueError(f"Tile {z}/{x}/{y} is outside the pyramid")
+
+        key = f"{z}/{x}/{y}"
+        path = self._tile_file(canvas.id, key)
+        with self._locked(canvas.id):
+            manifest = self._sync(canvas)
+            version = manifest["version"]
+            hit = key in manifest["tiles"] and os.path.exists(path)
+        metrics.cache_lookup("tiles", hit)
+        if hit:
+            return path
+
+        started = time.perf_counter()
+        image = self.render(canvas, z, x, y)
+        TILE_RENDER_SECONDS.observe(time.perf_counter() - started)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp, "PNG")
+
+        with self._locked(canvas.id):
+            manifest = self._load_manifest(canvas.id)
+            os.replace(tmp, path)
+            # If the log moved on while rendering, the tile may miss those
+            # actions; serve it now but let the next request re-render it
+            if manifest and manifest["version"] == version:
+                manifest["tiles"][key] = version
+                self._save_manifest(canvas.id, manifest)
+        return path
+
+    def describe(self, canvas) -> dict:
+        w, h, size = canvas.width, canvas.height, self.tile_size
+        top = max_zoom(w, h, size)
+        return {
+            "tile_size": size,
+            "width": w,
+            "height": h,
+            "max_zoom": top,
+            "levels": [dict(zip(("z", "columns", "rows"), (z, *grid(z, w, h, size)))) for z in range(top + 1)]
+        }
+
+    def purge(self, canvas_ids):
+        for canvas_id in canvas_ids:
+            shutil.rmtree(self._dir(canvas_id), ignore_errors=True)
+
+
+_cache = None
+
+def get_tile_cache() -> TileCache:
+    global _cache
+    if _cache is None:
+        settings = CONFIG["TILES"]
+        _cache = TileCache(settings["cache_dir"], settings["tile_size"], settings["supersample"])
+    return _cache
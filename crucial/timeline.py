@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: timeline.py
+# Description: Animated replay export (GIF, APNG, numbered frames) rendered incrementally
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Replays a canvas's action log once into a single raster, snapshotting it
+after every K actions:
+
+    python -m crucial.timeline my-canvas --out replay.gif
+    python -m crucial.timeline my-canvas --out replay.png --frames 200   # APNG
+    python -m crucial.timeline my-canvas --out frames/ --format frames --every 10
+
+Frames are written as they are produced, never collected: each snapshot
+is diffed against the previous one and only the changed rectangle is
+encoded (a GIF image block with its own palette, or an APNG fdAT chunk).
+Snapshots that change nothing extend the previous frame's delay. Memory
+is the canvas raster plus the previous frame, however long the history.
+The frame directory keeps every snapshot as a full PNG, for tools like
+`ffmpeg -framerate 10 -i frame_%06d.png`.
+
+The server renders timelines in a TimelineRenderer process pool whose
+workers are capped at TIMELINE memory_mb of address space, so a replay
+that runs away fails its own request and never takes the server down.
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import struct
+import zlib
+import asyncio
+import argparse
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import ImageChops
+from crucial.config import CONFIG, get_logger
+from crucial.db import DB_PATH, get_canvas_stats, iter_actions, connect_readonly
+from crucial.raster import Rasterizer
+from crucial.scene import Scene
+from crucial.canvas import Canvas
+
+try:
+    import resource
+except ImportError:  # Windows: no address-space limit, workers are only isolated
+    resource = None
+
+logger = get_logger(__name__)
+
+FORMATS = ("gif", "apng", "frames")
+MAX_FRAMES = 1000
+
+
+class _DeltaWriter:
+    """
+    Base for streamed animations: holds back one frame so snapshots that
+    change nothing can extend its delay, and hands each distinct frame to
+    _emit() as (region, offset, delay_ms).
+    """
+    def __init__(self, fp, delay=100):
+        self.fp = fp
+        self.delay = delay
+        self.frames = 0
+        self._previous = None
+        self._pending = None
+
+    def add(self, image):
+        image = image.convert("RGB")
+        if self._previous is None:
+            box = (0, 0, image.width, image.height)
+        else:
+            box = ImageChops.difference(self._previous, image).getbbox()
+        if box is None:
+            self._pending[2] += self.delay
+            return
+        self._flush()
+        self._pending = [image.crop(box), box[:2], self.delay]
+        self._previous = image
+
+    def _flush(self):
+        if self._pending is not None:
+            self._emit(*self._pending)
+            self.frames += 1
+            self._pending = None
+
+    def close(self, hold=0):
+        """
+        Write the last frame, shown `hold` ms longer, and finish the file.
+        """
+        if self._pending is not None:
+            self._pending[2] += hold
+        self._flush()
+        self._finish()
+
+    def _emit(self, region, offset, delay):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+
+class GifWriter(_DeltaWriter):
+    def _header(self, size):
+        self.fp.write(b"GIF89a" + struct.pack("<HHBBB", *size, 0, 0, 0))
+        # Loop forever
+        self.fp.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    def _emit(self, region, offset, delay):
+        if self.frames == 0:
+            self._header(region.size)
+        buf = io.BytesIO()
+        region.save(buf, "GIF")
+        data = buf.getvalue()
+        # Lift Pillow's single-frame image block out, its global palette
+        # becoming this frame's local one
+        flags, pos, table, bits = data[10], 13, b"", 0
+        if flags & 0x80:
+            bits = flags & 7
+            table = data[pos:pos + 3 * (2 << bits)]
+            pos += len(table)
+        while data[pos] == 0x21:
+            pos += 2
+            while data[pos]:
+                pos += data[pos] + 1
+            pos += 1
+        descriptor = bytearray(data[pos:pos + 10])
+        pos += 10
+        if descriptor[9] & 0x80:
+            bits = descriptor[9] & 7
+            table = data[pos:pos + 3 * (2 << bits)]
+            pos += len(table)
+        struct.pack_into("<HH", descriptor, 1, *offset)
+        descriptor[9] = 0x80 | (descriptor[9] & 0x40) | bits
+        # Graphic control: keep previous pixels (disposal 1), delay in 1/100 s
+        self.fp.write(struct.pack("<BBBBHBB", 0x21, 0xF9, 4, 0x04, min(65535, max(2, round(delay / 10))), 0, 0))
+        self.fp.write(bytes(descriptor) + table + data[pos:-1])
+
+    def _finish(self):
+        self.fp.write(b"\x3b")
+
+
+class ApngWriter(_DeltaWriter):
+    """
+    Needs a seekable file: the frame count in acTL is patched on close.
+    """
+    def _chunk(self, kind, body):
+        self.fp.write(struct.pack(">I", len(body)) + kind + body)
+        self.fp.write(struct.pack(">I", zlib.crc32(kind + body)))
+
+    def _emit(self, region, offset, delay):
+        buf = io.BytesIO()
+        region.save(buf, "PNG")
+        data, pos, ihdr, idat = buf.getvalue(), 8, None, []
+        while pos < len(data):
+            length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+            if kind == b"IHDR":
+                ihdr = data[pos + 8:pos + 8 + length]
+            elif kind == b"IDAT":
+                idat.append(data[pos + 8:pos + 8 + length])
+            pos += 12 + length
+        if self.frames == 0:
+            self.fp.write(b"\x89PNG\r\n\x1a\n")
+            self._chunk(b"IHDR", ihdr)
+            self._actl = self.fp.tell()
+            self._chunk(b"acTL", struct.pack(">II", 0, 0))
+            self._sequence = 0
+        num, den = (delay, 1000) if delay < 65536 else (min(65535, round(delay / 10)), 100)
+        self._chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._sequence, *region.size, *offset, num, den, 0, 0))
+        self._sequence += 1
+        if self.frames == 0:
+            for body in idat:
+                self._chunk(b"IDAT", body)
+        else:
+            for body in idat:
+                self._chunk(b"fdAT", struct.pack(">I", self._sequence) + body)
+                self._sequence += 1
+
+    def _finish(self):
+        self._chunk(b"IEND", b"")
+        end = self.fp.tell()
+        self.fp.seek(self._actl)
+        self._chunk(b"acTL", struct.pack(">II", self.frames, 0))
+        self.fp.seek(end)
+
+
+class FrameDirectory:
+    """
+    Every snapshot as frame_000001.png, frame_000002.png, ...
+    """
+    def __init__(self, path):
+        self.path = path
+        self.frames = 0
+        os.makedirs(path, exist_ok=True)
+
+    def add(self, image):
+        self.frames += 1
+        image.save(os.path.join(self.path, f"frame_{self.frames:06d}.png"))
+
+    def close(self, hold=0):
+        pass
+
+
+def render_timeline(width, height, background, actions, writer, every=1, scale=1.0, supersample=2):
+    """
+    Replay (action, params_json, layout_json) rows once, adding a
+    snapshot to `writer` before the first action, after every `every`
+    actions, and at the end. Returns the number of actions replayed.
+    """
+    r = Rasterizer(max(1, round(width * scale)), max(1, round(height * scale)),
+                   view=(scale, 0.0, 0.0, scale, 0.0, 0.0), background=background, supersample=supersample)
+    scene = Scene(width, height, background)
+    writer.add(r.image())
+    count = 0
+    for action, params, layout in actions:
+        try:
+            prims = scene.compile(action, json.loads(params), layout and json.loads(layout))
+        except ValueError:
+            prims = []
+        for prim in prims:
+            r.draw(prim, scene.matrix)
+        count += 1
+        if count % every == 0:
+            writer.add(r.image())
+    if count % every:
+        writer.add(r.image())
+    return count
+
+
+def frame_step(action_count, frames) -> int:
+    """
+    Actions per snapshot so a log of `action_count` yields about `frames`.
+    """
+    return max(1, math.ceil(action_count / max(1, min(frames, MAX_FRAMES))))
+
+
+def export_timeline(canvas, path, fmt="gif", every=None, frames=100, delay=100, hold=2000, scale=1.0, conn=None):
+    """
+    Write a canvas's replay to `path` (a directory for "frames").
+    Returns (frames written, actions replayed).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported timeline format: {fmt}")
+    every = every or frame_step(get_canvas_stats(canvas.id)["action_count"], frames)
+    actions = iter_actions(canvas.id, conn=conn)
+    if fmt == "frames":
+        writer = FrameDirectory(path)
+        count = render_timeline(canvas.width, canvas.height, canvas.bg_color, actions, writer, every, scale)
+        return writer.frames, count
+    with open(path, "wb") as f:
+        writer = (GifWriter if fmt == "gif" else ApngWriter)(f, delay)
+        count = render_timeline(canvas.width, canvas.height, canvas.bg_color, actions, writer, every, scale)
+        writer.close(hold)
+    logger.info("Exported %s timeline of canvas %s: %d frames, %d actions", fmt, canvas.id, writer.frames, count)
+    return writer.frames, count
+
+
+# ---------------------------------------------------------------------
+# Server-side rendering in worker processes
+# ---------------------------------------------------------------------
+class TimelineRenderError(Exception):
+    pass
+
+
+_worker_conn = None
+
+
+def _init_worker(db_path, memory_mb):
+    global _worker_conn
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _worker_conn = connect_readonly(db_path)
+
+
+def _render(canvas, path, fmt, every, delay, hold, scale):
+    return export_timeline(canvas, path, fmt, every, delay=delay, hold=hold, scale=scale, conn=_worker_conn)
+
+
+class TimelineRenderer:
+    """
+    Process pool for the timeline endpoint. A worker that runs out of its
+    address space raises MemoryError or dies; either way only that request
+    fails, and a broken pool is replaced for the next one.
+    """
+    def __init__(self, workers=1, memory_mb=1024):
+        self.workers = max(1, workers)
+        self.memory_mb = memory_mb
+        self.rendered = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._pool = None
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"),
+                                   initializer=_init_worker, initargs=(str(DB_PATH), self.memory_mb))
+
+    async def render(self, canvas, path, fmt="gif", frames=100, delay=100, hold=2000, scale=1.0):
+        """
+        Write a timeline like export_timeline, in a worker process.
+        """
+        stats = await asyncio.to_thread(get_canvas_stats, canvas.id)
+        every = frame_step(stats["action_count"], frames)
+        args = (_render, canvas, path, fmt, every, delay, hold, scale)
+        if self._pool is None:
+            self._pool = self._new_pool()
+        try:
+            future = self._pool.submit(*args)
+        except BrokenProcessPool:
+            logger.warning("Timeline pool broke; starting a new one")
+            self._pool = self._new_pool()
+            future = self._pool.submit(*args)
+        pool = self._pool
+        self.in_flight += 1
+        try:
+            result = await asyncio.wrap_future(future)
+        except (BrokenProcessPool, MemoryError) as e:
+            self.failed += 1
+            if isinstance(e, BrokenProcessPool) and self._pool is pool:
+                logger.warning("Timeline worker died; starting a new pool")
+                self._pool = self._new_pool()
+                pool.shutdown(wait=False)
+            raise TimelineRenderError(
+                f"Timeline of canvas {canvas.id} did not fit the {self.memory_mb} MB render limit") from e
+        finally:
+            self.in_flight -= 1
+        self.rendered += 1
+        return result
+
+    def start(self):
+        self._pool = self._new_pool()
+
+    def stop(self, timeout):
+        deadline = time.monotonic() + timeout
+        if self._pool is not None:
+            # Renders already running finish; queued ones are dropped
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            while self.in_flight and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if self.in_flight:
+                logger.warning("Shutdown with %d timelines still rendering", self.in_flight)
+            self._pool = None
+
+    def health(self) -> dict:
+        return {"ok": True, "workers": self.workers, "memory_mb": self.memory_mb,
+                "in_flight": self.in_flight, "rendered": self.rendered, "failed": self.failed}
+
+
+_renderer = None
+
+def get_timeline_renderer() -> TimelineRenderer:
+    global _renderer
+    if _renderer is None:
+        settings = CONFIG["TIMELINE"]
+        _renderer = TimelineRenderer(settings["workers"], settings["memory_mb"])
+    return _renderer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a canvas's animated replay")
+    parser.add_argument("canvas", help="Canvas ID or human ID")
+    parser.add_argument("--out", required=True, help="Output file, or directory for --format frames")
+    parser.add_argument("--format", choices=FORMATS, help="Default: from the --out extension")
+    parser.add_argument("--every", type=int, help="Actions per frame (default: sized by --frames)")
+    parser.add_argument("--frames", type=int, default=100, help="Approximate frame count")
+    parser.add_argument("--delay", type=int, default=100, help="Milliseconds per frame")
+    parser.add_argument("--hold", type=int, default=2000, help="Extra milliseconds on the final frame")
+    parser.add_argument("--scale", type=float, default=1.0)
+    opts = parser.parse_args()
+
+    canvas = Canvas.from_id(opts.canvas)
+    if canvas is None:
+        sys.exit(f"Canvas not found: {opts.canvas}")
+    fmt = opts.format or ("gif" if opts.out.endswith(".gif") else "apng" if opts.out.endswith(".png") else "frames")
+    frames, count = export_timeline(canvas, opts.out, fmt, opts.every, opts.frames, opts.delay, opts.hold, opts.scale)
+    print(f"Wrote {frames} frames from {count} actions to {opts.out}")
+
+
+if __name__ == "__main__":
+    main()
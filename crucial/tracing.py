@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: tracing.py
+# Description: Opt-in per-request span tracing, Server-Timing and slow-request log
+# Author: Ms. White
+# Created: 2025-05-12
+
+import os
+import json
+import time
+import contextvars
+from crucial.config import CONFIG, get_logger, get_file_logger
+
+logger = get_logger(__name__)
+
+_current = contextvars.ContextVar("crucial_span", default=None)
+
+# Server-Timing headers are capped so deep traces do not bloat responses
+MAX_TIMING_ENTRIES = 32
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes",
+                 "children", "start", "end", "start_ns")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.children = []
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def walk(self, depth: int = 0):
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+
+class span:
+    """
+    Context manager recording a child of the current span. Outside a
+    traced request it does nothing beyond one ContextVar lookup.
+
+        with span("db.commit"):
+            conn.commit()
+    """
+    __slots__ = ("name", "attributes", "_span", "_token")
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._span = None
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            return None
+        self._span = Span(self.name, parent.trace_id, parent.span_id, self.attributes)
+        parent.children.append(self._span)
+        self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is not None:
+            self._span.end = time.perf_counter()
+            if exc_type is not None:
+                self._span.attributes["error"] = exc_type.__name__
+            _current.reset(self._token)
+        return False
+
+
+def annotate(**attributes):
+    """
+    Attach attributes to the innermost active span, if any.
+    """
+    current = _current.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def start_trace(name: str, **attributes):
+    root = Span(name, os.urandom(16).hex(), attributes=attributes)
+    return root, _current.set(root)
+
+
+def finish_trace(root: Span, token) -> str:
+    """
+    Close the root span, write slow-log and export entries, and return the
+    Server-Timing header value.
+    """
+    root.end = time.perf_counter()
+    _current.reset(token)
+
+    settings = CONFIG["TRACING"]
+    if root.duration_ms >= settings["slow_ms"]:
+        _slow_log().warning(format_tree(root))
+    if settings["otlp_path"]:
+        _otlp_log().info(json.dumps(to_otlp(root)))
+    return server_timing(root)
+
+
+def server_timing(root: Span) -> str:
+    entries = []
+    for depth, s in root.walk():
+        if s.end is None:
+            continue  # e.g. a broadcast task still running after the response
+        name = "total" if depth == 0 else s.name.replace(" ", "_").replace(";", "_").replace(",", "_")
+        entries.append(f"{name};dur={s.duration_ms:.3f}")
+        if len(entries) >= MAX_TIMING_ENTRIES:
+            break
+    return ", ".join(entries)
+
+
+def format_tree(root: Span) -> str:
+    lines = [f"SLOW {root.duration_ms:.1f}ms {root.name} {_format_attrs(root.attributes)}".rstrip()]
+    for depth, s in root.walk():
+        if depth:
+            lines.append(f"{'  ' * depth}{s.name} {s.duration_ms:.3f}ms {_format_attrs(s.attributes)}".rstrip())
+    return "\n".join(lines)
+
+
+def _format_attrs(attributes: dict) -> str:
+    return " ".join(f"{k}={v}" for k, v in attributes.items())
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(root: Span) -> dict:
+    """
+    Render a finished trace as an OTLP/JSON ExportTraceServiceRequest.
+    """
+    spans = []
+    for _, s in root.walk():
+        end_ns = s.start_ns + int(s.duration_ms * 1_000_000)
+        entry = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 2 if s is root else 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()]
+        }
+        if s.parent_id:
+            entry["parentSpanId"] = s.parent_id
+        spans.append(entry)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "crucial"}}]},
+            "scopeSpans": [{"scope": {"name": "crucial.tracing"}, "spans": spans}]
+        }]
+    }
+
+
+_loggers = {}
+
+def _slow_log():
+    if "slow" not in _loggers:
+        _loggers["slow"] = get_file_logger("crucial.slow", CONFIG["TRACING"]["slow_log_path"])
+    return _loggers["slow"]
+
+def _otlp_log():
+    if "otlp" not in _loggers:
+        _loggers["otlp"] = get_file_logger("crucial.otlp", CONFIG["TRACING"]["otlp_path"], raw=True)
+    return _loggers["otlp"]
+
+
+async def tracing_middleware(request, call_next):
+    """
+    FastAPI HTTP middleware wrapping each request in a root span.
+    Registered by server.py only when tracing is enabled.
+    """
+    root, token = start_trace(f"{request.method} {request.url.path}")
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        root.attributes["status"] = status
+        header = finish_trace(root, token)
+    response.headers["Server-Timing"] = header
+    return response
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# File: turtles.py
+# Description: Vectorized draw_turtle compiler producing cached NumPy polylines
+# Author: Ms. White
+# Created: 2025-05-12
+
+"""
+Compiles a draw_turtle command list (the same commands and semantics as
+renderDrawTurtle) into one (N, 2) float array of vertices plus pen runs:
+
+    turtle = compile_turtle(params)
+    for start, stop, color, width in turtle.runs:
+        turtle.points[start:stop]      # one stroked polyline
+
+Only parsing each distinct command string is Python; headings and
+positions are segmented cumulative sums (restarting at each setheading /
+goto), and pen state, colour and width are forward-filled with
+maximum.accumulate. A run ends at penup, setcolor and setwidth.
+
+Results are kept in a small LRU keyed by a hash of the parameters, so
+the scene builder, bounds computation, tile renders and exports of the
+same action share one compilation. The arrays are read-only.
+"""
+
+import json
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+from crucial import metrics
+
+Turtle = namedtuple("Turtle", "points runs")
+
+FORWARD, BACKWARD, LEFT, RIGHT, GOTO, SETHEADING, PENUP, PENDOWN, SETCOLOR, SETWIDTH = range(10)
+OPCODES = {"forward": FORWARD, "backward": BACKWARD, "left": LEFT, "right": RIGHT, "goto": GOTO,
+           "setheading": SETHEADING, "penup": PENUP, "pendown": PENDOWN,
+           "setcolor": SETCOLOR, "setwidth": SETWIDTH}
+
+IGNORED = (-1, None, np.nan, None)
+
+CACHE_SIZE = 64
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _parse(cmd):
+    """
+    (opcode, argument, number or nan, goto target or None) of one command
+    string or [op, arg] list; -1 for anything the turtle ignores.
+    """
+    if type(cmd) is str:
+        parts = cmd.split(None, 1)
+        if not parts:
+            return IGNORED
+        op = OPCODES.get(parts[0].lower(), -1)
+        arg = parts[1] if len(parts) > 1 else None
+    elif isinstance(cmd, list) and cmd:
+        op, arg = OPCODES.get(str(cmd[0]).lower(), -1), cmd[1] if len(cmd) > 1 else None
+    else:
+        return IGNORED
+    if op <= SETHEADING:
+        if op == GOTO:
+            coords = arg if isinstance(arg, list) else str(arg).split(",")
+            try:
+                gx, gy = (float(c) for c in coords)
+            except (TypeError, ValueError):
+                return IGNORED
+            return op, arg, np.nan, (gx, gy)
+        try:
+            return op, arg, float(arg), None
+        except (TypeError, ValueError):
+            # A move without a distance still moves, by 0
+            return (op, arg, 0.0, None) if op <= BACKWARD else IGNORED
+    if op == SETWIDTH:
+        try:
+            return op, arg, float(arg), None
+        except (TypeError, ValueError):
+            return IGNORED
+    if op == SETCOLOR:
+        if arg is None:
+            return IGNORED
+        return op, " ".join(arg.split()) if type(arg) is str else arg, np.nan, None
+    return op, arg, np.nan, None
+
+
+def _parse_all(commands):
+    """
+    Programs repeat the same few commands, so each distinct one is parsed once.
+    """
+    try:
+        parsed = {cmd: _parse(cmd) for cmd in set(commands)}
+    except TypeError:  # [op, arg] list commands
+        return list(map(_parse, commands))
+    return list(map(parsed.__getitem__, commands))
+
+
+def _last(mask):
+    """
+    For each index, the index of the latest True at or before it (-1 if none).
+    """
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+
+def _compile(params) -> Turtle:
+    parsed = _parse_all(params["commands"])
+    n = len(parsed)
+    ops, args, nums, targets = zip(*parsed) if n else ((), (), (), ())
+    codes = np.array(ops, dtype=np.int8)
+    values = np.array(nums, dtype=np.float64)
+
+    # Heading in effect at every command
+    turn = np.where(codes == LEFT, values, 0.0) - np.where(codes == RIGHT, values, 0.0)
+    turned = np.cumsum(turn)
+    is_set = codes == SETHEADING
+    last_set = _last(is_set)
+    base = np.where(last_set >= 0, values[last_set] - turned[last_set], float(params.get("start_heading", 0)))
+    heading = np.radians(np.mod(base + turned, 360.0))
+
+    # Positions after every command: offsets from the latest goto (or the start)
+    step = np.where(codes == FORWARD, values, 0.0) - np.where(codes == BACKWARD, values, 0.0)
+    dx = np.cumsum(np.where(step != 0, np.cos(heading) * step, 0.0))
+    dy = np.cumsum(np.where(step != 0, -np.sin(heading) * step, 0.0))
+    is_goto = codes == GOTO
+    start = float(params.get("start_x", 0)), float(params.get("start_y", 0))
+    anchor_x, anchor_y = np.full(n, start[0]), np.full(n, start[1])
+    at = np.flatnonzero(is_goto)
+    if len(at):
+        anchor_x[at], anchor_y[at] = np.array([targets[i] for i in at.tolist()]).T
+    last_goto = _last(is_goto)
+    from_goto = last_goto >= 0
+    ref = np.maximum(last_goto, 0)
+    x = np.where(from_goto, anchor_x[ref] + dx - dx[ref], anchor_x + dx)
+    y = np.where(from_goto, anchor_y[ref] + dy - dy[ref], anchor_y + dy)
+
+    # Vertices: the start, then where every move ended
+    moves = np.flatnonzero((codes == FORWARD) | (codes == BACKWARD) | is_goto)
+    points = np.empty((len(moves) + 1, 2))
+    points[0] = start
+    points[1:, 0], points[1:, 1] = x[moves], y[moves]
+    points.flags.writeable = False
+
+    # Pen state, colour and width in effect at every command
+    pen_cmd = _last((codes == PENUP) | (codes == PENDOWN))
+    down = np.where(pen_cmd >= 0, codes[np.maximum(pen_cmd, 0)] == PENDOWN, True)
+    color_cmd = _last(codes == SETCOLOR)
+    width_cmd = _last(codes == SETWIDTH)
+    run_id = np.cumsum(np.isin(codes, (PENUP, SETCOLOR, SETWIDTH)))
+
+    # Runs: consecutive pen-down moves sharing a run id
+    drawn = down[moves]
+    move_run = np.where(drawn, run_id[moves], -1)
+    new_run = np.ones(len(moves), dtype=bool)
+    new_run[1:] = move_run[1:] != move_run[:-1]
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], len(moves))
+    starts, ends = starts[drawn[starts]], ends[drawn[starts]]
+    pen_color, pen_width = params.get("pen_color", "#000000"), params.get("pen_width", 2)
+    runs = []
+    # Move k runs from vertex k to vertex k + 1
+    for first, last, color, width in zip(starts.tolist(), ends.tolist(), color_cmd[moves[starts]].tolist(),
+                                         width_cmd[moves[starts]].tolist()):
+        runs.append((first, last + 1, str(args[color]) if color >= 0 else pen_color,
+                     int(values[width]) if width >= 0 else pen_width))
+    return Turtle(points, tuple(runs))
+
+
+def _key(params):
+    commands = params["commands"]
+    try:
+        digest = hash(tuple(commands))
+    except TypeError:  # [op, arg] list commands
+        digest = hash(json.dumps(commands))
+    return (digest, len(commands), params.get("start_x"), params.get("start_y"), params.get("start_heading"),
+            params.get("pen_color"), params.get("pen_width"))
+
+
+def compile_turtle(params) -> Turtle:
+    key = _key(params)
+    with _cache_lock:
+        turtle = _cache.get(key)
+        if turtle is not None:
+            _cache.move_to_end(key)
+    metrics.cache_lookup("turtle", turtle is not None)
+    if turtle is None:
+        turtle = _compile(params)
+        with _cache_lock:
+            _cache[key] = turtle
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return turtle
@@ -7,7 +7,11 @@
 # Created: 2025-05-06 20:49:02
 # Modified: 2025-05-06 22:28:26
 
+import os
+import mmap
 import random
+import struct
+import threading
 import uuid
 from hashlib import sha256
 
@@ -16,34 +20,199 @@ from pathlib import Path
 ADJ_PATH = Path(__file__).parent / "words" / "adjectives.txt"
 NOUN_PATH = Path(__file__).parent / "words" / "nouns.txt"
 
-ADJECTIVES = ADJ_PATH.read_text().splitlines()
-NOUNS = NOUN_PATH.read_text().splitlines()
+# Compiled word index layout (little-endian):
+#   header   magic, format version, word count, source size, source mtime_ns
+#   offsets  (count + 1) x uint32 byte offsets into the blob
+#   blob     concatenated UTF-8 words, no separators
+INDEX_MAGIC = b"CWIX"
+INDEX_VERSION = 1
+_HEADER = struct.Struct("<4sIIQQ")
+_OFFSET = struct.Struct("<I")
 
-def generate_human_id() -> str:
+
+def compile_word_index(source: Path) -> bytes:
+    """
+    Compile a newline-separated word list into the binary index format.
+    """
+    st = source.stat()
+    words = source.read_bytes().splitlines()
+    offsets = [0]
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+    return b"".join([
+        _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(words), st.st_size, st.st_mtime_ns),
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        b"".join(words)
+    ])
+
+
+class WordIndex:
     """
-    Generate a fully random human-readable ID in the form: adjective-noun-###.
+    Read-only word list backed by a memory-mapped offset table and blob.
+    Nothing is read until the first lookup. The index file sits next to its
+    source (.txt → .idx) and is rebuilt whenever the source changes.
+    """
+    def __init__(self, source: Path):
+        self.source = source
+        self.path = source.with_suffix(".idx")
+        self._buf = None
+        self._count = 0
+
+    def _valid(self, buf, st) -> bool:
+        if len(buf) < _HEADER.size:
+            return False
+        magic, version, _, size, mtime_ns = _HEADER.unpack_from(buf, 0)
+        return (magic, version, size, mtime_ns) == (INDEX_MAGIC, INDEX_VERSION, st.st_size, st.st_mtime_ns)
+
+    def _open(self):
+        st = self.source.stat()
+        try:
+            with open(self.path, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._valid(buf, st):
+                return buf
+            buf.close()
+        except (OSError, ValueError):
+            pass
+
+        data = compile_word_index(self.source)
+        try:
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Read-only install: keep the compiled index in memory instead
+            return data
+        with open(self.path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load(self):
+        if self._buf is None:
+            buf = self._open()
+            self._count = _HEADER.unpack_from(buf, 0)[2]
+            self._buf = buf
+        return self._buf
+
+    def __len__(self) -> int:
+        self._load()
+        return self._count
+
+    def __getitem__(self, index: int) -> str:
+        buf = self._load()
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("word index out of range")
+        table = _HEADER.size + index * _OFFSET.size
+        start, = _OFFSET.unpack_from(buf, table)
+        end, = _OFFSET.unpack_from(buf, table + _OFFSET.size)
+        blob = _HEADER.size + (self._count + 1) * _OFFSET.size
+        return buf[blob + start:blob + end].decode("utf-8")
+
+
+ADJECTIVES = WordIndex(ADJ_PATH)
+NOUNS = WordIndex(NOUN_PATH)
+
+def generate_human_id(seed: str = None, deterministic: bool = False, attempt: int = 0) -> str:
+    """
+    Generate a human-readable ID in the form: adjective-noun-###.
     Example: 'brisk-vortex-197'
+
+    If `deterministic` is True, the ID is derived from SHA256(seed), so the
+    same seed (e.g. a canvas UUID) always maps to the same ID. `attempt`
+    perturbs the seed so a collision can be retried deterministically.
+    Otherwise, use full random selection.
     """
+    if deterministic and seed:
+        material = seed if attempt == 0 else f"{seed}#{attempt}"
+        digest = sha256(material.encode()).digest()
+        a_index = int.from_bytes(digest[0:4], 'big') % len(ADJECTIVES)
+        n_index = int.from_bytes(digest[4:8], 'big') % len(NOUNS)
+        suffix = int.from_bytes(digest[8:10], 'big') % 1000
+        return f"{ADJECTIVES[a_index]}-{NOUNS[n_index]}-{suffix:03d}"
+
     adjective = random.choice(ADJECTIVES)
     noun = random.choice(NOUNS)
     suffix = random.randint(0, 999)
     return f"{adjective}-{noun}-{suffix:03d}"
 
-'''
-def generate_human_id(seed: str = None, deterministic: bool = False) -> str:
+
+class HumanIdExhausted(RuntimeError):
+    pass
+
+
+class HumanIdAllocator:
     """
-    Generate a human-friendly ID. If `deterministic` is True, use SHA256(seed).
-    Otherwise, use full random selection.
+    Allocate human IDs against a uniqueness check with a bounded number of
+    attempts, counting collisions so the rate can be monitored.
     """
-    if deterministic and seed:
-        digest = sha256(seed.encode()).digest()
-        a_index = int.from_bytes(digest[0:2], 'big') % len(ADJECTIVES)
-        n_index = int.from_bytes(digest[2:4], 'big') % len(NOUNS)
-        suffix = int.from_bytes(digest[4:6], 'big') % 1000
-        return f"{ADJECTIVES[a_index]}-{NOUNS[n_index]}-{suffix:03d}"
-    else:
-        adjective = random.choice(ADJECTIVES)
-        noun = random.choice(NOUNS)
-        suffix = random.randint(0, 999)
-        return f"{adjective}-{noun}-{suffix:03d}"
-'''
+    def __init__(self, max_attempts: int = 8, deterministic: bool = False):
+        self.max_attempts = max_attempts
+        self.deterministic = deterministic
+        self._lock = threading.Lock()
+        self._stats = {"allocated": 0, "attempts": 0, "collisions": 0, "exhausted": 0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    def candidate(self, seed: str = None, attempt: int = 0) -> str:
+        return generate_human_id(seed=seed, deterministic=self.deterministic, attempt=attempt)
+
+    def allocate(self, try_claim, seed: str = None, preferred: str = None) -> str:
+        """
+        Call `try_claim(human_id)` with successive candidates until it returns
+        True (claimed) rather than False (already taken). `preferred`, e.g.
+        an ID from reserve(), is tried first.
+        """
+        attempt = 0
+        candidate = preferred or self.candidate(seed, attempt)
+        while True:
+            if try_claim(candidate):
+                self._count(allocated=1, attempts=attempt + 1, collisions=attempt)
+                return candidate
+            attempt += 1
+            if attempt >= self.max_attempts:
+                self._count(attempts=attempt, collisions=attempt, exhausted=1)
+                raise HumanIdExhausted(f"No free human ID after {attempt} attempts")
+            candidate = self.candidate(seed, attempt)
+
+    def reserve(self, count: int, find_taken, seeds: list = None) -> list:
+        """
+        Pick `count` distinct IDs for bulk creation. `find_taken(ids)` returns
+        the subset already in use and is called once per round rather than
+        once per ID. Reserved IDs are not locked, so each insert should still
+        go through allocate(..., preferred=reserved_id).
+        """
+        seeds = seeds or [None] * count
+        attempts = [0] * count
+        ids = [self.candidate(seeds[i], 0) for i in range(count)]
+        pending = list(range(count))
+        accepted = set()
+
+        while pending:
+            taken = find_taken([ids[i] for i in pending])
+            retry = []
+            for i in pending:
+                if ids[i] in taken or ids[i] in accepted:
+                    retry.append(i)
+                else:
+                    accepted.add(ids[i])
+            self._count(attempts=len(pending), collisions=len(retry))
+            if not retry:
+                break
+            for i in retry:
+                attempts[i] += 1
+                if attempts[i] >= self.max_attempts:
+                    self._count(exhausted=1)
+                    raise HumanIdExhausted(f"No free human ID after {attempts[i]} attempts")
+                ids[i] = self.candidate(seeds[i], attempts[i])
+            pending = retry
+        return ids
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["collision_rate"] = stats["collisions"] / stats["attempts"] if stats["attempts"] else 0.0
+        return stats